@@ -1,3 +1,13 @@
 from .ai_conversation_manager import AIConversationManager, ConversationConfig, OutputFormat
+from .history_exporter import ColumnarHistoryExporter
+from .session_archive import SessionArchive
+from .semantic_cache import SemanticAnswerCache
+from .output_shards import ShardManifest
+from .token_planner import TokenPlanner, PlanReport
+from .manager_pool import ManagerPool, TenantContext
+from .job_scheduler import JobScheduler, JobPriority, ConversationJob, DeadlineExceeded
 
-__all__ = ['AIConversationManager', 'ConversationConfig', 'OutputFormat']
\ No newline at end of file
+__all__ = ['AIConversationManager', 'ConversationConfig', 'OutputFormat', 'ColumnarHistoryExporter',
+           'SessionArchive', 'SemanticAnswerCache', 'ShardManifest', 'TokenPlanner', 'PlanReport',
+           'ManagerPool', 'TenantContext',
+           'JobScheduler', 'JobPriority', 'ConversationJob', 'DeadlineExceeded']
@@ -1,8 +1,11 @@
 import os
-import json
+import time
 import logging
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import List, Dict, Any, Optional, Union
+from typing import List, Dict, Any, Optional, Union, Callable
 from dataclasses import dataclass, field
 from enum import Enum
 from pathlib import Path
@@ -10,14 +13,22 @@ from pathlib import Path
 from langchain_openai.chat_models.base import BaseChatOpenAI
 from langchain.callbacks.base import BaseCallbackHandler
 from langchain.prompts import ChatPromptTemplate, MessagesPlaceholder
-from langchain_core.chat_history import BaseChatMessageHistory
 from langchain_core.memory import BaseMemory
 from langchain_community.chat_message_histories import ChatMessageHistory
-from langchain.schema import HumanMessage, AIMessage, SystemMessage
 from langchain.callbacks.streaming_stdout import StreamingStdOutCallbackHandler
 from dotenv import load_dotenv
 from pydantic import BaseModel, Field
 
+from .formatters import create_renderer, TurnRecord, SessionMarkdownWriter
+from .history_exporter import ColumnarHistoryExporter
+from .output_shards import ShardedOutputWriter
+from .profiling import StageProfiler, profile_run
+from .serialization import get_serializer, dump_file, load_file, FORMAT_EXTENSIONS
+from .logging_pipeline import setup_manager_logging, bind_log_context, reset_log_context
+from .semantic_cache import SemanticAnswerCache
+from .token_planner import TokenPlanner, PlanReport
+from .write_ahead_log import WriteAheadLog
+
 # 加载环境变量
 load_dotenv()
 
@@ -41,11 +52,33 @@ class ConversationConfig:
     api_base: str = "https://dashscope.aliyuncs.com/compatible-mode/v1"
     api_key_env: str = "DASHSCOPE_API_KEY"  # 环境变量名称
     log_level: int = logging.INFO
+    log_json: bool = True  # 文件日志是否使用 JSON Lines 结构化格式
+    log_to_console: bool = True  # 是否同时输出日志到控制台
     save_interval: int = 5  # 每多少轮对话自动保存一次
     max_history_length: int = 50  # 最大历史记录长度
     backup_enabled: bool = True
     session_id_prefix: str = "session"  # 会话ID前缀
     questions_file: str = ""  # 问题文件路径
+    max_parallel_questions: int = 4  # 独立问题或问题树分支的最大并行数
+    analytics_format: str = ""  # 列式分析导出格式：""(关闭)/"parquet"/"arrow"
+    analytics_batch_size: int = 500  # 列式导出每批写出的行数
+    semantic_cache_enabled: bool = False  # 是否复用无上下文问题的答案（默认只匹配归一化后相同的问题）
+    semantic_cache_embed_fn: Optional[Callable] = None  # 嵌入函数，设置后按语义相似度匹配
+    semantic_cache_threshold: Optional[float] = None  # 语义命中的最低余弦相似度，使用嵌入函数时必填（需针对模型校准）
+    semantic_cache_index: str = "flat"  # 向量索引类型："flat"/"ivf"
+    semantic_cache_warm_start: bool = True  # 启动时从 output_dir/semantic_cache.jsonl 重建缓存
+    output_sharding: bool = False  # 是否把输出写入 shards/ 下的轮转分片（不截断已有输出）
+    output_shard_max_bytes: int = 0  # 分片大小上限（字节，0 表示不限）
+    output_shard_max_turns: int = 0  # 每个分片的最大轮数（0 表示不限）
+    output_shard_naming: str = "time"  # 分片命名："time"/"session"（会话切换时轮转）
+    output_shard_compress: bool = False  # 是否在后台把写完的分片压缩为 .gz
+    wal_enabled: bool = False  # 是否启用预写日志，异常退出后重启时恢复记忆与输出
+    wal_sync_every: int = 8  # 累计多少轮对话执行一次 fsync（1 表示每轮都 fsync）
+    wal_sync_interval: float = 1.0  # 两次 fsync 的最长间隔（秒）
+    profile_enabled: bool = False  # 是否统计每轮对话各阶段的墙钟/CPU 时间
+    serializer_backend: str = "auto"  # JSON 后端："auto"/"orjson"/"msgspec"/"json"
+    history_format: str = "json"  # 对话历史文件格式："json"(缩进)/"compact"/"msgpack"
+    profile_output: str = ""  # 调用栈剖析输出路径：.prof（cProfile）或 .html/.txt（需 pyinstrument）
     markdown_template: str = """
 # {title}
 
@@ -59,10 +92,25 @@ class ConversationConfig:
 class ConversationOutputHandler(BaseCallbackHandler):
     """增强的对话输出处理器"""
     
-    def __init__(self, output_format: OutputFormat, output_path: str):
+    # 已写出的内容在重启后是否保留；保留时从预写日志恢复只补写尚未写出的轮次
+    resumable = False
+    
+    def __init__(self, output_format: OutputFormat, output_path: str, serializer=None,
+                 append: bool = False):
+        """
+        :param serializer: JSON 输出使用的序列化后端（get_serializer 的返回值），默认自动选择
+        :param append: 输出文件已存在时接着写入，而不是截断重写
+        """
         self.output_format = output_format
         self.output_path = output_path
         self.current_content = []
+        self.renderer = create_renderer(output_format, serializer)
+        self.turns_written = 0
+        self.append = append
+        if append:
+            self.resumable = True
+        self._has_turns = False  # 文件中是否已有条目（决定下一条前是否写分隔符）
+        self._file = None
         self.ensure_output_dir()
         self.initialize_output_file()
         
@@ -71,15 +119,57 @@ class ConversationOutputHandler(BaseCallbackHandler):
         Path(os.path.dirname(self.output_path)).mkdir(parents=True, exist_ok=True)
         
     def initialize_output_file(self):
-        """初始化输出文件"""
-        header = {
-            OutputFormat.MARKDOWN: "# AI对话记录\n\n",
-            OutputFormat.HTML: "<html><head><title>AI对话记录</title></head><body><h1>AI对话记录</h1>",
-            OutputFormat.TXT: "=== AI对话记录 ===\n\n",
-            OutputFormat.JSON: "[]"
-        }
-        with open(self.output_path, 'w', encoding='utf-8') as f:
-            f.write(header.get(self.output_format, ""))
+        """初始化输出文件（写入文件头，并保持追加句柄打开）"""
+        self.turns_written = 0
+        if self.append and os.path.exists(self.output_path) and self._reopen_output_file():
+            return
+        self._file = open(self.output_path, 'w', encoding='utf-8')
+        self._file.write(self.renderer.header)
+        self._file.flush()
+        self._has_turns = False
+        
+    def _reopen_output_file(self) -> bool:
+        """去掉已有文件末尾的文件尾后接着写入；文件不以文件头开始时返回 False（重新创建）"""
+        header = self.renderer.header.encode('utf-8')
+        footer = self.renderer.footer.encode('utf-8')
+        with open(self.output_path, 'r+b') as f:
+            if f.read(len(header)) != header:
+                return False
+            end = f.seek(0, os.SEEK_END)
+            if footer and end >= len(header) + len(footer):
+                f.seek(end - len(footer))
+                if f.read() == footer:
+                    end -= len(footer)
+                    f.truncate(end)
+        self._has_turns = end > len(header)
+        self._file = open(self.output_path, 'a', encoding='utf-8')
+        return True
+        
+    def write_turns(self, turns: List[TurnRecord]) -> None:
+        """批量渲染并写入多轮对话 (problem, response, metadata)"""
+        if not turns:
+            return
+        self._file.write(self.renderer.render_many(turns, first=not self._has_turns))
+        self._file.flush()
+        self.turns_written += len(turns)
+        self._has_turns = True
+        
+    def write_turn(self, problem: str, response: str, metadata: dict) -> None:
+        """渲染并写入单轮对话"""
+        self.write_turns([(problem, response, metadata)])
+        
+    def flush(self) -> None:
+        """将缓冲内容写入磁盘"""
+        if self._file is not None:
+            self._file.flush()
+            
+    def close(self) -> None:
+        """写入文件尾并关闭输出文件"""
+        if self._file is None:
+            return
+        self._file.write(self.renderer.footer)
+        self._file.close()
+        self._file = None
             
     def on_llm_new_token(self, token: str, **kwargs):
         """处理新token"""
@@ -88,29 +178,54 @@ class ConversationOutputHandler(BaseCallbackHandler):
         
     def format_content(self, problem: str, response: str, metadata: dict) -> str:
         """根据不同格式格式化内容"""
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        
-        if self.output_format == OutputFormat.MARKDOWN:
-            return (f"\n## 问题 {metadata['number']} - {timestamp}\n\n"
-                   f"### 问题描述：\n{problem}\n\n"
-                   f"### 回答：\n{response}\n\n---\n")
-        elif self.output_format == OutputFormat.HTML:
-            return (f"<div class='qa-pair'>"
-                   f"<h2>问题 {metadata['number']} - {timestamp}</h2>"
-                   f"<h3>问题描述：</h3><p>{problem}</p>"
-                   f"<h3>回答：</h3><p>{response}</p>"
-                   f"<hr></div>")
-        elif self.output_format == OutputFormat.JSON:
-            return json.dumps({
-                "number": metadata['number'],
-                "timestamp": timestamp,
-                "problem": problem,
-                "response": response,
-                "metadata": metadata
-            }, ensure_ascii=False)
-        else:
-            return f"\n=== 问题 {metadata['number']} - {timestamp} ===\n" \
-                   f"问题：{problem}\n回答：{response}\n\n"
+        return self.renderer.render(problem, response, metadata)
+
+# 消息类型 -> 角色
+MESSAGE_ROLES = {"human": "user", "ai": "assistant", "system": "system"}
+
+class ShardedOutputHandler(ConversationOutputHandler):
+    """分片输出处理器：按大小/轮数轮转输出文件，并维护会话偏移清单"""
+    
+    resumable = True
+    
+    def __init__(self, output_format: OutputFormat, shard_dir: str, max_bytes: int = 0,
+                 max_turns: int = 0, naming: str = "time", compress: bool = False, serializer=None):
+        self.shard_dir = shard_dir
+        self.writer = ShardedOutputWriter(
+            shard_dir, create_renderer(output_format, serializer), output_format.value,
+            max_bytes=max_bytes, max_turns=max_turns, naming=naming, compress=compress
+        )
+        super().__init__(output_format, os.path.join(shard_dir, f"conversation.{output_format.value}"),
+                         serializer)
+        
+    @property
+    def output_path(self) -> Optional[str]:
+        """当前分片路径（尚未写入任何内容时为 None）"""
+        return self.writer.current_path
+        
+    @output_path.setter
+    def output_path(self, value: str) -> None:
+        pass  # 分片路径由 writer 决定
+        
+    def ensure_output_dir(self):
+        """分片目录由 writer 创建"""
+        
+    def initialize_output_file(self):
+        """分片在第一次写入时打开，不覆盖已有分片"""
+        self.turns_written = 0
+        
+    def write_turns(self, turns: List[TurnRecord]) -> None:
+        """写入多轮对话，必要时轮转分片"""
+        self.writer.write_turns(turns)
+        self.turns_written += len(turns)
+        
+    def flush(self) -> None:
+        """将当前分片的缓冲内容写入磁盘"""
+        self.writer.flush()
+        
+    def close(self) -> None:
+        """关闭当前分片并等待后台压缩完成"""
+        self.writer.close()
 
 class EnhancedMemory(BaseMemory, BaseModel):
     """增强的对话记忆系统"""
@@ -138,54 +253,216 @@ class EnhancedMemory(BaseMemory, BaseModel):
             
     def clear(self) -> None:
         self.chat_history.clear()
+        
+    def fork(self) -> "EnhancedMemory":
+        """复制出独立的记忆分支：消息对象共享，只复制引用列表，之后各分支互不影响"""
+        return EnhancedMemory(
+            chat_history=ChatMessageHistory(messages=list(self.chat_history.messages)),
+            max_history_length=self.max_history_length,
+            memory_key=self.memory_key
+        )
 
 class QuestionSession:
     """问题会话类，用于管理相关问题组"""
     
-    def __init__(self, session_id: str, questions: List[str], title: str = None):
+    def __init__(self, session_id: str, questions: List[str], title: str = None,
+                 independent: bool = False, branches: Dict[str, List[str]] = None):
         self.session_id = session_id
-        self.questions = questions
+        self.questions = questions  # 问题树会话中为共享前缀
         self.title = title or f"问题会话 {session_id}"
+        self.independent = independent  # 问题之间互不依赖，可并行回答
+        self.branches = branches or {}  # 问题树：分支名 -> 在共享前缀之后继续提问的问题
         self.start_time = None
         self.end_time = None
         self.content = []
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.markdown_writer = None  # 会话进行中的 Markdown 流式写入器
 
 class AIConversationManager:
     """AI对话管理器"""
     
     def __init__(self, config: ConversationConfig = None):
         self.config = config or ConversationConfig()
+        self.serializer = get_serializer(self.config.serializer_backend)
         self.setup_logging()
         self.memory = EnhancedMemory()
+        self.profiler = StageProfiler(enabled=self.config.profile_enabled)
         self.conversation_count = 0
+        self._record_lock = threading.Lock()
         self.output_handler = self._create_output_handler()
         self.llm = self._setup_llm()
         self.prompt_template = self._create_prompt_template()
         self.sessions = {}  # 存储多个会话
         self.current_session_id = None
+        self.analytics_exporter = self._create_analytics_exporter()
+        self.semantic_cache = self._create_semantic_cache()
+        self.wal = self._create_write_ahead_log()
         
     def setup_logging(self):
-        """配置日志系统"""
+        """配置日志系统（每个管理器独立的队列日志管道，不修改全局配置）"""
         # 确保日志目录存在
         os.makedirs(self.config.output_dir, exist_ok=True)
         
-        logging.basicConfig(
+        manager_id = f"{id(self):x}"
+        self.log_pipeline = setup_manager_logging(
+            f"{__name__}.{manager_id}",
+            os.path.join(self.config.output_dir, "conversation.log"),
             level=self.config.log_level,
-            format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-            handlers=[
-                logging.FileHandler(f"{self.config.output_dir}/conversation.log"),
-                logging.StreamHandler()
-            ]
+            json_format=self.config.log_json,
+            console=self.config.log_to_console,
+            static_fields={"manager_id": manager_id}
         )
-        self.logger = logging.getLogger(__name__)
+        self.logger = self.log_pipeline.logger
         
     def _create_output_handler(self) -> ConversationOutputHandler:
         """创建输出处理器"""
+        if self.config.output_sharding:
+            return ShardedOutputHandler(
+                self.config.output_format,
+                os.path.join(self.config.output_dir, "shards"),
+                max_bytes=self.config.output_shard_max_bytes,
+                max_turns=self.config.output_shard_max_turns,
+                naming=self.config.output_shard_naming,
+                compress=self.config.output_shard_compress,
+                serializer=self.serializer
+            )
         output_path = os.path.join(
             self.config.output_dir,
             f"conversation.{self.config.output_format.value}"
         )
-        return ConversationOutputHandler(self.config.output_format, output_path)
+        return ConversationOutputHandler(self.config.output_format, output_path, self.serializer)
+        
+    def _create_analytics_exporter(self) -> Optional[ColumnarHistoryExporter]:
+        """创建列式分析导出器（未启用时返回 None）"""
+        if not self.config.analytics_format:
+            return None
+        base_path = os.path.join(
+            self.config.output_dir,
+            "analytics",
+            f"run_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        )
+        return ColumnarHistoryExporter(
+            base_path,
+            export_format=self.config.analytics_format,
+            batch_size=self.config.analytics_batch_size
+        )
+        
+    def _create_semantic_cache(self) -> Optional[SemanticAnswerCache]:
+        """创建语义答案缓存（未启用时返回 None）"""
+        if not self.config.semantic_cache_enabled:
+            return None
+        # 存储文件只记录无历史时回答的问答（会话第一问、独立问题），预热时不会载入依赖上文的回答
+        store_path = os.path.join(self.config.output_dir, "semantic_cache.jsonl")
+        cache = SemanticAnswerCache(
+            embed_fn=self.config.semantic_cache_embed_fn,
+            threshold=self.config.semantic_cache_threshold,
+            index_type=self.config.semantic_cache_index,
+            store_path=store_path
+        )
+        if self.config.semantic_cache_warm_start and os.path.exists(store_path):
+            count = cache.rebuild_from_history_files([store_path])
+            self.logger.info(f"Semantic cache warmed with {count} question/answer pairs")
+        return cache
+        
+    def _create_write_ahead_log(self) -> Optional[WriteAheadLog]:
+        """打开预写日志（未启用时返回 None）；上次未正常关闭时从日志恢复状态"""
+        if not self.config.wal_enabled:
+            return None
+        wal = WriteAheadLog(
+            os.path.join(self.config.output_dir, "conversation.wal"),
+            sync_every=self.config.wal_sync_every,
+            sync_interval=self.config.wal_sync_interval
+        )
+        if wal.recovered:
+            written = self._recover_from_wal(wal.recovered)
+            if written and self.output_handler.resumable:
+                wal.append({"type": "output", "turns": written})
+        return wal
+        
+    def _wal_append(self, record: Dict[str, Any]) -> None:
+        """写入一条预写日志记录"""
+        if self.wal is not None:
+            with self.profiler.stage("wal"):
+                self.wal.append(record)
+            
+    def _wal_turn(self, problem: str, content: str, metadata: dict, in_memory: bool) -> None:
+        """在更新记忆和输出文件之前记录已完成的一轮对话"""
+        self._wal_append({"type": "turn", "problem": problem, "response": content,
+                          "metadata": metadata, "memory": in_memory,
+                          "time": datetime.now().isoformat()})
+        
+    def _write_output(self, turns: List[TurnRecord]) -> None:
+        """写入输出文件；输出在重启后保留时，在预写日志中记录已写出的轮数，恢复时不再重复写入"""
+        with self.profiler.stage("output_write"):
+            self.output_handler.write_turns(turns)
+        if turns and self.output_handler.resumable:
+            self._wal_append({"type": "output", "turns": len(turns)})
+            
+    def _wal_checkpoint(self) -> None:
+        """
+        会话结束后压缩预写日志：输出在重启后保留时，已结束会话的记录不再需要，
+        清空日志并只保留对话计数；否则输出文件在重启时重建，需要保留全部记录
+        """
+        if self.wal is None or not self.output_handler.resumable:
+            return
+        with self.profiler.stage("wal"):
+            self.wal.checkpoint()
+            self.wal.append({"type": "checkpoint", "conversation_count": self.conversation_count})
+        
+    def _recover_from_wal(self, records: List[Dict[str, Any]]) -> int:
+        """根据上次运行留下的日志重建对话记忆、输出文件与会话 Markdown，返回补写到输出的轮数"""
+        turns = []
+        recovered = []
+        turn_counts = {}  # (session_id, branch) -> 已恢复轮数
+        last_time = None
+        base_count = 0
+        written = 0  # 已写入输出的轮数（按日志顺序）
+        for record in records:
+            kind = record.get("type")
+            if kind == "checkpoint":
+                base_count = record["conversation_count"]
+            elif kind == "output":
+                written += record["turns"]
+            elif kind == "session_start":
+                session = QuestionSession(record["session_id"], [], title=record.get("title"),
+                                          independent=record.get("independent", False))
+                session.start_time = datetime.fromisoformat(record["start_time"])
+                self.sessions[session.session_id] = session
+                recovered.append(session)
+                self.memory.clear()
+            elif kind == "session_end":
+                session = self.sessions.get(record["session_id"])
+                if session is not None:
+                    session.end_time = datetime.fromisoformat(record["end_time"])
+            elif kind == "turn":
+                problem, content, metadata = record["problem"], record["response"], record["metadata"]
+                last_time = datetime.fromisoformat(record["time"])
+                if record.get("memory"):
+                    self.memory.save_context({"problem": problem}, {"text": content})
+                turns.append((problem, content, metadata))
+                session_id, branch = metadata.get("session_id"), metadata.get("branch")
+                session = self.sessions.get(session_id)
+                if session is None:
+                    continue
+                key = (session_id, branch)
+                turn_counts[key] = turn_counts.get(key, 0) + 1
+                qa = {"question": problem, "response": content, "number": turn_counts[key]}
+                if branch is not None:
+                    qa["number"] += turn_counts.get((session_id, None), 0)
+                    qa["branch"] = branch
+                session.content.append(qa)
+                
+        self.conversation_count = max([base_count] + [t[2].get("number", 0) for t in turns])
+        pending = turns[written:] if self.output_handler.resumable else turns
+        self.output_handler.write_turns(pending)
+        for session in recovered:
+            if session.end_time is None:
+                session.end_time = last_time or session.start_time
+            self._save_session_markdown(session)
+        self.logger.warning("Recovered %d turns and %d sessions from the write-ahead log",
+                            len(turns), len(recovered))
+        return len(pending)
         
     def _setup_llm(self) -> BaseChatOpenAI:
         """设置语言模型"""
@@ -199,10 +476,13 @@ class AIConversationManager:
             openai_api_base=self.config.api_base,
             max_tokens=self.config.max_tokens,
             temperature=self.config.temperature,
-            streaming=self.config.streaming,
-            callbacks=[self.output_handler, StreamingStdOutCallbackHandler()]
+            streaming=self.config.streaming
         )
         
+    def _stream_callbacks(self) -> list:
+        """管理器自己的流式输出回调（每次调用时传入模型，而不是绑定在共享的模型客户端上）"""
+        return [self.output_handler, StreamingStdOutCallbackHandler()]
+        
     def _create_prompt_template(self) -> ChatPromptTemplate:
         """创建提示模板"""
         return ChatPromptTemplate.from_messages([
@@ -218,36 +498,24 @@ class AIConversationManager:
             metadata = metadata or {}
             metadata['number'] = self.conversation_count
             
-            self.logger.info(f"Processing conversation {self.conversation_count}: {problem[:100]}...")
-            
-            # 创建对话链
-            chain = self.prompt_template | self.llm
-            
-            # 执行对话并直接获取内容
-            response = chain.invoke({
-                "problem": problem,
-                "chat_history": self.memory.chat_history.messages
-            })
+            self.logger.info("Processing conversation %d: %.100s...", self.conversation_count, problem)
+            started_at = datetime.now()
+            start_counter = time.perf_counter()
             
-            # 获取实际的响应内容
-            content = response.content if hasattr(response, 'content') else str(response)
+            content, response = self._generate(problem, self.memory.chat_history.messages)
+            self._wal_turn(problem, content, metadata, in_memory=True)
             
             # 保存对话内容
-            self.memory.save_context({"problem": problem}, {"text": content})
+            with self.profiler.stage("memory_update"):
+                self.memory.save_context({"problem": problem}, {"text": content})
+            self._record_turn(problem, content, metadata, response,
+                              started_at, time.perf_counter() - start_counter)
             
             # 格式化并保存输出
-            formatted_content = self.output_handler.format_content(
-                problem, content, metadata
-            )
-            
-            with open(self.output_handler.output_path, 'a', encoding='utf-8') as f:
-                f.write(formatted_content)
+            self._write_output([(problem, content, metadata)])
                 
             # 自动保存和备份
-            if self.conversation_count % self.config.save_interval == 0:
-                self.save_history()
-                if self.config.backup_enabled:
-                    self.create_backup()
+            self._auto_save(self.conversation_count - 1)
                     
             return content
             
@@ -255,16 +523,199 @@ class AIConversationManager:
             self.logger.error(f"Error processing conversation: {str(e)}", exc_info=True)
             raise
             
+    def answer(self, problem: str, memory: EnhancedMemory, metadata: dict, callbacks: list = None) -> str:
+        """
+        在调用方提供的记忆上回答一轮问题，更新该记忆并记录统计；
+        不修改管理器自己的记忆、计数和输出文件，可在多个线程中对不同的记忆并发调用
+        :param memory: 对话记忆（同一记忆上的调用需由调用方串行化）
+        :param metadata: 本轮元数据，至少包含 number
+        :param callbacks: 本轮的模型回调，默认使用管理器的流式输出回调；并发调用时应传入各自的回调或空列表
+        """
+        started_at = datetime.now()
+        start_counter = time.perf_counter()
+        content, response = self._generate(problem, memory.chat_history.messages, callbacks)
+        with self.profiler.stage("memory_update"):
+            memory.save_context({"problem": problem}, {"text": content})
+        with self._record_lock:
+            self._record_turn(problem, content, metadata, response,
+                              started_at, time.perf_counter() - start_counter)
+        return content
+        
+    def _generate(self, problem: str, chat_history: list, callbacks: list = None) -> tuple:
+        """
+        根据历史生成回答，返回 (回答内容, 模型响应)；不修改记忆和输出文件
+        :param callbacks: 模型回调，默认使用管理器的流式输出回调
+        """
+        # 答案缓存只用于不依赖上下文的问题（当前会话无历史），也只缓存这类问题的回答
+        use_cache = self.semantic_cache is not None and not chat_history
+        cached = None
+        if use_cache:
+            with self.profiler.stage("cache_lookup"):
+                cached = self.semantic_cache.lookup_with_score(problem)
+        
+        if cached is not None:
+            content, score, source = cached
+            self.logger.info("Semantic cache hit (%.3f), matched: %.100s", score, source)
+            return content, None
+            
+        # 渲染提示并调用模型（分开执行以便分别统计耗时）
+        with self.profiler.stage("prompt_render"):
+            prompt = self.prompt_template.invoke({
+                "problem": problem,
+                "chat_history": chat_history
+            })
+        with self.profiler.stage("llm_call"):
+            if callbacks is None:
+                callbacks = self._stream_callbacks()
+            response = self.llm.invoke(prompt, config={"callbacks": callbacks})
+        
+        # 获取实际的响应内容
+        content = response.content if hasattr(response, 'content') else str(response)
+        if use_cache:
+            with self.profiler.stage("cache_update"):
+                self.semantic_cache.add(problem, content)
+        return content, response
+        
+    def _auto_save(self, previous_count: int) -> None:
+        """对话计数跨过 save_interval 的整数倍时自动保存和备份"""
+        interval = self.config.save_interval
+        if self.conversation_count // interval > previous_count // interval:
+            with self.profiler.stage("auto_save"):
+                self.save_history()
+                if self.config.backup_enabled:
+                    self.create_backup()
+                
+    def _answer_independent(self, problem: str) -> tuple:
+        """在无历史的情况下回答独立问题，返回 (回答, 模型响应, 开始时间, 耗时)"""
+        started_at = datetime.now()
+        start_counter = time.perf_counter()
+        content, response = self._generate(problem, [])
+        return content, response, started_at, time.perf_counter() - start_counter
+        
+    def _process_independent_questions(self, session: QuestionSession) -> None:
+        """并行回答独立问题，再按原顺序写入输出与会话内容"""
+        questions = session.questions
+        previous_count = self.conversation_count
+        self.logger.info("Answering %d independent questions of session %s in parallel",
+                         len(questions), session.session_id)
+        
+        workers = max(1, min(self.config.max_parallel_questions, len(questions)))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="hjimi-question") as pool:
+            # 复制上下文，使工作线程中的日志与耗时统计仍归属当前会话
+            futures = [pool.submit(contextvars.copy_context().run, self._answer_independent, question)
+                       for question in questions]
+            
+            turns = []
+            try:
+                for i, (question, future) in enumerate(zip(questions, futures), 1):
+                    content, response, started_at, duration = future.result()
+                    self.conversation_count += 1
+                    metadata = {"number": self.conversation_count, "session_id": session.session_id}
+                    self._wal_turn(question, content, metadata, in_memory=False)
+                    self._record_turn(question, content, metadata, response, started_at, duration)
+                    turns.append((question, content, metadata))
+                    self._append_session_qa(session, {
+                        "question": question,
+                        "response": content,
+                        "number": i
+                    })
+            except Exception as e:
+                self.logger.error(f"Error processing conversation: {str(e)}", exc_info=True)
+                for future in futures:
+                    future.cancel()
+                raise
+            finally:
+                self._write_output(turns)
+                
+        self._auto_save(previous_count)
+            
+    @staticmethod
+    def _extract_token_usage(response) -> Dict[str, int]:
+        """从模型响应中提取 token 用量（提供方未返回时为空）"""
+        usage = getattr(response, "usage_metadata", None)
+        if usage:
+            return {
+                "prompt_tokens": usage.get("input_tokens"),
+                "completion_tokens": usage.get("output_tokens"),
+                "total_tokens": usage.get("total_tokens"),
+            }
+        metadata = getattr(response, "response_metadata", None) or {}
+        usage = metadata.get("token_usage") or {}
+        return {
+            "prompt_tokens": usage.get("prompt_tokens"),
+            "completion_tokens": usage.get("completion_tokens"),
+            "total_tokens": usage.get("total_tokens"),
+        }
+        
+    def _record_turn(self, problem: str, content: str, metadata: dict, response,
+                     started_at: datetime, duration: float) -> None:
+        """记录单轮对话的耗时与 token 统计"""
+        with self.profiler.stage("analytics"):
+            usage = self._extract_token_usage(response)
+            session = self.sessions.get(metadata.get("session_id"))
+            if session is not None:
+                session.prompt_tokens += usage["prompt_tokens"] or 0
+                session.completion_tokens += usage["completion_tokens"] or 0
+            
+            if self.analytics_exporter is None:
+                return
+            self.analytics_exporter.add_turn({
+                "session_id": metadata.get("session_id"),
+                "session_title": session.title if session is not None else None,
+                "turn": metadata["number"],
+                "question": problem,
+                "response": content,
+                "started_at": started_at,
+                "finished_at": datetime.now(),
+                "duration_ms": duration * 1000,
+                "model": self.config.model_name,
+                **usage
+            })
+        
+    def _record_session(self, session: QuestionSession) -> None:
+        """记录会话汇总信息"""
+        if self.analytics_exporter is None:
+            return
+        self.analytics_exporter.add_session({
+            "session_id": session.session_id,
+            "title": session.title,
+            "start_time": session.start_time,
+            "end_time": session.end_time,
+            "duration_ms": (session.end_time - session.start_time).total_seconds() * 1000,
+            "turns": len(session.content),
+            "prompt_tokens": session.prompt_tokens,
+            "completion_tokens": session.completion_tokens,
+            "total_tokens": session.prompt_tokens + session.completion_tokens,
+        })
+        
+    def close(self) -> None:
+        """释放管理器持有的资源（写出剩余的分析数据等）"""
+        if self.analytics_exporter is not None:
+            self.analytics_exporter.close()
+        if self.semantic_cache is not None:
+            self.logger.info(f"Semantic cache stats: {self.semantic_cache.stats()}")
+        self.output_handler.close()
+        if self.wal is not None:
+            # 输出文件已完整写出，清空预写日志
+            self.wal.checkpoint()
+            self.wal.close()
+        self.log_pipeline.stop()
+            
+    def __enter__(self):
+        return self
+        
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        
     def save_history(self, filename: str = None):
         """保存对话历史"""
         if not filename:
-            filename = f"chat_history_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+            extension = FORMAT_EXTENSIONS.get(self.config.history_format, ".json")
+            filename = f"chat_history_{datetime.now().strftime('%Y%m%d_%H%M%S')}{extension}"
             
         filepath = os.path.join(self.config.output_dir, filename)
         history = self.get_chat_history()
-        
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(history, f, ensure_ascii=False, indent=2)
+        dump_file(filepath, history, self.config.history_format, self.serializer)
             
         self.logger.info(f"Chat history saved to {filepath}")
         
@@ -281,29 +732,37 @@ class AIConversationManager:
         
         # 复制当前输出文件作为备份
         import shutil
-        shutil.copy2(self.output_handler.output_path, backup_path)
+        self.output_handler.flush()
+        if not self.output_handler.output_path:
+            return
+        # 先复制到临时文件再原子替换，避免留下写了一半的备份
+        temp_path = backup_path + ".tmp"
+        shutil.copy2(self.output_handler.output_path, temp_path)
+        os.replace(temp_path, backup_path)
         self.logger.info(f"Backup created at {backup_path}")
         
     def get_chat_history(self) -> List[Dict[str, str]]:
         """获取对话历史"""
-        return [{
-            "role": "user" if isinstance(msg, HumanMessage) else
-                   "assistant" if isinstance(msg, AIMessage) else
-                   "system" if isinstance(msg, SystemMessage) else "unknown",
-            "content": msg.content
-        } for msg in self.memory.chat_history.messages]
+        roles = MESSAGE_ROLES
+        return [{"role": roles.get(msg.type, "unknown"), "content": msg.content}
+                for msg in self.memory.chat_history.messages]
         
     def clear_history(self):
         """清空历史记录"""
         self.memory.clear()
         self.logger.info("Chat history cleared")
 
-    def create_session(self, questions: List[str], session_id: str = None, title: str = None) -> str:
-        """创建新的问题会话"""
+    def create_session(self, questions: List[str], session_id: str = None, title: str = None,
+                       independent: bool = False, branches: Dict[str, List[str]] = None) -> str:
+        """创建新的问题会话
+        
+        independent=True 表示问题互不依赖，将并行回答；
+        branches 不为空时为问题树会话，questions 作为共享前缀只回答一次，各分支从前缀历史分叉并发运行
+        """
         if session_id is None:
             session_id = f"{self.config.session_id_prefix}_{len(self.sessions) + 1}"
         
-        self.sessions[session_id] = QuestionSession(session_id, questions, title)
+        self.sessions[session_id] = QuestionSession(session_id, questions, title, independent, branches)
         return session_id
         
     def load_questions_from_file(self, file_path: str) -> List[Dict[str, Any]]:
@@ -314,38 +773,41 @@ class AIConversationManager:
            - 简单列表格式
            - 单个会话字典格式
            - 多会话嵌套字典格式
+           会话字典中可设置 "independent": true，表示问题互不依赖，可并行回答；
+           也可使用 "prefix" + "branches" 描述问题树（共享前缀 + 多个分支）
         """
-        if file_path.endswith('.json'):
-            with open(file_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                sessions_data = []
-                
-                # 处理嵌套字典格式
-                if isinstance(data, dict):
-                    for session_id, session_info in data.items():
-                        if isinstance(session_info, dict):
-                            # 处理完整的会话信息
-                            sessions_data.append({
-                                "session_id": session_id,
-                                "title": session_info.get("title", f"Session {session_id}"),
-                                "questions": session_info.get("questions", [])
-                            })
-                        elif isinstance(session_info, list):
-                            # 处理简单的问题列表
-                            sessions_data.append({
-                                "session_id": session_id,
-                                "title": f"Session {session_id}",
-                                "questions": session_info
-                            })
-                elif isinstance(data, list):
-                    # 处理简单的问题列表
-                    sessions_data.append({
-                        "session_id": f"session_{datetime.now().strftime('%Y%m%d_%H%M%S')}",
-                        "title": "Questions List",
-                        "questions": data
-                    })
-                
-                return sessions_data
+        if file_path.endswith(('.json', '.msgpack')):
+            data = load_file(file_path, self.serializer)
+            sessions_data = []
+            
+            # 处理嵌套字典格式
+            if isinstance(data, dict):
+                for session_id, session_info in data.items():
+                    if isinstance(session_info, dict):
+                        # 处理完整的会话信息
+                        sessions_data.append({
+                            "session_id": session_id,
+                            "title": session_info.get("title", f"Session {session_id}"),
+                            "questions": session_info.get("prefix", session_info.get("questions", [])),
+                            "independent": bool(session_info.get("independent", False)),
+                            "branches": session_info.get("branches", {})
+                        })
+                    elif isinstance(session_info, list):
+                        # 处理简单的问题列表
+                        sessions_data.append({
+                            "session_id": session_id,
+                            "title": f"Session {session_id}",
+                            "questions": session_info
+                        })
+            elif isinstance(data, list):
+                # 处理简单的问题列表
+                sessions_data.append({
+                    "session_id": f"session_{datetime.now().strftime('%Y%m%d_%H%M%S')}",
+                    "title": "Questions List",
+                    "questions": data
+                })
+            
+            return sessions_data
         else:
             with open(file_path, 'r', encoding='utf-8') as f:
                 questions = [line.strip() for line in f if line.strip()]
@@ -355,6 +817,61 @@ class AIConversationManager:
                     "session_id": f"text_session_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
                 }]
 
+    def _run_branch(self, questions: List[str], memory: EnhancedMemory) -> List[tuple]:
+        """在分支自己的记忆上依次回答问题，返回 [(问题, 回答, 模型响应, 开始时间, 耗时)]"""
+        results = []
+        for question in questions:
+            started_at = datetime.now()
+            start_counter = time.perf_counter()
+            content, response = self._generate(question, memory.chat_history.messages)
+            with self.profiler.stage("memory_update"):
+                memory.save_context({"problem": question}, {"text": content})
+            results.append((question, content, response, started_at,
+                            time.perf_counter() - start_counter))
+        return results
+        
+    def _process_branches(self, session: QuestionSession) -> None:
+        """共享前缀已回答完毕后，从前缀历史分叉并发运行各分支"""
+        previous_count = self.conversation_count
+        prefix_length = len(session.content)
+        self.logger.info("Running %d branches of session %s from a %d-turn shared prefix",
+                         len(session.branches), session.session_id, prefix_length)
+        
+        workers = max(1, min(self.config.max_parallel_questions, len(session.branches)))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="hjimi-branch") as pool:
+            futures = {
+                branch: pool.submit(contextvars.copy_context().run,
+                                    self._run_branch, questions, self.memory.fork())
+                for branch, questions in session.branches.items()
+            }
+            
+            turns = []
+            try:
+                for branch, future in futures.items():
+                    for i, (question, content, response, started_at, duration) in \
+                            enumerate(future.result(), prefix_length + 1):
+                        self.conversation_count += 1
+                        metadata = {"number": self.conversation_count,
+                                    "session_id": session.session_id, "branch": branch}
+                        self._wal_turn(question, content, metadata, in_memory=False)
+                        self._record_turn(question, content, metadata, response, started_at, duration)
+                        turns.append((question, content, metadata))
+                        self._append_session_qa(session, {
+                            "question": question,
+                            "response": content,
+                            "number": i,
+                            "branch": branch
+                        })
+            except Exception as e:
+                self.logger.error(f"Error processing branch: {str(e)}", exc_info=True)
+                for future in futures.values():
+                    future.cancel()
+                raise
+            finally:
+                self._write_output(turns)
+                
+        self._auto_save(previous_count)
+        
     def process_session(self, session_id: str) -> None:
         """处理单个问题会话"""
         if session_id not in self.sessions:
@@ -364,56 +881,91 @@ class AIConversationManager:
         session = self.sessions[session_id]
         session.start_time = datetime.now()
         self.current_session_id = session_id
+        log_token = bind_log_context(session_id=session_id)
         
         # 清空当前会话的历史记录
         self.memory.clear()
+        session.markdown_writer = self._open_session_markdown(session)
+        self._wal_append({"type": "session_start", "session_id": session_id, "title": session.title,
+                          "independent": session.independent,
+                          "start_time": session.start_time.isoformat()})
         
         try:
+            if session.independent:
+                self._process_independent_questions(session)
+                return
+                
             # 处理会话中的所有问题
             for i, question in enumerate(session.questions, 1):
                 response = self.process_conversation(
                     question,
                     metadata={"number": i, "session_id": session_id}
                 )
-                session.content.append({
+                self._append_session_qa(session, {
                     "question": question,
                     "response": response,
                     "number": i
                 })
+                
+            if session.branches:
+                self._process_branches(session)
             
         finally:
             session.end_time = datetime.now()
             self.current_session_id = None
+            self._wal_append({"type": "session_end", "session_id": session_id,
+                              "end_time": session.end_time.isoformat()})
             
             # 生成会话的markdown文件
             self._save_session_markdown(session)
+            self._record_session(session)
+            self._wal_checkpoint()
+            reset_log_context(log_token)
         
-    def _save_session_markdown(self, session: QuestionSession) -> None:
-        """将会话保存为Markdown文件"""
-        content = []
-        for qa in session.content:
-            content.append(f"### 问题 {qa['number']}\n")
-            content.append(f"**问题描述：**\n{qa['question']}\n")
-            content.append(f"**回答：**\n{qa['response']}\n")
-            content.append("---\n")
-            
-        markdown_content = self.config.markdown_template.format(
-            title=session.title,
-            session_id=session.session_id,
-            start_time=session.start_time.strftime("%Y-%m-%d %H:%M:%S"),
-            end_time=session.end_time.strftime("%Y-%m-%d %H:%M:%S"),
-            content="\n".join(content)
-        )
-        
+    def _open_session_markdown(self, session: QuestionSession) -> SessionMarkdownWriter:
+        """创建会话Markdown文件并写入文件头"""
         output_path = os.path.join(
             self.config.output_dir,
             f"session_{session.session_id}_{session.start_time.strftime('%Y%m%d_%H%M%S')}.md"
         )
+        return SessionMarkdownWriter(output_path, self.config.markdown_template,
+                                     session.title, session.session_id, session.start_time)
         
-        with open(output_path, 'w', encoding='utf-8') as f:
-            f.write(markdown_content)
+    def _append_session_qa(self, session: QuestionSession, qa: Dict[str, Any]) -> None:
+        """记录问答并立即追加到会话Markdown文件"""
+        session.content.append(qa)
+        if session.markdown_writer is not None:
+            with self.profiler.stage("session_markdown"):
+                session.markdown_writer.write_qa(qa)
             
-        self.logger.info(f"Session markdown saved to {output_path}")
+    def _save_session_markdown(self, session: QuestionSession) -> None:
+        """完成会话Markdown文件（回填结束时间）；未流式写入的会话一次性写出"""
+        writer = session.markdown_writer
+        if writer is None:
+            writer = self._open_session_markdown(session)
+            writer.write_many(session.content)
+        session.markdown_writer = None
+        with self.profiler.stage("session_markdown"):
+            writer.close(session.end_time)
+        self.logger.info(f"Session markdown saved to {writer.path}")
+        
+    def plan_questions(self, questions_file: str, **planner_options) -> PlanReport:
+        """预估问题文件的 token 用量、费用与耗时（不调用模型）
+        
+        planner_options 透传给 TokenPlanner，例如 completion_tokens、concurrency、
+        requests_per_minute、prompt_price_per_1k 等
+        """
+        options = {
+            "system_prompt": self.config.system_prompt,
+            "max_history_length": self.memory.max_history_length,
+            "max_tokens": self.config.max_tokens,
+            "concurrency": self.config.max_parallel_questions,
+        }
+        options.update(planner_options)
+        report = TokenPlanner(**options).plan_file(questions_file)
+        self.logger.info("Plan for %s: %d requests, %d tokens, ~%.1fs",
+                         questions_file, report.requests, report.total_tokens, report.estimated_seconds)
+        return report
         
     def process_all_sessions(self) -> None:
         """处理所有会话"""
@@ -424,6 +976,7 @@ class AIConversationManager:
         """处理问题（支持多种输入格式）"""
         # 清空现有会话
         self.sessions.clear()
+        self.profiler.reset()
         
         try:
             if isinstance(questions, str):
@@ -437,7 +990,7 @@ class AIConversationManager:
                             continue
                         
                         questions_list = data.get("questions")
-                        if not questions_list:
+                        if not questions_list and not data.get("branches"):
                             self.logger.error(f"No questions found in data: {data}")
                             continue
                         
@@ -447,7 +1000,9 @@ class AIConversationManager:
                         self.create_session(
                             questions=questions_list,
                             title=title,
-                            session_id=session_id
+                            session_id=session_id,
+                            independent=data.get("independent", False),
+                            branches=data.get("branches")
                         )
                 else:
                     self.create_session([questions])
@@ -460,18 +1015,32 @@ class AIConversationManager:
                     if isinstance(session_questions, dict):
                         # 处理包含标题和问题的字典格式
                         self.create_session(
-                            questions=session_questions.get("questions", []),
+                            questions=session_questions.get("prefix", session_questions.get("questions", [])),
                             title=session_questions.get("title"),
-                            session_id=session_id
+                            session_id=session_id,
+                            independent=session_questions.get("independent", False),
+                            branches=session_questions.get("branches")
                         )
                     else:
                         # 处理简单的问题列表
                         self.create_session(session_questions, session_id=session_id)
             
-            self.process_all_sessions()
+            with profile_run(self.config.profile_output):
+                self.process_all_sessions()
+            self._report_profile()
         except Exception as e:
             self.logger.error(f"Error processing questions: {str(e)}", exc_info=True)
             raise
+            
+    def _report_profile(self) -> None:
+        """打印各阶段耗时汇总表"""
+        if not self.profiler.enabled:
+            return
+        summary = self.profiler.format_table()
+        print(summary)
+        self.logger.info("Stage timing summary:\n%s", summary)
+        if self.config.profile_output:
+            self.logger.info(f"Profile written to {self.config.profile_output}")
 
 def main():
     """主函数：演示各种使用方式"""
@@ -486,41 +1055,40 @@ def main():
         model_name="qwen-plus"
     )
     
-    manager = AIConversationManager(config)
-    
-    # 示例1：处理单个相关问题序列
-    related_questions = [
-        "解释一下量子计算的基本原理。",
-        "基于上文，量子比特和经典比特有什么区别？",
-        "量子纠缠现象是什么？它在量子计算中起什么作用？"
-    ]
-    
-    # 示例2：处理多个独立的问题序列
-    independent_sessions = {
-        "math": [
-            "什么是微积分？",
-            "微积分在实际生活中有什么应用？"
-        ],
-        "physics": [
-            "什么是相对论？",
-            "为什么光速是宇宙速度的上限？"
+    with AIConversationManager(config) as manager:
+        # 示例1：处理单个相关问题序列
+        related_questions = [
+            "解释一下量子计算的基本原理。",
+            "基于上文，量子比特和经典比特有什么区别？",
+            "量子纠缠现象是什么？它在量子计算中起什么作用？"
         ]
-    }
+    
+        # 示例2：处理多个独立的问题序列
+        independent_sessions = {
+            "math": [
+                "什么是微积分？",
+                "微积分在实际生活中有什么应用？"
+            ],
+            "physics": [
+                "什么是相对论？",
+                "为什么光速是宇宙速度的上限？"
+            ]
+        }
     
     
-    # 处理所有示例
-    manager.process_questions(related_questions)  # 处理相关问题序列
+        # 处理所有示例
+        manager.process_questions(related_questions)  # 处理相关问题序列
     
-    manager.process_questions(independent_sessions)  # 处理独立问题序列
+        manager.process_questions(independent_sessions)  # 处理独立问题序列
     
-    # 示例3：从文件读取问题
-    questions_file = "questions.json"  # 或 "questions.txt"
-    if os.path.exists(questions_file):
-        manager.process_questions(questions_file)  # 从文件处理问题
+        # 示例3：从文件读取问题
+        questions_file = "questions.json"  # 或 "questions.txt"
+        if os.path.exists(questions_file):
+            manager.process_questions(questions_file)  # 从文件处理问题
 
-    questions_file = "questions.txt"  # 或 "questions.json"
-    if os.path.exists(questions_file):
-        manager.process_questions(questions_file)  # 从文件处理问题 
+        questions_file = "questions.txt"  # 或 "questions.json"
+        if os.path.exists(questions_file):
+            manager.process_questions(questions_file)  # 从文件处理问题 
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
@@ -0,0 +1,222 @@
+"""!
+@file formatters.py
+@brief 对话输出格式渲染器
+
+@details
+为每种输出格式提供预编译的渲染器：
+- 模板在渲染器创建时编译为 str.format 绑定方法，渲染时只做一次格式化
+- 时间戳按秒缓存，同一秒内的多次渲染不再重复调用 strftime
+- HTML 格式对问题与回答做转义，并提供完整的文件头和文件尾（</body></html>）
+- JSON 格式输出为合法的 JSON 数组（文件头 "["、条目间 ","、文件尾 "]"）
+- render_many 一次渲染多轮对话，减少字符串拼接与写入次数
+- SessionMarkdownWriter 在会话进行中逐块写出会话 Markdown，结束时回填结束时间
+
+@example
+    renderer = create_renderer(OutputFormat.HTML)
+    text = renderer.header + renderer.render("问题", "回答", {"number": 1}) + renderer.footer
+"""
+import time
+from html import escape
+from datetime import datetime
+from typing import Dict, Any, Iterable, Tuple
+
+from .serialization import get_serializer
+
+TurnRecord = Tuple[str, str, Dict[str, Any]]
+
+
+class TimestampCache:
+    """按秒缓存的格式化时间戳"""
+
+    def __init__(self, fmt: str = "%Y-%m-%d %H:%M:%S"):
+        self.fmt = fmt
+        self._second = None
+        self._text = ""
+
+    def now(self) -> str:
+        """返回当前时间的格式化字符串"""
+        second = int(time.time())
+        if second != self._second:
+            self._second = second
+            self._text = time.strftime(self.fmt, time.localtime(second))
+        return self._text
+
+
+class OutputRenderer:
+    """渲染器基类：子类定义 header、footer、separator 与 template"""
+
+    header = ""
+    footer = ""
+    separator = ""  # 相邻条目之间的分隔符
+    template = ""
+
+    def __init__(self):
+        self._format = self.template.format
+        self._clock = TimestampCache()
+
+    def _fields(self, problem: str, response: str, metadata: Dict[str, Any],
+                timestamp: str) -> Dict[str, Any]:
+        """返回模板字段"""
+        return {"number": metadata['number'], "timestamp": timestamp,
+                "problem": problem, "response": response}
+
+    def render(self, problem: str, response: str, metadata: Dict[str, Any],
+               timestamp: str = None) -> str:
+        """渲染单轮对话"""
+        return self._format(**self._fields(problem, response, metadata,
+                                           timestamp or self._clock.now()))
+
+    def render_many(self, turns: Iterable[TurnRecord], first: bool = True) -> str:
+        """批量渲染多轮对话，first=False 表示文件中已有条目"""
+        timestamp = self._clock.now()
+        parts = [self.render(problem, response, metadata, timestamp)
+                 for problem, response, metadata in turns]
+        if not parts:
+            return ""
+        text = self.separator.join(parts)
+        return text if first else self.separator + text
+
+
+class MarkdownRenderer(OutputRenderer):
+    """Markdown 格式渲染器"""
+
+    header = "# AI对话记录\n\n"
+    template = ("\n## 问题 {number} - {timestamp}\n\n"
+                "### 问题描述：\n{problem}\n\n"
+                "### 回答：\n{response}\n\n---\n")
+
+
+class HTMLRenderer(OutputRenderer):
+    """HTML 格式渲染器（内容已转义）"""
+
+    header = ("<html><head><meta charset=\"utf-8\"><title>AI对话记录</title>"
+              "<style>.qa-pair p{white-space:pre-wrap}</style></head>"
+              "<body><h1>AI对话记录</h1>")
+    footer = "</body></html>\n"
+    template = ("<div class='qa-pair'>"
+                "<h2>问题 {number} - {timestamp}</h2>"
+                "<h3>问题描述：</h3><p>{problem}</p>"
+                "<h3>回答：</h3><p>{response}</p>"
+                "<hr></div>")
+
+    def _fields(self, problem, response, metadata, timestamp):
+        return {"number": metadata['number'], "timestamp": timestamp,
+                "problem": escape(problem, quote=False),
+                "response": escape(response, quote=False)}
+
+
+class JSONRenderer(OutputRenderer):
+    """JSON 数组格式渲染器"""
+
+    header = "["
+    footer = "]\n"
+    separator = ","
+
+    def __init__(self, serializer=None):
+        """
+        :param serializer: 序列化后端（get_serializer 的返回值），默认自动选择
+        """
+        super().__init__()
+        self._dumps = (serializer or get_serializer()).dumps
+
+    def render(self, problem, response, metadata, timestamp=None):
+        return self._dumps({
+            "number": metadata['number'],
+            "timestamp": timestamp or self._clock.now(),
+            "problem": problem,
+            "response": response,
+            "metadata": metadata
+        }).decode('utf-8')
+
+
+class TextRenderer(OutputRenderer):
+    """纯文本格式渲染器"""
+
+    header = "=== AI对话记录 ===\n\n"
+    template = "\n=== 问题 {number} - {timestamp} ===\n问题：{problem}\n回答：{response}\n\n"
+
+
+RENDERERS = {
+    "markdown": MarkdownRenderer,
+    "html": HTMLRenderer,
+    "json": JSONRenderer,
+    "txt": TextRenderer,
+}
+
+
+def create_renderer(output_format, serializer=None) -> OutputRenderer:
+    """根据输出格式（OutputFormat 或其取值）创建渲染器；serializer 只用于 JSON 输出"""
+    value = getattr(output_format, "value", output_format)
+    if value == "json":
+        return JSONRenderer(serializer)
+    return RENDERERS.get(value, TextRenderer)()
+
+
+class SessionMarkdownWriter:
+    """会话 Markdown 的流式写入器
+
+    会话开始时写出模板中 {content} 之前的部分，每个问答块完成后立即追加写入；
+    模板头部中的 {end_time} 先写为固定宽度的占位区，关闭时原地回填。
+    """
+
+    TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+    PENDING = "进行中"
+    _MARKER = "\x00end_time\x00"
+
+    def __init__(self, path: str, template: str, title: str, session_id: str, start_time: datetime):
+        self.path = path
+        self.fields = {"title": title, "session_id": session_id,
+                       "start_time": start_time.strftime(self.TIME_FORMAT)}
+        head, _, self._tail = template.partition("{content}")
+        slot_width = len(start_time.strftime(self.TIME_FORMAT).encode('utf-8'))
+        pending = self.PENDING.encode('utf-8').ljust(slot_width)
+        chunks = head.format(end_time=self._MARKER, **self.fields).encode('utf-8').split(
+            self._MARKER.encode('utf-8'))
+
+        self._file = open(path, 'wb')
+        self._slots = []  # 结束时间占位区的字节偏移
+        offset = 0
+        for index, chunk in enumerate(chunks):
+            if index:
+                self._slots.append(offset)
+                self._file.write(pending)
+                offset += len(pending)
+            self._file.write(chunk)
+            offset += len(chunk)
+        self._file.flush()
+        self._first = True
+        self._branch = None
+
+    def write_qa(self, qa: Dict[str, Any]) -> None:
+        """追加一个问答块（分支变化时先写分支标题）"""
+        parts = []
+        if qa.get("branch") != self._branch:
+            self._branch = qa.get("branch")
+            parts.append(f"## 分支：{self._branch}\n")
+        parts.append(f"### 问题 {qa['number']}\n")
+        parts.append(f"**问题描述：**\n{qa['question']}\n")
+        parts.append(f"**回答：**\n{qa['response']}\n")
+        parts.append("---\n")
+        text = "\n".join(parts)
+        if not self._first:
+            text = "\n" + text
+        self._first = False
+        self._file.write(text.encode('utf-8'))
+        self._file.flush()
+
+    def write_many(self, qas: Iterable[Dict[str, Any]]) -> None:
+        """依次追加多个问答块"""
+        for qa in qas:
+            self.write_qa(qa)
+
+    def close(self, end_time: datetime) -> None:
+        """写入模板尾部并回填结束时间"""
+        if self._file is None:
+            return
+        end_text = end_time.strftime(self.TIME_FORMAT)
+        self._file.write(self._tail.format(end_time=end_text, **self.fields).encode('utf-8'))
+        for offset in self._slots:
+            self._file.seek(offset)
+            self._file.write(end_text.encode('utf-8'))
+        self._file.close()
+        self._file = None
@@ -0,0 +1,236 @@
+"""!
+@file history_exporter.py
+@brief 对话历史列式导出工具
+
+@details
+将会话、对话轮次、耗时与 token 统计写入列式文件（Parquet 或 Arrow IPC），
+供分析任务按列读取，避免反复解析 JSON/Markdown：
+- 数据按列缓存在内存中，达到批大小后写出一个 row group / record batch
+- 轮次表与会话表分别写入两个文件
+- 支持把已有的 chat_history_*.json 文件转换为轮次记录
+- 写出过程中使用 .partial 临时文件，close() 写入文件尾后才重命名为最终文件名，
+  异常退出时不会留下缺少文件尾、无法读取的导出文件
+
+@note
+依赖可选包 pyarrow（pip install "hjimi_openai[analytics]"）。
+
+@example
+    exporter = ColumnarHistoryExporter("output/analytics/run1", export_format="parquet")
+    exporter.add_turn({"session_id": "s1", "turn": 1, "question": "...", "response": "..."})
+    exporter.close()
+"""
+import os
+from typing import List, Dict, Any, Optional
+
+from .serialization import load_file
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc as pa_ipc
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - 可选依赖
+    pa = None
+    pa_ipc = None
+    pq = None
+
+# 轮次表字段定义：(字段名, pyarrow 类型名)
+TURN_FIELDS = [
+    ("session_id", "string"),
+    ("session_title", "string"),
+    ("turn", "int32"),
+    ("question", "string"),
+    ("response", "string"),
+    ("started_at", "timestamp"),
+    ("finished_at", "timestamp"),
+    ("duration_ms", "float64"),
+    ("prompt_tokens", "int64"),
+    ("completion_tokens", "int64"),
+    ("total_tokens", "int64"),
+    ("model", "string"),
+]
+
+# 会话表字段定义
+SESSION_FIELDS = [
+    ("session_id", "string"),
+    ("title", "string"),
+    ("start_time", "timestamp"),
+    ("end_time", "timestamp"),
+    ("duration_ms", "float64"),
+    ("turns", "int32"),
+    ("prompt_tokens", "int64"),
+    ("completion_tokens", "int64"),
+    ("total_tokens", "int64"),
+]
+
+EXPORT_SUFFIXES = {
+    "parquet": ".parquet",
+    "arrow": ".arrow",
+}
+
+
+def _require_pyarrow():
+    """确保 pyarrow 可用"""
+    if pa is None:
+        raise ImportError(
+            "Columnar export requires pyarrow, install it with: pip install pyarrow"
+        )
+
+
+def _build_schema(fields: List[tuple]):
+    """根据字段定义构建 pyarrow schema"""
+    types = {
+        "string": pa.string(),
+        "int32": pa.int32(),
+        "int64": pa.int64(),
+        "float64": pa.float64(),
+        "timestamp": pa.timestamp("ms"),
+    }
+    return pa.schema([(name, types[type_name]) for name, type_name in fields])
+
+
+class _ColumnarTable:
+    """单个列式表的缓冲写入器"""
+
+    def __init__(self, path: str, fields: List[tuple], export_format: str,
+                 batch_size: int, compression: Optional[str]):
+        self.path = path
+        self.temp_path = path + ".partial"  # 写入中的文件，close() 后重命名为 path
+        self.fields = fields
+        self.export_format = export_format
+        self.batch_size = batch_size
+        self.compression = compression
+        self.schema = _build_schema(fields)
+        self.columns = {name: [] for name, _ in fields}
+        self.rows_written = 0
+        self._writer = None
+        self._sink = None
+
+    def __len__(self) -> int:
+        return len(self.columns[self.fields[0][0]])
+
+    def append(self, record: Dict[str, Any]) -> None:
+        """追加一行，缺失字段记为空值"""
+        for name, _ in self.fields:
+            self.columns[name].append(record.get(name))
+        if len(self) >= self.batch_size:
+            self.flush()
+
+    def _open_writer(self) -> None:
+        """首次写出时再创建（临时）文件，避免产生空文件"""
+        if self.export_format == "parquet":
+            self._writer = pq.ParquetWriter(
+                self.temp_path, self.schema, compression=self.compression or "none"
+            )
+        else:
+            options = pa_ipc.IpcWriteOptions(compression=self.compression)
+            self._sink = pa.OSFile(self.temp_path, "wb")
+            self._writer = pa_ipc.new_file(self._sink, self.schema, options=options)
+
+    def flush(self) -> None:
+        """将缓冲区写出为一个 row group / record batch"""
+        row_count = len(self)
+        if row_count == 0:
+            return
+        if self._writer is None:
+            self._open_writer()
+        batch = pa.RecordBatch.from_pydict(self.columns, schema=self.schema)
+        if self.export_format == "parquet":
+            self._writer.write_table(pa.Table.from_batches([batch]))
+        else:
+            self._writer.write_batch(batch)
+        self.rows_written += row_count
+        self.columns = {name: [] for name, _ in self.fields}
+
+    def close(self) -> None:
+        """写出剩余数据，写入文件尾后把临时文件重命名为最终文件"""
+        self.flush()
+        if self._writer is None:
+            return
+        self._writer.close()
+        self._writer = None
+        if self._sink is not None:
+            self._sink.close()
+            self._sink = None
+        os.replace(self.temp_path, self.path)
+
+
+class ColumnarHistoryExporter:
+    """对话历史列式导出器
+
+    生成两个文件：<base_path>_turns.<ext> 与 <base_path>_sessions.<ext>
+    """
+
+    def __init__(self, base_path: str, export_format: str = "parquet",
+                 batch_size: int = 500, compression: Optional[str] = "zstd"):
+        _require_pyarrow()
+        if export_format not in EXPORT_SUFFIXES:
+            raise ValueError(f"Unsupported export format: {export_format}")
+
+        directory = os.path.dirname(base_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        suffix = EXPORT_SUFFIXES[export_format]
+        self.export_format = export_format
+        self.turns_path = f"{base_path}_turns{suffix}"
+        self.sessions_path = f"{base_path}_sessions{suffix}"
+        self.turns = _ColumnarTable(
+            self.turns_path, TURN_FIELDS, export_format, batch_size, compression
+        )
+        self.sessions = _ColumnarTable(
+            self.sessions_path, SESSION_FIELDS, export_format, batch_size, compression
+        )
+        self.closed = False
+
+    def add_turn(self, record: Dict[str, Any]) -> None:
+        """添加一条对话轮次记录"""
+        self.turns.append(record)
+
+    def add_session(self, record: Dict[str, Any]) -> None:
+        """添加一条会话汇总记录"""
+        self.sessions.append(record)
+
+    def export_history_file(self, file_path: str, session_id: str = None) -> int:
+        """将 chat_history_*.json/.msgpack 文件转换为轮次记录，返回导入的轮次数"""
+        history = load_file(file_path)
+
+        session_id = session_id or os.path.splitext(os.path.basename(file_path))[0]
+        count = 0
+        question = None
+        for message in history:
+            role = message.get("role")
+            if role == "user":
+                question = message.get("content")
+            elif role == "assistant":
+                count += 1
+                self.add_turn({
+                    "session_id": session_id,
+                    "turn": count,
+                    "question": question,
+                    "response": message.get("content"),
+                })
+                question = None
+        return count
+
+    def flush(self) -> None:
+        """写出所有缓冲数据"""
+        self.turns.flush()
+        self.sessions.flush()
+
+    def close(self) -> None:
+        """关闭导出器"""
+        if self.closed:
+            return
+        self.turns.close()
+        self.sessions.close()
+        self.closed = True
+
+
+def read_columns(file_path: str, columns: List[str] = None):
+    """按列读取导出的文件，返回 pyarrow.Table"""
+    _require_pyarrow()
+    if file_path.endswith(EXPORT_SUFFIXES["parquet"]):
+        return pq.read_table(file_path, columns=columns)
+    with pa.memory_map(file_path, "r") as source:
+        table = pa_ipc.open_file(source).read_all()
+    return table.select(columns) if columns else table
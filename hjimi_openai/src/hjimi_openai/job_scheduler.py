@@ -0,0 +1,313 @@
+"""!
+@file job_scheduler.py
+@brief 对话任务的优先级队列与调度器
+
+@details
+交互式问题与 process_questions 大批量任务共用同一组管理器时，批量任务会饿死交互请求。
+本模块提供：
+- 优先级：INTERACTIVE > NORMAL > BATCH，高优先级任务总是先被取出
+- 公平共享：同一优先级内按租户（tenant，例如用户或会话）轮转取任务，
+  同一租户同时只有一个任务在执行，保证其对话历史按顺序推进
+- 截止时间：排队超过截止时间的任务直接以 DeadlineExceeded 失败，不再调用模型
+- 取消：任务开始执行前可随时取消
+- 预留交互工作线程与批量并发上限，批量任务占满模型配额时交互请求仍能立即执行
+
+@example
+    scheduler = JobScheduler.for_managers([manager_a, manager_b], reserved_interactive_workers=1)
+    scheduler.start()
+    job = scheduler.submit("什么是量子计算？", tenant="alice", priority=JobPriority.INTERACTIVE)
+    print(job.result(timeout=60))
+    scheduler.shutdown()
+"""
+import time
+import itertools
+import threading
+from enum import IntEnum
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import List, Dict, Any, Optional, Callable, Deque
+
+
+class JobPriority(IntEnum):
+    """任务优先级（数值越小越优先）"""
+    INTERACTIVE = 0
+    NORMAL = 1
+    BATCH = 2
+
+
+class DeadlineExceeded(TimeoutError):
+    """任务在开始执行前已超过截止时间"""
+
+
+_job_ids = itertools.count(1)
+
+
+@dataclass
+class ConversationJob:
+    """对话任务"""
+    problem: str
+    tenant: str = "default"
+    priority: JobPriority = JobPriority.NORMAL
+    deadline: Optional[float] = None  # time.monotonic() 时间点
+    metadata: Dict[str, Any] = field(default_factory=dict)
+    job_id: int = field(default_factory=lambda: next(_job_ids))
+    submitted_at: float = field(default_factory=time.monotonic)
+    future: Future = field(default_factory=Future, repr=False)
+
+    def cancel(self) -> bool:
+        """取消任务，已开始执行的任务无法取消"""
+        return self.future.cancel()
+
+    def result(self, timeout: float = None) -> Any:
+        """等待并返回任务结果"""
+        return self.future.result(timeout)
+
+    @property
+    def expired(self) -> bool:
+        return self.deadline is not None and time.monotonic() > self.deadline
+
+
+JobHandler = Callable[[ConversationJob], Any]
+
+
+class JobScheduler:
+    """多租户优先级调度器"""
+
+    def __init__(self, handlers: List[JobHandler], reserved_interactive_workers: int = 0,
+                 max_batch_inflight: Optional[int] = None, latency_window: int = 1000):
+        """
+        :param handlers: 每个工作线程一个处理函数，handler(job) 返回任务结果
+        :param reserved_interactive_workers: 只处理 INTERACTIVE 任务的工作线程数
+        :param max_batch_inflight: 同时执行的 BATCH 任务上限（默认不限）
+        :param latency_window: 每个优先级保留的最近延迟样本数
+        """
+        if not handlers:
+            raise ValueError("At least one handler is required")
+        if reserved_interactive_workers >= len(handlers):
+            raise ValueError("reserved_interactive_workers must leave at least one general worker")
+        self.handlers = handlers
+        self.reserved_interactive_workers = reserved_interactive_workers
+        self.max_batch_inflight = max_batch_inflight
+        self._cond = threading.Condition()
+        self._queues: Dict[JobPriority, "OrderedDict[str, Deque[ConversationJob]]"] = {
+            priority: OrderedDict() for priority in JobPriority
+        }
+        self._busy_tenants = set()
+        self._batch_inflight = 0
+        self._pending = 0
+        self._running = False
+        self._workers: List[threading.Thread] = []
+        self._latencies = {priority: deque(maxlen=latency_window) for priority in JobPriority}
+        self._counters = {"completed": 0, "failed": 0, "cancelled": 0, "expired": 0}
+        self._counter_lock = threading.Lock()
+
+    @classmethod
+    def for_managers(cls, managers: list, max_tenants: int = 1024, **kwargs) -> "JobScheduler":
+        """为一组 AIConversationManager 创建调度器（每个管理器一个工作线程）
+
+        每个租户拥有独立的对话记忆，通过 manager.answer 在该记忆上回答，不修改管理器自己的记忆；
+        回答只作为任务结果返回，不写入管理器的输出文件。
+        :param max_tenants: 保留记忆的租户上限，超出时丢弃最久未使用租户的记忆（其历史重新开始）
+        """
+        tenant_memories: "OrderedDict[str, Any]" = OrderedDict()
+        tenant_turns: Dict[str, int] = {}
+        memory_lock = threading.Lock()
+
+        def make_handler(manager):
+            def handler(job: ConversationJob):
+                with memory_lock:
+                    memory = tenant_memories.get(job.tenant)
+                    if memory is None:
+                        memory = tenant_memories[job.tenant] = type(manager.memory)()
+                        tenant_turns[job.tenant] = 0
+                        while len(tenant_memories) > max_tenants:
+                            evicted, _ = tenant_memories.popitem(last=False)
+                            del tenant_turns[evicted]
+                    else:
+                        tenant_memories.move_to_end(job.tenant)
+                    tenant_turns[job.tenant] += 1
+                    metadata = dict(job.metadata)
+                    metadata["number"] = tenant_turns[job.tenant]
+                metadata.setdefault("tenant", job.tenant)
+                return manager.answer(job.problem, memory, metadata)
+            return handler
+
+        scheduler = cls([make_handler(manager) for manager in managers], **kwargs)
+        scheduler.tenant_memories = tenant_memories
+        return scheduler
+
+    def start(self) -> None:
+        """启动工作线程"""
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+        for index, handler in enumerate(self.handlers):
+            interactive_only = index < self.reserved_interactive_workers
+            worker = threading.Thread(
+                target=self._worker_loop, args=(handler, interactive_only),
+                name=f"hjimi-scheduler-{index}", daemon=True
+            )
+            worker.start()
+            self._workers.append(worker)
+
+    def submit(self, problem: str, tenant: str = "default",
+               priority: JobPriority = JobPriority.NORMAL, timeout: float = None,
+               metadata: Dict[str, Any] = None) -> ConversationJob:
+        """提交任务
+
+        :param timeout: 从提交起计算的截止时间（秒），排队超时的任务不会被执行
+        """
+        job = ConversationJob(
+            problem=problem, tenant=tenant, priority=JobPriority(priority),
+            deadline=time.monotonic() + timeout if timeout is not None else None,
+            metadata=metadata or {}
+        )
+        self.submit_job(job)
+        return job
+
+    def submit_job(self, job: ConversationJob) -> ConversationJob:
+        """提交已构造的任务"""
+        with self._cond:
+            if not self._running and self._workers:
+                raise RuntimeError("Scheduler has been shut down")
+            self._queues[job.priority].setdefault(job.tenant, deque()).append(job)
+            self._pending += 1
+            self._cond.notify_all()
+        return job
+
+    def submit_batch(self, problems: List[str], tenant: str = "batch",
+                     priority: JobPriority = JobPriority.BATCH, **kwargs) -> List[ConversationJob]:
+        """批量提交同一租户的任务（按顺序执行）"""
+        return [self.submit(problem, tenant=tenant, priority=priority, **kwargs) for problem in problems]
+
+    def _count(self, name: str) -> None:
+        """累加统计计数"""
+        with self._counter_lock:
+            self._counters[name] += 1
+
+    def _fail(self, job: ConversationJob, error: Exception, counter: str) -> None:
+        """在不持锁的情况下标记任务失败"""
+        if job.future.set_running_or_notify_cancel():
+            job.future.set_exception(error)
+            self._count(counter)
+        else:
+            self._count("cancelled")
+
+    def _take_job(self, interactive_only: bool, dropped: List[ConversationJob]) -> Optional[ConversationJob]:
+        """取出下一个可执行任务（调用方持有锁）；已取消或超时的任务放入 dropped"""
+        for priority in JobPriority:
+            if interactive_only and priority != JobPriority.INTERACTIVE:
+                break
+            if priority == JobPriority.BATCH and self.max_batch_inflight is not None \
+                    and self._batch_inflight >= self.max_batch_inflight:
+                continue
+            tenants = self._queues[priority]
+            for tenant in list(tenants):
+                if tenant in self._busy_tenants:
+                    continue
+                queue = tenants[tenant]
+                job = None
+                while queue:
+                    candidate = queue.popleft()
+                    self._pending -= 1
+                    if candidate.future.cancelled() or candidate.expired:
+                        dropped.append(candidate)
+                        continue
+                    job = candidate
+                    break
+                if queue:
+                    tenants.move_to_end(tenant)  # 轮转，保证租户间公平
+                else:
+                    del tenants[tenant]
+                if job is not None:
+                    self._busy_tenants.add(tenant)
+                    if priority == JobPriority.BATCH:
+                        self._batch_inflight += 1
+                    return job
+        return None
+
+    def _worker_loop(self, handler: JobHandler, interactive_only: bool) -> None:
+        """工作线程主循环"""
+        while True:
+            dropped: List[ConversationJob] = []
+            with self._cond:
+                job = self._take_job(interactive_only, dropped)
+                while job is None and not dropped:
+                    if not self._running:
+                        return
+                    self._cond.wait()
+                    job = self._take_job(interactive_only, dropped)
+
+            for stale in dropped:
+                if stale.future.cancelled():
+                    self._count("cancelled")
+                else:
+                    self._fail(stale, DeadlineExceeded(f"Job {stale.job_id} missed its deadline"), "expired")
+            if job is None:
+                continue
+
+            try:
+                if job.future.set_running_or_notify_cancel():
+                    try:
+                        result = handler(job)
+                    except Exception as e:
+                        job.future.set_exception(e)
+                        self._count("failed")
+                    else:
+                        job.future.set_result(result)
+                        self._count("completed")
+                    self._latencies[job.priority].append(time.monotonic() - job.submitted_at)
+                else:
+                    self._count("cancelled")
+            finally:
+                with self._cond:
+                    self._busy_tenants.discard(job.tenant)
+                    if job.priority == JobPriority.BATCH:
+                        self._batch_inflight -= 1
+                    self._cond.notify_all()
+
+    def cancel_tenant(self, tenant: str) -> int:
+        """取消某租户所有排队中的任务，返回取消数量"""
+        count = 0
+        with self._cond:
+            for tenants in self._queues.values():
+                for job in tenants.get(tenant, ()):
+                    count += job.cancel()
+        return count
+
+    def shutdown(self, wait: bool = True, cancel_pending: bool = False) -> None:
+        """停止调度器；默认执行完已排队的任务后退出"""
+        with self._cond:
+            if cancel_pending:
+                for tenants in self._queues.values():
+                    for queue in tenants.values():
+                        for job in queue:
+                            job.cancel()
+            self._running = False
+            self._cond.notify_all()
+        if wait:
+            for worker in self._workers:
+                worker.join()
+
+    def pending(self) -> int:
+        """排队中的任务数"""
+        with self._cond:
+            return self._pending
+
+    def stats(self) -> Dict[str, Any]:
+        """返回计数与各优先级的延迟分位数（秒）"""
+        latency = {}
+        for priority, samples in self._latencies.items():
+            ordered = sorted(samples)
+            if not ordered:
+                continue
+            latency[priority.name.lower()] = {
+                "count": len(ordered),
+                "p50": ordered[len(ordered) // 2],
+                "p99": ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))],
+            }
+        with self._counter_lock:
+            counters = dict(self._counters)
+        return {**counters, "pending": self.pending(), "latency": latency}
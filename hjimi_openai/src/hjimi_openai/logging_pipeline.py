@@ -0,0 +1,155 @@
+"""!
+@file logging_pipeline.py
+@brief 非阻塞的结构化日志管道
+
+@details
+为每个对话管理器建立独立的日志管道，替代全局的 logging.basicConfig：
+- 调用线程只把日志记录放入队列（QueueHandler），不做文件 I/O，不争用处理器锁
+- 后台线程（QueueListener）负责写文件和控制台
+- 文件日志为 JSON Lines 结构化记录，自动附带管理器ID与当前会话上下文
+- 会话上下文通过 contextvars 传递，并发线程之间互不干扰
+
+@example
+    pipeline = setup_manager_logging("hjimi_openai.demo", "output/conversation.log")
+    token = bind_log_context(session_id="math")
+    pipeline.logger.info("Processing %s", "question")
+    reset_log_context(token)
+    pipeline.stop()
+"""
+import copy
+import json
+import queue
+import atexit
+import logging
+import contextvars
+from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Any, Optional
+
+PLAIN_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+# 当前线程/任务的日志上下文（例如 session_id）
+_log_context: contextvars.ContextVar = contextvars.ContextVar("hjimi_log_context", default={})
+
+# LogRecord 的标准属性，序列化时跳过
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+
+def bind_log_context(**fields) -> contextvars.Token:
+    """在当前上下文中绑定日志字段，返回用于恢复的 token"""
+    return _log_context.set({**_log_context.get(), **fields})
+
+
+def reset_log_context(token: contextvars.Token) -> None:
+    """恢复 bind_log_context 之前的上下文"""
+    _log_context.reset(token)
+
+
+def get_log_context() -> Dict[str, Any]:
+    """返回当前日志上下文"""
+    return _log_context.get()
+
+
+class JsonLogFormatter(logging.Formatter):
+    """将日志记录格式化为单行 JSON"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "time": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "thread": record.threadName,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES and not key.startswith("_"):
+                payload[key] = value
+        if record.exc_info:
+            payload["exception"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            payload["exception"] = record.exc_text
+        if record.stack_info:
+            payload["stack"] = self.formatStack(record.stack_info)
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+class ContextQueueHandler(QueueHandler):
+    """在调用线程中附加上下文字段后入队"""
+
+    def __init__(self, log_queue: queue.Queue, static_fields: Dict[str, Any] = None):
+        super().__init__(log_queue)
+        self.static_fields = static_fields or {}
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        for key, value in self.static_fields.items():
+            setattr(record, key, value)
+        for key, value in _log_context.get().items():
+            setattr(record, key, value)
+        # 入队前合并消息参数并格式化异常，使记录可以安全地跨线程传递
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class ManagerLogging:
+    """单个管理器的日志管道"""
+
+    def __init__(self, logger: logging.Logger, handler: QueueHandler, listener: QueueListener):
+        self.logger = logger
+        self.handler = handler
+        self.listener = listener
+        self.running = True
+        # 后台线程是守护线程，解释器退出时未调用 stop 的管道也要写完队列中的记录
+        atexit.register(self.stop)
+
+    def stop(self) -> None:
+        """刷新队列中剩余的记录，停止后台线程，关闭处理器并注销 logger"""
+        if not self.running:
+            return
+        self.running = False
+        atexit.unregister(self.stop)
+        self.logger.removeHandler(self.handler)
+        self.listener.stop()
+        for handler in self.listener.handlers:
+            handler.close()
+        # 每个管理器的 logger 名称唯一，不注销会在 logging 模块中一直保留
+        logging.Logger.manager.loggerDict.pop(self.logger.name, None)
+
+
+def setup_manager_logging(name: str, log_file: str, level: int = logging.INFO,
+                          json_format: bool = True, console: bool = True,
+                          static_fields: Optional[Dict[str, Any]] = None) -> ManagerLogging:
+    """创建独立的队列日志管道
+
+    :param name: logger 名称（每个管理器唯一）
+    :param log_file: 日志文件路径
+    :param level: 日志级别
+    :param json_format: 文件日志是否使用 JSON Lines 格式
+    :param console: 是否同时输出到控制台
+    :param static_fields: 附加到每条记录的固定字段
+    """
+    file_handler = logging.FileHandler(log_file, encoding='utf-8')
+    file_handler.setFormatter(JsonLogFormatter() if json_format else logging.Formatter(PLAIN_FORMAT))
+    handlers = [file_handler]
+    if console:
+        stream_handler = logging.StreamHandler()
+        stream_handler.setFormatter(logging.Formatter(PLAIN_FORMAT))
+        handlers.append(stream_handler)
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = ContextQueueHandler(log_queue, static_fields)
+    listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+
+    logger = logging.getLogger(name)
+    logger.setLevel(level)
+    logger.propagate = False
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+    logger.addHandler(queue_handler)
+
+    listener.start()
+    return ManagerLogging(logger, queue_handler, listener)
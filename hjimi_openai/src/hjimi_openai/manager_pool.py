@@ -0,0 +1,162 @@
+"""!
+@file manager_pool.py
+@brief 多租户对话管理器池
+
+@details
+为每个用户请求创建 AIConversationManager 需要重新配置日志、截断输出文件并构建模型客户端，
+既慢又会泄漏日志处理器。管理器池只创建一次重量级资源，按租户提供轻量上下文：
+- 共享：配置、模型客户端、提示模板、日志管道、语义缓存、耗时统计
+- 租户的回答不经过共享管理器的流式输出回调，避免并发租户的 token 在终端和缓冲区中交错
+- 每个租户独立：对话记忆、对话计数、输出文件（首次写入时才打开，已有文件接着写入）
+- 获取上下文只做一次字典查找和一个小对象的创建，不涉及 I/O
+- 同一租户的请求串行执行，保证其对话历史按顺序推进；不同租户可并发
+
+@example
+    pool = ManagerPool(ConversationConfig(output_dir="output/pool"))
+    answer = pool.context("alice").ask("什么是量子计算？")
+    pool.context("alice").ask("它和经典计算有什么区别？")  # 延续 alice 的历史
+    pool.close()
+"""
+import os
+import re
+import threading
+from typing import List, Dict, Optional
+
+from .ai_conversation_manager import (
+    AIConversationManager, ConversationConfig, ConversationOutputHandler, EnhancedMemory, MESSAGE_ROLES
+)
+from .logging_pipeline import bind_log_context, reset_log_context
+
+_UNSAFE_CHARS = re.compile(r'[^\w.-]+')
+
+
+class TenantState:
+    """租户状态：记忆、计数与延迟创建的输出文件"""
+
+    __slots__ = ("tenant_id", "memory", "conversation_count", "output_path", "output_handler", "lock")
+
+    def __init__(self, tenant_id: str, max_history_length: int, output_path: Optional[str]):
+        self.tenant_id = tenant_id
+        self.memory = EnhancedMemory(max_history_length=max_history_length)
+        self.conversation_count = 0
+        self.output_path = output_path
+        self.output_handler: Optional[ConversationOutputHandler] = None
+        self.lock = threading.Lock()
+
+
+class TenantContext:
+    """租户上下文：共享池中的模型与日志，使用租户自己的记忆与输出"""
+
+    __slots__ = ("pool", "state")
+
+    def __init__(self, pool: "ManagerPool", state: TenantState):
+        self.pool = pool
+        self.state = state
+
+    @property
+    def tenant_id(self) -> str:
+        return self.state.tenant_id
+
+    @property
+    def memory(self) -> EnhancedMemory:
+        return self.state.memory
+
+    def ask(self, problem: str, metadata: dict = None) -> str:
+        """在租户自己的历史上回答问题"""
+        return self.pool._ask(self.state, problem, metadata)
+
+    def get_chat_history(self) -> List[Dict[str, str]]:
+        """获取租户的对话历史"""
+        return [{"role": MESSAGE_ROLES.get(msg.type, "unknown"), "content": msg.content}
+                for msg in self.state.memory.chat_history.messages]
+
+    def clear_history(self) -> None:
+        """清空租户的对话历史"""
+        with self.state.lock:
+            self.state.memory.clear()
+
+
+class ManagerPool:
+    """共享重量级资源的多租户管理器池"""
+
+    def __init__(self, config: ConversationConfig = None, manager: AIConversationManager = None,
+                 tenant_output: bool = True):
+        """
+        :param config: 对话配置（未提供 manager 时用于创建共享管理器）
+        :param manager: 已创建的共享管理器（其模型、日志、提示模板供所有租户使用）
+        :param tenant_output: 是否为每个租户写入 output_dir/tenants/<租户>.<格式> 输出文件
+        """
+        self.manager = manager or AIConversationManager(config)
+        self.config = self.manager.config
+        self.logger = self.manager.logger
+        self.tenant_output = tenant_output
+        self.tenant_dir = os.path.join(self.config.output_dir, "tenants")
+        self._tenants: Dict[str, TenantState] = {}
+        self._lock = threading.Lock()
+
+    def context(self, tenant_id: str) -> TenantContext:
+        """获取租户上下文（首次访问时创建租户状态）"""
+        state = self._tenants.get(tenant_id)
+        if state is None:
+            with self._lock:
+                state = self._tenants.get(tenant_id)
+                if state is None:
+                    output_path = None
+                    if self.tenant_output:
+                        name = _UNSAFE_CHARS.sub("_", tenant_id) or "default"
+                        output_path = os.path.join(self.tenant_dir,
+                                                   f"{name}.{self.config.output_format.value}")
+                    state = self._tenants[tenant_id] = TenantState(
+                        tenant_id, self.config.max_history_length, output_path)
+        return TenantContext(self, state)
+
+    def tenants(self) -> List[str]:
+        """返回已创建的租户"""
+        return list(self._tenants)
+
+    def _ask(self, state: TenantState, problem: str, metadata: Optional[dict]) -> str:
+        """处理单个租户的一轮对话"""
+        manager = self.manager
+        log_token = bind_log_context(tenant=state.tenant_id)
+        try:
+            with state.lock:
+                state.conversation_count += 1
+                metadata = dict(metadata or {})
+                metadata["number"] = state.conversation_count
+                metadata.setdefault("tenant", state.tenant_id)
+                content = manager.answer(problem, state.memory, metadata, callbacks=[])
+
+                if state.output_path is not None:
+                    with manager.profiler.stage("output_write"):
+                        if state.output_handler is None:
+                            # 租户释放或进程重启后再次访问时接着写入，不覆盖之前的输出
+                            state.output_handler = ConversationOutputHandler(
+                                self.config.output_format, state.output_path, manager.serializer,
+                                append=True)
+                        state.output_handler.write_turn(problem, content, metadata)
+                return content
+        except Exception as e:
+            self.logger.error(f"Error processing tenant {state.tenant_id}: {str(e)}", exc_info=True)
+            raise
+        finally:
+            reset_log_context(log_token)
+
+    def release(self, tenant_id: str) -> None:
+        """释放租户：关闭其输出文件并丢弃记忆"""
+        with self._lock:
+            state = self._tenants.pop(tenant_id, None)
+        if state is not None and state.output_handler is not None:
+            with state.lock:
+                state.output_handler.close()
+
+    def close(self) -> None:
+        """释放所有租户并关闭共享管理器"""
+        for tenant_id in self.tenants():
+            self.release(tenant_id)
+        self.manager.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,242 @@
+"""!
+@file output_shards.py
+@brief 对话输出文件的分片与轮转
+
+@details
+默认情况下所有会话的回答写入同一个 conversation.<fmt> 文件，且每次启动都会被截断。
+分片模式下：
+- 输出写入 shards/ 目录下的多个分片文件，按大小或轮数轮转，启动时不会覆盖已有分片
+- 分片按时间或会话命名（按会话命名时，会话切换也会触发轮转）
+- manifest.jsonl 记录每个分片以及每个会话在分片中的字节偏移，读取某个会话时只需定位到对应分片
+- 已写完的分片可在后台线程中压缩为 .gz，不阻塞对话处理
+
+@example
+    writer = ShardedOutputWriter("output/shards", renderer, "markdown", max_turns=1000)
+    writer.write_turns([("问题", "回答", {"number": 1, "session_id": "math"})])
+    writer.close()
+
+    manifest = ShardManifest("output/shards")
+    print(manifest.read_session("math"))
+"""
+import os
+import re
+import json
+import gzip
+import shutil
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional, Tuple
+
+from .formatters import OutputRenderer, TurnRecord
+
+MANIFEST_NAME = "manifest.jsonl"
+DEFAULT_SESSION = "default"
+
+_UNSAFE_CHARS = re.compile(r'[^\w.-]+')
+
+
+class ShardedOutputWriter:
+    """按大小/轮数轮转的分片输出写入器"""
+
+    def __init__(self, shard_dir: str, renderer: OutputRenderer, extension: str,
+                 max_bytes: int = 0, max_turns: int = 0, naming: str = "time",
+                 compress: bool = False, prefix: str = "conversation"):
+        """
+        :param shard_dir: 分片目录
+        :param renderer: 输出渲染器（每个分片都有完整的文件头和文件尾）
+        :param extension: 分片文件扩展名
+        :param max_bytes: 分片大小上限（字节，0 表示不限）
+        :param max_turns: 每个分片的最大轮数（0 表示不限）
+        :param naming: 分片命名方式："time"（按打开时间）/"session"（按会话，会话切换时轮转）
+        :param compress: 是否在后台把写完的分片压缩为 .gz
+        """
+        if naming not in ("time", "session"):
+            raise ValueError(f"Unsupported shard naming: {naming}")
+        self.shard_dir = shard_dir
+        self.renderer = renderer
+        self.extension = extension
+        self.max_bytes = max_bytes
+        self.max_turns = max_turns
+        self.naming = naming
+        self.compress = compress
+        self.prefix = prefix
+        self.manifest_path = os.path.join(shard_dir, MANIFEST_NAME)
+        self.current_path: Optional[str] = None
+        self._file = None
+        self._shard_name = None
+        self._shard_bytes = 0
+        self._shard_turns = 0
+        self._segment_session = None
+        self._manifest_lock = threading.Lock()
+        self._compressor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="hjimi-shard-gzip") \
+            if compress else None
+        os.makedirs(shard_dir, exist_ok=True)
+        self._sequence = self._count_existing_shards()
+        self._manifest = open(self.manifest_path, 'a', encoding='utf-8')
+
+    def _count_existing_shards(self) -> int:
+        """统计已有分片数，新分片序号接着往后编"""
+        if not os.path.exists(self.manifest_path):
+            return 0
+        with open(self.manifest_path, 'r', encoding='utf-8') as f:
+            return sum(1 for line in f if '"event": "open"' in line)
+
+    def _log(self, event: str, **fields) -> None:
+        """追加一条清单记录"""
+        line = json.dumps({"event": event, "shard": self._shard_name, **fields}, ensure_ascii=False)
+        with self._manifest_lock:
+            self._manifest.write(line + "\n")
+            self._manifest.flush()
+
+    def _open_shard(self, session_id: str) -> None:
+        """打开新分片并写入文件头"""
+        if self.naming == "session":
+            label = _UNSAFE_CHARS.sub("_", session_id) or DEFAULT_SESSION
+        else:
+            label = datetime.now().strftime("%Y%m%d_%H%M%S")
+        while True:
+            self._sequence += 1
+            name = f"{self.prefix}_{label}_{self._sequence:05d}.{self.extension}"
+            path = os.path.join(self.shard_dir, name)
+            if not os.path.exists(path) and not os.path.exists(path + ".gz"):
+                break
+        self._file = open(path, 'wb')
+        self._shard_name = name
+        self.current_path = path
+        self._shard_turns = 0
+        self._segment_session = None
+        header = self.renderer.header.encode('utf-8')
+        self._file.write(header)
+        self._shard_bytes = len(header)
+        self._log("open", created=datetime.now().isoformat(timespec="seconds"))
+
+    def _close_shard(self) -> None:
+        """写入文件尾并关闭当前分片，按需提交后台压缩"""
+        if self._file is None:
+            return
+        content_end = self._shard_bytes
+        self._file.write(self.renderer.footer.encode('utf-8'))
+        self._file.close()
+        self._file = None
+        self._log("close", end=content_end, turns=self._shard_turns)
+        if self._compressor is not None:
+            self._compressor.submit(self._compress_shard, self._shard_name, self.current_path)
+        self.current_path = None
+
+    def _compress_shard(self, name: str, path: str) -> None:
+        """压缩已关闭的分片（后台线程执行）"""
+        with open(path, 'rb') as src, gzip.open(path + ".gz", 'wb') as dst:
+            shutil.copyfileobj(src, dst)
+        os.remove(path)
+        line = json.dumps({"event": "compress", "shard": name, "file": name + ".gz"}, ensure_ascii=False)
+        with self._manifest_lock:
+            self._manifest.write(line + "\n")
+            self._manifest.flush()
+
+    def _needs_rotation(self, session_id: str) -> bool:
+        """判断写入下一轮前是否需要轮转"""
+        if self._file is None:
+            return True
+        if self._shard_turns == 0:
+            return False
+        if self.naming == "session" and session_id != self._segment_session:
+            return True
+        return (self.max_turns and self._shard_turns >= self.max_turns) or \
+               (self.max_bytes and self._shard_bytes >= self.max_bytes)
+
+    def write_turns(self, turns: List[TurnRecord]) -> None:
+        """写入多轮对话，必要时轮转分片"""
+        for problem, response, metadata in turns:
+            session_id = metadata.get("session_id") or DEFAULT_SESSION
+            if self._needs_rotation(session_id):
+                self._close_shard()
+                self._open_shard(session_id)
+            if session_id != self._segment_session:
+                self._segment_session = session_id
+                self._log("session", session_id=session_id, offset=self._shard_bytes,
+                          first_turn=metadata.get("number"))
+            data = self.renderer.render_many([(problem, response, metadata)],
+                                             first=self._shard_turns == 0).encode('utf-8')
+            self._file.write(data)
+            self._shard_bytes += len(data)
+            self._shard_turns += 1
+        self.flush()
+
+    def flush(self) -> None:
+        """将当前分片的缓冲内容写入磁盘"""
+        if self._file is not None:
+            self._file.flush()
+
+    def close(self) -> None:
+        """关闭当前分片并等待后台压缩完成"""
+        self._close_shard()
+        if self._compressor is not None:
+            self._compressor.shutdown(wait=True)
+            self._compressor = None
+        with self._manifest_lock:
+            if not self._manifest.closed:
+                self._manifest.close()
+
+
+class ShardManifest:
+    """分片清单读取器"""
+
+    def __init__(self, shard_dir: str):
+        self.shard_dir = shard_dir
+        self.shards: Dict[str, Dict[str, Any]] = {}
+        self.segments: List[Dict[str, Any]] = []
+        self.load()
+
+    def load(self) -> None:
+        """读取 manifest.jsonl（忽略未写完的最后一行）"""
+        self.shards.clear()
+        self.segments.clear()
+        path = os.path.join(self.shard_dir, MANIFEST_NAME)
+        if not os.path.exists(path):
+            return
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                name = entry["shard"]
+                event = entry["event"]
+                if event == "open":
+                    self.shards[name] = {"file": name, "end": None, "created": entry.get("created")}
+                elif event == "close":
+                    self.shards[name]["end"] = entry["end"]
+                    self.shards[name]["turns"] = entry["turns"]
+                elif event == "compress":
+                    self.shards[name]["file"] = entry["file"]
+                elif event == "session":
+                    self.segments.append(entry)
+
+    def session_ids(self) -> List[str]:
+        """按首次出现顺序返回所有会话ID"""
+        return list(dict.fromkeys(segment["session_id"] for segment in self.segments))
+
+    def locate(self, session_id: str) -> List[Tuple[str, int, Optional[int]]]:
+        """返回会话所在的 (分片路径, 起始偏移, 结束偏移)；结束偏移为 None 表示读到分片内容末尾"""
+        locations = []
+        for index, segment in enumerate(self.segments):
+            if segment["session_id"] != session_id:
+                continue
+            shard = self.shards[segment["shard"]]
+            end = shard["end"]
+            following = self.segments[index + 1] if index + 1 < len(self.segments) else None
+            if following is not None and following["shard"] == segment["shard"]:
+                end = following["offset"]
+            locations.append((os.path.join(self.shard_dir, shard["file"]), segment["offset"], end))
+        return locations
+
+    def read_session(self, session_id: str) -> str:
+        """读取某个会话的全部输出内容（只打开并定位相关分片）"""
+        parts = []
+        for path, start, end in self.locate(session_id):
+            opener = gzip.open if path.endswith(".gz") else open
+            with opener(path, 'rb') as f:
+                f.seek(start)
+                parts.append(f.read() if end is None else f.read(end - start))
+        return b"".join(parts).decode('utf-8')
@@ -0,0 +1,142 @@
+"""!
+@file profiling.py
+@brief 对话处理的分阶段耗时统计
+
+@details
+记录每轮对话在各阶段（提示渲染、模型调用、记忆更新、格式化输出、文件 I/O 等）花费的
+墙钟时间与 CPU 时间，并按会话汇总：
+- 未启用时 stage() 返回共享的空上下文，几乎没有额外开销
+- CPU 时间使用 time.thread_time，并行线程之间互不干扰
+- 会话归属取自日志上下文中的 session_id
+- 可选地把整次运行的调用栈剖析写入文件：.prof 为 cProfile 格式（pstats/snakeviz 可读），
+  安装了 pyinstrument 时 .html/.txt 使用 pyinstrument 输出
+
+@example
+    profiler = StageProfiler()
+    with profiler.stage("llm_call"):
+        ...
+    print(profiler.format_table())
+"""
+import time
+import cProfile
+import threading
+from contextlib import contextmanager, nullcontext
+from typing import List, Dict, Any, Optional
+
+from .logging_pipeline import get_log_context
+
+try:
+    from pyinstrument import Profiler as PyinstrumentProfiler
+except ImportError:  # pragma: no cover - 可选依赖
+    PyinstrumentProfiler = None
+
+TOTAL_SESSION = "*"  # 汇总行使用的会话名
+_NULL_STAGE = nullcontext()
+
+
+class StageProfiler:
+    """分阶段耗时统计器"""
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._stats: Dict[tuple, List[float]] = {}  # (session, stage) -> [次数, 墙钟, CPU, 最大墙钟]
+
+    def stage(self, name: str):
+        """返回统计某阶段耗时的上下文管理器"""
+        if not self.enabled:
+            return _NULL_STAGE
+        return self._measure(name)
+
+    @contextmanager
+    def _measure(self, name: str):
+        wall_start = time.perf_counter()
+        cpu_start = time.thread_time()
+        try:
+            yield
+        finally:
+            wall = time.perf_counter() - wall_start
+            cpu = time.thread_time() - cpu_start
+            session = get_log_context().get("session_id") or "-"
+            with self._lock:
+                for key in ((session, name), (TOTAL_SESSION, name)):
+                    entry = self._stats.get(key)
+                    if entry is None:
+                        self._stats[key] = [1, wall, cpu, wall]
+                    else:
+                        entry[0] += 1
+                        entry[1] += wall
+                        entry[2] += cpu
+                        if wall > entry[3]:
+                            entry[3] = wall
+
+    def reset(self) -> None:
+        """清空统计"""
+        with self._lock:
+            self._stats.clear()
+
+    def summary(self, session_id: str = TOTAL_SESSION) -> Dict[str, Dict[str, float]]:
+        """返回某会话（默认全部）各阶段的统计：calls/wall/cpu/mean/max（秒）"""
+        with self._lock:
+            items = [(stage, list(entry)) for (session, stage), entry in self._stats.items()
+                     if session == session_id]
+        return {
+            stage: {"calls": calls, "wall": wall, "cpu": cpu, "mean": wall / calls, "max": peak}
+            for stage, (calls, wall, cpu, peak) in items
+        }
+
+    def sessions(self) -> List[str]:
+        """返回有统计数据的会话"""
+        with self._lock:
+            return list(dict.fromkeys(s for s, _ in self._stats if s != TOTAL_SESSION))
+
+    def to_dict(self) -> Dict[str, Any]:
+        """按会话返回全部统计"""
+        return {session: self.summary(session) for session in [TOTAL_SESSION] + self.sessions()}
+
+    def format_table(self, per_session: bool = True) -> str:
+        """格式化为文本表格（按墙钟时间降序）"""
+        lines = [f"{'会话':<16}{'阶段':<18}{'次数':>8}{'墙钟(s)':>12}{'平均(ms)':>12}"
+                 f"{'最大(ms)':>12}{'CPU(s)':>10}{'占比':>8}"]
+        sessions = [TOTAL_SESSION] + (self.sessions() if per_session else [])
+        for session in sessions:
+            stages = self.summary(session)
+            total = sum(s["wall"] for s in stages.values()) or 1.0
+            for stage, s in sorted(stages.items(), key=lambda item: -item[1]["wall"]):
+                lines.append(
+                    f"{session[:15]:<16}{stage:<18}{s['calls']:>8}{s['wall']:>12.3f}"
+                    f"{s['mean'] * 1000:>12.2f}{s['max'] * 1000:>12.2f}{s['cpu']:>10.3f}"
+                    f"{s['wall'] / total:>8.1%}"
+                )
+        return "\n".join(lines)
+
+
+@contextmanager
+def profile_run(output_path: Optional[str]):
+    """
+    在上下文中剖析当前线程，并写出 cProfile（.prof）或 pyinstrument（.html/.txt）结果
+    未安装 pyinstrument 时 .html/.txt 路径直接报错，而不是把二进制的 cProfile 结果写入其中
+    """
+    if not output_path:
+        yield
+        return
+    if output_path.endswith((".html", ".txt")):
+        if PyinstrumentProfiler is None:
+            raise ImportError('HTML/text profiles require pyinstrument (pip install "hjimi_openai[profile]"), '
+                              'use a .prof path for cProfile output')
+        profiler = PyinstrumentProfiler()
+        profiler.start()
+        try:
+            yield
+        finally:
+            profiler.stop()
+            with open(output_path, 'w', encoding='utf-8') as f:
+                f.write(profiler.output_html() if output_path.endswith(".html") else profiler.output_text())
+        return
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        profiler.dump_stats(output_path)
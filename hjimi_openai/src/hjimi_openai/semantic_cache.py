@@ -0,0 +1,407 @@
+"""!
+@file semantic_cache.py
+@brief 基于语义相似度的答案复用缓存
+
+@details
+问题文件中常有重复或改写的问题。本模块：
+- 默认只复用归一化后相同的问题（忽略大小写、空白与标点）
+- 提供嵌入函数时按语义相似度匹配，在进程内维护向量索引：NumPy 暴力检索（FlatIndex）或倒排聚类索引（IVFIndex）
+- 相似度超过阈值时返回已存储的答案；阈值必须针对所用的嵌入模型校准
+- 统计命中率，并支持从问答存储文件批量重建索引
+
+@note
+语义匹配依赖 NumPy。嵌入函数签名为 embed_fn(texts: List[str]) -> np.ndarray，
+返回形状为 (len(texts), dim) 的矩阵，向量无需预先归一化。
+HashingEmbedder 只衡量字面重合，不能区分"创建"与"删除"这类含义相反的问题，仅适合测试或近似去重。
+
+@example
+    cache = SemanticAnswerCache()                     # 精确匹配
+    cache.add("什么是量子计算？", "量子计算是……")
+    cache.lookup("什么是量子计算")                      # 返回已缓存的答案
+    semantic = SemanticAnswerCache(embed_fn=my_model_embed, threshold=0.92)
+    cache.stats()
+"""
+import os
+import re
+import json
+import glob
+import zlib
+import threading
+from typing import List, Dict, Any, Optional, Callable, Tuple, Iterable
+
+from .serialization import load_file
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - 可选依赖
+    np = None
+
+EmbedFunction = Callable[[List[str]], "np.ndarray"]
+
+# 归一化时去除的标点与空白
+_NORMALIZE_PATTERN = re.compile(r"[\s\.,;:!\?，。；：！？、\"'“”‘’（）()\[\]【】]+")
+
+
+def _require_numpy():
+    """确保 NumPy 可用"""
+    if np is None:
+        raise ImportError("Semantic cache requires numpy, install it with: pip install numpy")
+
+
+def _normalize_rows(matrix: "np.ndarray") -> "np.ndarray":
+    """按行做 L2 归一化"""
+    matrix = np.asarray(matrix, dtype=np.float32)
+    if matrix.ndim == 1:
+        matrix = matrix[None, :]
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def normalize_question(text: str) -> str:
+    """去除大小写、空白与标点差异，作为精确匹配的键"""
+    return _NORMALIZE_PATTERN.sub("", text.lower())
+
+
+class HashingEmbedder:
+    """离线字符 n-gram 哈希嵌入
+
+    将归一化后的文本切分为 1..max_n 字符 n-gram，用 crc32 哈希到固定维度，无需下载任何模型。
+    得分反映字面重合程度而不是语义："如何创建文件"与"如何删除文件"、"列表和字典"与"列表和元组"
+    的得分都在 0.9 左右，因此不作为默认嵌入，只适合测试或近似重复检测。
+    """
+
+    def __init__(self, dim: int = 1024, min_n: int = 1, max_n: int = 2):
+        _require_numpy()
+        self.dim = dim
+        self.min_n = min_n
+        self.max_n = max_n
+
+    def _features(self, text: str) -> Dict[int, float]:
+        """计算单个文本的哈希特征"""
+        text = normalize_question(text)
+        features = {}
+        for n in range(self.min_n, self.max_n + 1):
+            for i in range(len(text) - n + 1):
+                bucket = zlib.crc32(text[i:i + n].encode("utf-8")) % self.dim
+                features[bucket] = features.get(bucket, 0.0) + 1.0
+        return features
+
+    def __call__(self, texts: List[str]) -> "np.ndarray":
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for bucket, value in self._features(text).items():
+                matrix[row, bucket] = value
+        return matrix
+
+
+class FlatIndex:
+    """NumPy 暴力检索索引（内积，向量已归一化）"""
+
+    def __init__(self, dim: int):
+        self.dim = dim
+        self._vectors = np.zeros((16, dim), dtype=np.float32)
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def add(self, vectors: "np.ndarray") -> List[int]:
+        """添加向量，返回分配的编号"""
+        count = len(vectors)
+        required = self._size + count
+        if required > len(self._vectors):
+            capacity = max(required, len(self._vectors) * 2)
+            grown = np.zeros((capacity, self.dim), dtype=np.float32)
+            grown[:self._size] = self._vectors[:self._size]
+            self._vectors = grown
+        self._vectors[self._size:required] = vectors
+        ids = list(range(self._size, required))
+        self._size = required
+        return ids
+
+    def search(self, vector: "np.ndarray") -> Tuple[int, float]:
+        """返回最相似的 (编号, 相似度)，索引为空时编号为 -1"""
+        if self._size == 0:
+            return -1, 0.0
+        scores = self._vectors[:self._size] @ vector
+        best = int(np.argmax(scores))
+        return best, float(scores[best])
+
+    def build(self) -> None:
+        """暴力索引无需训练"""
+
+
+class IVFIndex:
+    """倒排聚类索引（IVF）
+
+    使用球面 k-means 将向量划分为 nlist 个簇，查询时只扫描最近的 nprobe 个簇。
+    适合数十万条以上的问答语料。build() 之前退化为暴力检索。
+    """
+
+    def __init__(self, dim: int, nlist: int = 64, nprobe: int = 4, iterations: int = 10, seed: int = 0):
+        self.dim = dim
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.iterations = iterations
+        self.seed = seed
+        self.flat = FlatIndex(dim)
+        self.centroids = None
+        self.lists: List[List[int]] = []
+        self._list_arrays: List[Optional["np.ndarray"]] = []
+
+    def __len__(self) -> int:
+        return len(self.flat)
+
+    def _assign(self, vectors: "np.ndarray") -> "np.ndarray":
+        """返回每个向量所属的簇"""
+        return np.argmax(vectors @ self.centroids.T, axis=1)
+
+    def add(self, vectors: "np.ndarray") -> List[int]:
+        ids = self.flat.add(vectors)
+        if self.centroids is not None:
+            for item_id, cluster in zip(ids, self._assign(vectors)):
+                self.lists[cluster].append(item_id)
+                self._list_arrays[cluster] = None
+        return ids
+
+    def build(self) -> None:
+        """训练聚类中心并重建倒排表"""
+        size = len(self.flat)
+        if size < self.nlist * 4:
+            return  # 数据量太小，暴力检索即可
+        data = self.flat._vectors[:size]
+        rng = np.random.default_rng(self.seed)
+        centroids = data[rng.choice(size, self.nlist, replace=False)].copy()
+        for _ in range(self.iterations):
+            assignment = np.argmax(data @ centroids.T, axis=1)
+            for cluster in range(self.nlist):
+                members = data[assignment == cluster]
+                if len(members):
+                    centroids[cluster] = members.sum(axis=0)
+            centroids = _normalize_rows(centroids)
+        self.centroids = centroids
+        assignment = self._assign(data)
+        self.lists = [[] for _ in range(self.nlist)]
+        for item_id, cluster in enumerate(assignment):
+            self.lists[cluster].append(item_id)
+        self._list_arrays = [None] * self.nlist
+
+    def search(self, vector: "np.ndarray") -> Tuple[int, float]:
+        if self.centroids is None:
+            return self.flat.search(vector)
+        probes = np.argsort(self.centroids @ vector)[-self.nprobe:]
+        best_id, best_score = -1, 0.0
+        for cluster in probes:
+            if self._list_arrays[cluster] is None:
+                self._list_arrays[cluster] = np.asarray(self.lists[cluster], dtype=np.int64)
+            members = self._list_arrays[cluster]
+            if len(members) == 0:
+                continue
+            scores = self.flat._vectors[members] @ vector
+            position = int(np.argmax(scores))
+            if best_id < 0 or scores[position] > best_score:
+                best_id, best_score = int(members[position]), float(scores[position])
+        return best_id, best_score
+
+
+INDEX_TYPES = {
+    "flat": FlatIndex,
+    "ivf": IVFIndex,
+}
+
+
+class SemanticAnswerCache:
+    """语义答案缓存
+
+    默认（未提供 embed_fn）只复用归一化后完全相同的问题（忽略大小写、空白与标点），不会误命中。
+    传入 embed_fn 时按向量相似度匹配，此时必须同时给出针对该嵌入模型校准过的 threshold：
+    相似度阈值只对特定模型有意义，字符级的 HashingEmbedder 衡量的是字面重合而非语义，
+    "如何创建文件" 与 "如何删除文件" 的得分可超过 0.9。
+    只应缓存不依赖上下文的问答（会话的第一问、独立问题）；store_path 持久化的正是这些问答，用于预热。
+    """
+
+    def __init__(self, embed_fn: EmbedFunction = None, threshold: float = None,
+                 index_type: str = "flat", store_path: str = None, **index_options):
+        if index_type not in INDEX_TYPES:
+            raise ValueError(f"Unsupported index type: {index_type}")
+        if embed_fn is not None:
+            _require_numpy()
+            if threshold is None:
+                raise ValueError("A similarity threshold calibrated for embed_fn is required")
+        self.embed_fn = embed_fn
+        self.threshold = threshold
+        self.index_type = index_type
+        self.index_options = index_options
+        self.store_path = store_path
+        self.index = None
+        self.questions: List[str] = []
+        self.answers: List[str] = []
+        self._exact: Dict[str, int] = {}  # 归一化问题 -> 编号
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.answers)
+
+    @property
+    def semantic(self) -> bool:
+        """是否按向量相似度匹配"""
+        return self.embed_fn is not None
+
+    def _embed(self, texts: List[str]) -> "np.ndarray":
+        """嵌入并归一化"""
+        return _normalize_rows(self.embed_fn(texts))
+
+    def _ensure_index(self, dim: int) -> None:
+        """按第一次嵌入得到的维度创建索引"""
+        if self.index is None:
+            self.index = INDEX_TYPES[self.index_type](dim, **self.index_options)
+
+    def lookup(self, question: str) -> Optional[str]:
+        """查询相似问题的答案，未命中返回 None"""
+        match = self.lookup_with_score(question)
+        return match[0] if match else None
+
+    def lookup_with_score(self, question: str) -> Optional[Tuple[str, float, str]]:
+        """查询相似问题，命中时返回 (答案, 相似度, 原问题)；精确匹配的相似度为 1.0"""
+        if not self.semantic:
+            with self._lock:
+                item_id = self._exact.get(normalize_question(question))
+                if item_id is None:
+                    self.misses += 1
+                    return None
+                self.hits += 1
+                return self.answers[item_id], 1.0, self.questions[item_id]
+
+        vector = self._embed([question])[0]
+        with self._lock:
+            if self.index is None or len(self.index) == 0:
+                self.misses += 1
+                return None
+            item_id, score = self.index.search(vector)
+            if item_id < 0 or score < self.threshold:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return self.answers[item_id], score, self.questions[item_id]
+
+    def add(self, question: str, answer: str) -> None:
+        """添加一条不依赖上下文的问答（设置了 store_path 时同时追加到存储文件）；问题相同时覆盖旧答案"""
+        if not (question and answer):
+            return
+        self.add_many([(question, answer)])
+        if self.store_path:
+            with self._lock, open(self.store_path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps({"question": question, "answer": answer}, ensure_ascii=False) + "\n")
+
+    def add_many(self, pairs: Iterable[Tuple[str, str]]) -> int:
+        """批量添加问答，返回新增条数"""
+        pairs = [(q, a) for q, a in pairs if q and a]
+        if not pairs:
+            return 0
+        if not self.semantic:
+            added = 0
+            with self._lock:
+                for question, answer in pairs:
+                    key = normalize_question(question)
+                    if key in self._exact:
+                        self.answers[self._exact[key]] = answer
+                        continue
+                    self._exact[key] = len(self.answers)
+                    self.questions.append(question)
+                    self.answers.append(answer)
+                    added += 1
+            return added
+
+        vectors = self._embed([q for q, _ in pairs])
+        added = 0
+        with self._lock:
+            self._ensure_index(vectors.shape[1])
+            new_vectors, new_pairs = [], []
+            for vector, (question, answer) in zip(vectors, pairs):
+                item_id, score = self.index.search(vector)
+                if item_id >= 0 and score >= 0.999:
+                    self.answers[item_id] = answer
+                    continue
+                new_vectors.append(vector)
+                new_pairs.append((question, answer))
+                if len(new_vectors) >= 1024:
+                    added += self._append(new_vectors, new_pairs)
+                    new_vectors, new_pairs = [], []
+            added += self._append(new_vectors, new_pairs)
+        return added
+
+    def _append(self, vectors: List["np.ndarray"], pairs: List[Tuple[str, str]]) -> int:
+        """追加到索引（调用方持有锁）"""
+        if not vectors:
+            return 0
+        self.index.add(np.stack(vectors))
+        self.questions.extend(q for q, _ in pairs)
+        self.answers.extend(a for _, a in pairs)
+        return len(pairs)
+
+    def rebuild_from_history_files(self, paths: Iterable[str]) -> int:
+        """从问答存储文件（*.jsonl，见 store_path）与 chat_history_*.json 文件（或包含它们的目录）重建索引
+
+        存储文件中的问答全部载入；对话历史文件只取第一组问答：
+        后续问答可能依赖上文（如"基于上文……"），不能复用给没有上下文的问题
+        """
+        pairs = []
+        for path in paths:
+            if os.path.isdir(path):
+                files = sorted(
+                    file_path for pattern in ("chat_history_*.json", "chat_history_*.msgpack", "*.jsonl")
+                    for file_path in glob.glob(os.path.join(path, "**", pattern), recursive=True)
+                )
+            else:
+                files = [path]
+            for file_path in files:
+                pairs.extend(self._read_pairs(file_path))
+
+        with self._lock:
+            self.index = None
+            self.questions = []
+            self.answers = []
+            self._exact = {}
+        self.add_many(pairs)
+        with self._lock:
+            if self.index is not None:
+                self.index.build()
+        return len(self.answers)
+
+    @staticmethod
+    def _read_pairs(file_path: str) -> List[Tuple[str, str]]:
+        """读取存储文件中的全部问答，或历史文件中的第一组 (问题, 回答)"""
+        try:
+            if file_path.endswith(".jsonl"):
+                with open(file_path, 'r', encoding='utf-8') as f:
+                    records = [json.loads(line) for line in f if line.strip()]
+                return [(r.get("question"), r.get("answer")) for r in records if isinstance(r, dict)]
+            history = load_file(file_path)
+        except (OSError, ValueError, ImportError):
+            return []
+        question = None
+        for message in history:
+            if message.get("role") == "user":
+                question = message.get("content")
+            elif message.get("role") == "assistant" and question:
+                return [(question, message.get("content"))]
+        return []
+
+    def stats(self) -> Dict[str, Any]:
+        """返回命中率统计"""
+        total = self.hits + self.misses
+        return {
+            "entries": len(self.answers),
+            "lookups": total,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+    def reset_stats(self) -> None:
+        """清零命中统计"""
+        self.hits = 0
+        self.misses = 0
@@ -0,0 +1,130 @@
+"""!
+@file serialization.py
+@brief 可插拔的 JSON/MessagePack 序列化层
+
+@details
+对话历史、问题文件、JSON 输出和预写日志共用同一套序列化接口：
+- 后端：orjson > msgspec > 标准库 json（backend="auto" 时按此顺序选择已安装的包）
+- 格式：
+  - "json"：带缩进的 JSON，用于需要人工阅读的文件
+  - "compact"：无空白的紧凑 JSON，用于程序读取的文件
+  - "msgpack"：二进制 MessagePack（需要 msgspec），文件扩展名为 .msgpack
+- load_file 按扩展名自动识别 JSON 或 MessagePack
+
+@example
+    serializer = get_serializer()
+    data = serializer.dumps({"问题": "回答"})          # bytes，紧凑 JSON
+    dump_file("chat_history.msgpack", history, "msgpack")
+    history = load_file("chat_history.msgpack")
+"""
+import json
+from typing import Any, Dict
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - 可选依赖
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:  # pragma: no cover - 可选依赖
+    msgspec = None
+
+FORMAT_EXTENSIONS = {"json": ".json", "compact": ".json", "msgpack": ".msgpack"}
+
+
+class StdlibSerializer:
+    """标准库 json 后端"""
+
+    name = "json"
+
+    def __init__(self):
+        self._compact = json.JSONEncoder(ensure_ascii=False, default=str, separators=(",", ":")).encode
+        self._pretty = json.JSONEncoder(ensure_ascii=False, default=str, indent=2).encode
+
+    def dumps(self, obj: Any, pretty: bool = False) -> bytes:
+        return (self._pretty if pretty else self._compact)(obj).encode('utf-8')
+
+    def loads(self, data) -> Any:
+        return json.loads(data)
+
+
+class OrjsonSerializer:
+    """orjson 后端"""
+
+    name = "orjson"
+
+    def dumps(self, obj: Any, pretty: bool = False) -> bytes:
+        option = orjson.OPT_NON_STR_KEYS | (orjson.OPT_INDENT_2 if pretty else 0)
+        return orjson.dumps(obj, default=str, option=option)
+
+    def loads(self, data) -> Any:
+        return orjson.loads(data)
+
+
+class MsgspecSerializer:
+    """msgspec 后端"""
+
+    name = "msgspec"
+
+    def __init__(self):
+        self._encoder = msgspec.json.Encoder(enc_hook=str)
+        self._decoder = msgspec.json.Decoder()
+
+    def dumps(self, obj: Any, pretty: bool = False) -> bytes:
+        data = self._encoder.encode(obj)
+        return msgspec.json.format(data, indent=2) if pretty else data
+
+    def loads(self, data) -> Any:
+        return self._decoder.decode(data.encode('utf-8') if isinstance(data, str) else data)
+
+
+_BACKENDS = {
+    "orjson": (OrjsonSerializer, lambda: orjson is not None),
+    "msgspec": (MsgspecSerializer, lambda: msgspec is not None),
+    "json": (StdlibSerializer, lambda: True),
+}
+_instances: Dict[str, Any] = {}
+
+
+def get_serializer(backend: str = "auto"):
+    """返回指定后端的序列化器（实例复用）；auto 选择已安装的最快后端"""
+    if backend == "auto":
+        backend = next(name for name, (_, available) in _BACKENDS.items() if available())
+    if backend not in _BACKENDS:
+        raise ValueError(f"Unsupported serializer backend: {backend}")
+    serializer_class, available = _BACKENDS[backend]
+    if not available():
+        raise ImportError(f"Serializer backend '{backend}' is not installed")
+    if backend not in _instances:
+        _instances[backend] = serializer_class()
+    return _instances[backend]
+
+
+def dumps(obj: Any, fmt: str = "compact", serializer=None) -> bytes:
+    """按格式序列化为 bytes"""
+    if fmt == "msgpack":
+        if msgspec is None:
+            raise ImportError('The msgpack format requires msgspec (pip install "hjimi_openai[fast]")')
+        return msgspec.msgpack.encode(obj, enc_hook=str)
+    if fmt not in FORMAT_EXTENSIONS:
+        raise ValueError(f"Unsupported serialization format: {fmt}")
+    return (serializer or get_serializer()).dumps(obj, pretty=fmt == "json")
+
+
+def dump_file(path: str, obj: Any, fmt: str = "json", serializer=None) -> None:
+    """序列化并写入文件"""
+    data = dumps(obj, fmt, serializer)
+    with open(path, 'wb') as f:
+        f.write(data)
+
+
+def load_file(path: str, serializer=None) -> Any:
+    """读取 JSON 或 MessagePack（.msgpack）文件"""
+    with open(path, 'rb') as f:
+        data = f.read()
+    if path.endswith(".msgpack"):
+        if msgspec is None:
+            raise ImportError('Reading .msgpack files requires msgspec (pip install "hjimi_openai[fast]")')
+        return msgspec.msgpack.decode(data)
+    return (serializer or get_serializer()).loads(data)
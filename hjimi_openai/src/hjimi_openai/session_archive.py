@@ -0,0 +1,452 @@
+"""!
+@file session_archive.py
+@brief 会话产物全文检索归档
+
+@details
+将 output_dir 中积累的会话产物增量索引到本地 SQLite FTS5 全文索引：
+- session_*.md 会话 Markdown 文件
+- chat_history_*.json 对话历史文件
+- conversation.* 输出文件及 backups/ 下的备份文件
+
+每个文件记录路径、修改时间和大小，重新索引时只处理新增或变化的文件。
+问答条目保存在普通表中（按会话ID、时间戳建立索引），全文索引使用外部内容表。
+
+@example
+    archive = SessionArchive("output/archive.sqlite3")
+    archive.index_directory("output")
+    for hit in archive.search("量子计算", limit=5):
+        print(hit["session_id"], hit["question"])
+
+    # 命令行
+    python -m hjimi_openai.session_archive index output
+    python -m hjimi_openai.session_archive search "量子计算" --db output/archive.sqlite3
+"""
+import os
+import re
+import json
+import html
+import sqlite3
+import argparse
+from datetime import datetime
+from typing import List, Dict, Any, Optional, Iterator
+
+from .serialization import load_file
+
+DEFAULT_DB_NAME = "archive.sqlite3"
+
+# 文件名中的时间戳，例如 session_math_20240101_120000.md
+FILENAME_TIMESTAMP = re.compile(r"(\d{8}_\d{6})")
+
+# 会话 Markdown：### 问题 N / **问题描述：** / **回答：** / ---（问题树会话的块之间可能有分支标题）
+SESSION_BLOCK = re.compile(
+    r"^### 问题 (\d+)\n+\*\*问题描述：\*\*\n(.*?)\n+\*\*回答：\*\*\n(.*?)\n+---\n"
+    r"(?=\n*(?:## 分支：[^\n]*\n+)?### 问题 \d+\n|\s*\Z)",
+    re.S | re.M
+)
+SESSION_ID_LINE = re.compile(r"^## 会话ID: (.+)$", re.M)
+SESSION_START_LINE = re.compile(r"^开始时间: (.+)$", re.M)
+
+# 输出文件（Markdown / TXT / HTML 格式）
+OUTPUT_MARKDOWN_BLOCK = re.compile(
+    r"^## 问题 (\d+) - ([^\n]+)\n\n### 问题描述：\n(.*?)\n\n### 回答：\n(.*?)\n\n---\n",
+    re.S | re.M
+)
+OUTPUT_TXT_BLOCK = re.compile(
+    r"^=== 问题 (\d+) - ([^\n]+) ===\n问题：(.*?)\n回答：(.*?)\n\n(?==== 问题 |\Z)",
+    re.S | re.M
+)
+OUTPUT_HTML_BLOCK = re.compile(
+    r"<h2>问题 (\d+) - ([^<]+)</h2><h3>问题描述：</h3><p>(.*?)</p>"
+    r"<h3>回答：</h3><p>(.*?)</p>",
+    re.S
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    path TEXT UNIQUE NOT NULL,
+    mtime REAL NOT NULL,
+    size INTEGER NOT NULL,
+    kind TEXT NOT NULL,
+    indexed_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS entries (
+    id INTEGER PRIMARY KEY,
+    file_id INTEGER NOT NULL REFERENCES files(id) ON DELETE CASCADE,
+    session_id TEXT,
+    turn INTEGER,
+    timestamp TEXT,
+    question TEXT,
+    response TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_entries_session ON entries(session_id, turn);
+CREATE INDEX IF NOT EXISTS idx_entries_timestamp ON entries(timestamp);
+CREATE INDEX IF NOT EXISTS idx_entries_file ON entries(file_id);
+CREATE TRIGGER IF NOT EXISTS entries_ai AFTER INSERT ON entries BEGIN
+    INSERT INTO entries_fts(rowid, question, response)
+    VALUES (new.id, new.question, new.response);
+END;
+CREATE TRIGGER IF NOT EXISTS entries_ad AFTER DELETE ON entries BEGIN
+    INSERT INTO entries_fts(entries_fts, rowid, question, response)
+    VALUES ('delete', old.id, old.question, old.response);
+END;
+"""
+
+
+def _format_file_timestamp(path: str) -> Optional[str]:
+    """从文件名中解析时间戳"""
+    match = FILENAME_TIMESTAMP.search(os.path.basename(path))
+    if not match:
+        return None
+    return datetime.strptime(match.group(1), "%Y%m%d_%H%M%S").strftime("%Y-%m-%d %H:%M:%S")
+
+
+OUTPUT_SHARD_EXTENSIONS = (".markdown", ".html", ".json", ".txt")
+
+
+def classify_artifact(path: str) -> Optional[str]:
+    """判断文件类型，非会话产物返回 None"""
+    name = os.path.basename(path)
+    if name.startswith("session_") and name.endswith(".md"):
+        return "session"
+    if name.startswith("chat_history_") and name.endswith((".json", ".msgpack")):
+        return "history"
+    if name.startswith("conversation_backup_") or (
+            name.startswith("conversation.") and not name.endswith(".log")):
+        return "output"
+    if name.startswith("conversation_") and name.endswith(OUTPUT_SHARD_EXTENSIONS):
+        return "output"  # 分片输出（shards/ 目录）
+    return None
+
+
+def parse_session_markdown(path: str) -> Iterator[Dict[str, Any]]:
+    """解析会话 Markdown 文件"""
+    with open(path, 'r', encoding='utf-8') as f:
+        text = f.read()
+
+    session_match = SESSION_ID_LINE.search(text)
+    start_match = SESSION_START_LINE.search(text)
+    session_id = session_match.group(1).strip() if session_match else None
+    timestamp = start_match.group(1).strip() if start_match else _format_file_timestamp(path)
+
+    for block in SESSION_BLOCK.finditer(text):
+        yield {
+            "session_id": session_id,
+            "turn": int(block.group(1)),
+            "timestamp": timestamp,
+            "question": block.group(2).strip(),
+            "response": block.group(3).strip(),
+        }
+
+
+def parse_chat_history(path: str) -> Iterator[Dict[str, Any]]:
+    """解析 chat_history_*.json 文件，按 user/assistant 配对"""
+    history = load_file(path)
+
+    session_id = os.path.splitext(os.path.basename(path))[0]
+    timestamp = _format_file_timestamp(path)
+    turn = 0
+    question = None
+    for message in history:
+        if message.get("role") == "user":
+            question = message.get("content")
+        elif message.get("role") == "assistant":
+            turn += 1
+            yield {
+                "session_id": session_id,
+                "turn": turn,
+                "timestamp": timestamp,
+                "question": question,
+                "response": message.get("content"),
+            }
+            question = None
+
+
+def _iter_json_objects(text: str) -> Iterator[Any]:
+    """依次解码文本中拼接的 JSON 值"""
+    decoder = json.JSONDecoder()
+    position = 0
+    length = len(text)
+    while position < length:
+        while position < length and text[position] in " \t\r\n,[]":
+            position += 1
+        if position >= length:
+            break
+        value, position = decoder.raw_decode(text, position)
+        yield value
+
+
+def parse_output_file(path: str) -> Iterator[Dict[str, Any]]:
+    """解析 conversation.* 输出文件与备份文件"""
+    with open(path, 'r', encoding='utf-8') as f:
+        text = f.read()
+
+    default_session = os.path.splitext(os.path.basename(path))[0]
+    if path.endswith(".json"):
+        for record in _iter_json_objects(text):
+            if not isinstance(record, dict):
+                continue
+            metadata = record.get("metadata") or {}
+            yield {
+                "session_id": metadata.get("session_id") or default_session,
+                "turn": record.get("number"),
+                "timestamp": record.get("timestamp"),
+                "question": record.get("problem"),
+                "response": record.get("response"),
+            }
+        return
+
+    if path.endswith(".html"):
+        pattern, unescape = OUTPUT_HTML_BLOCK, html.unescape
+    elif path.endswith(".txt"):
+        pattern, unescape = OUTPUT_TXT_BLOCK, None
+    else:
+        pattern, unescape = OUTPUT_MARKDOWN_BLOCK, None
+
+    for block in pattern.finditer(text):
+        question, response = block.group(3), block.group(4)
+        if unescape is not None:
+            question, response = unescape(question), unescape(response)
+        yield {
+            "session_id": default_session,
+            "turn": int(block.group(1)),
+            "timestamp": block.group(2).strip(),
+            "question": question.strip(),
+            "response": response.strip(),
+        }
+
+
+PARSERS = {
+    "session": parse_session_markdown,
+    "history": parse_chat_history,
+    "output": parse_output_file,
+}
+
+
+class SessionArchive:
+    """会话产物全文检索归档"""
+
+    def __init__(self, db_path: str):
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.db_path = db_path
+        self.conn = sqlite3.connect(db_path)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA foreign_keys = ON")
+        self.conn.execute("PRAGMA journal_mode = WAL")
+        self.tokenizer = self._create_schema()
+
+    def _create_schema(self) -> str:
+        """创建表结构，优先使用支持中文子串检索的 trigram 分词器"""
+        row = self.conn.execute(
+            "SELECT sql FROM sqlite_master WHERE name = 'entries_fts'"
+        ).fetchone()
+        if row is None:
+            try:
+                self.conn.execute(
+                    "CREATE VIRTUAL TABLE entries_fts USING fts5("
+                    "question, response, content='entries', content_rowid='id', "
+                    "tokenize='trigram')"
+                )
+            except sqlite3.OperationalError:
+                self.conn.execute(
+                    "CREATE VIRTUAL TABLE entries_fts USING fts5("
+                    "question, response, content='entries', content_rowid='id')"
+                )
+            row = self.conn.execute(
+                "SELECT sql FROM sqlite_master WHERE name = 'entries_fts'"
+            ).fetchone()
+        self.conn.executescript(SCHEMA)
+        self.conn.commit()
+        return "trigram" if "trigram" in row["sql"] else "unicode61"
+
+    def close(self) -> None:
+        """关闭数据库连接"""
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def index_file(self, path: str, force: bool = False) -> int:
+        """索引单个文件；文件未变化时跳过，返回新增条目数"""
+        kind = classify_artifact(path)
+        if kind is None:
+            return 0
+
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        row = self.conn.execute(
+            "SELECT id, mtime, size FROM files WHERE path = ?", (path,)
+        ).fetchone()
+        if row is not None and not force and \
+                row["mtime"] == stat.st_mtime and row["size"] == stat.st_size:
+            return 0
+
+        try:
+            entries = list(PARSERS[kind](path))
+        except (ValueError, UnicodeDecodeError):
+            entries = []
+
+        with self.conn:
+            if row is not None:
+                self.conn.execute("DELETE FROM entries WHERE file_id = ?", (row["id"],))
+                self.conn.execute(
+                    "UPDATE files SET mtime = ?, size = ?, indexed_at = ? WHERE id = ?",
+                    (stat.st_mtime, stat.st_size, datetime.now().isoformat(), row["id"])
+                )
+                file_id = row["id"]
+            else:
+                cursor = self.conn.execute(
+                    "INSERT INTO files (path, mtime, size, kind, indexed_at) VALUES (?, ?, ?, ?, ?)",
+                    (path, stat.st_mtime, stat.st_size, kind, datetime.now().isoformat())
+                )
+                file_id = cursor.lastrowid
+            self.conn.executemany(
+                "INSERT INTO entries (file_id, session_id, turn, timestamp, question, response) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [(file_id, e["session_id"], e["turn"], e["timestamp"], e["question"], e["response"])
+                 for e in entries]
+            )
+        return len(entries)
+
+    def index_directory(self, directory: str, prune: bool = True) -> Dict[str, int]:
+        """递归索引目录中的会话产物，返回统计信息"""
+        stats = {"files_seen": 0, "files_indexed": 0, "entries_added": 0, "files_pruned": 0}
+        db_path = os.path.abspath(self.db_path)
+        seen = set()
+        for root, _, files in os.walk(directory):
+            for name in files:
+                path = os.path.abspath(os.path.join(root, name))
+                if path.startswith(db_path) or classify_artifact(path) is None:
+                    continue
+                stats["files_seen"] += 1
+                seen.add(path)
+                before = self.conn.total_changes
+                stats["entries_added"] += self.index_file(path)
+                if self.conn.total_changes != before:
+                    stats["files_indexed"] += 1
+
+        if prune:
+            prefix = os.path.join(os.path.abspath(directory), "")
+            stale = [
+                row["id"] for row in self.conn.execute("SELECT id, path FROM files")
+                if row["path"].startswith(prefix) and row["path"] not in seen
+            ]
+            with self.conn:
+                for file_id in stale:
+                    self.conn.execute("DELETE FROM entries WHERE file_id = ?", (file_id,))
+                    self.conn.execute("DELETE FROM files WHERE id = ?", (file_id,))
+            stats["files_pruned"] = len(stale)
+        return stats
+
+    def _build_match(self, query: str) -> Optional[str]:
+        """将用户输入转换为 FTS5 查询表达式，无法使用全文索引时返回 None"""
+        terms = query.split()
+        if not terms:
+            return None
+        if self.tokenizer == "trigram" and any(len(term) < 3 for term in terms):
+            return None
+        return " ".join('"' + term.replace('"', '""') + '"' for term in terms)
+
+    def search(self, query: str, limit: int = 20, session_id: str = None,
+               since: str = None, until: str = None) -> List[Dict[str, Any]]:
+        """全文检索问答条目
+
+        :param query: 检索词，多个词之间为 AND 关系
+        :param limit: 最多返回条数
+        :param session_id: 只检索指定会话
+        :param since: 起始时间（含），格式 YYYY-MM-DD HH:MM:SS 的前缀即可
+        :param until: 结束时间（含，按前缀比较）
+        """
+        filters, params = [], []
+        if session_id:
+            filters.append("e.session_id = ?")
+            params.append(session_id)
+        if since:
+            filters.append("e.timestamp >= ?")
+            params.append(since)
+        if until:
+            filters.append("substr(e.timestamp, 1, length(?)) <= ?")
+            params.extend([until, until])
+
+        match = self._build_match(query)
+        if match is not None:
+            sql = ("SELECT e.*, f.path, snippet(entries_fts, -1, '[', ']', '...', 16) AS snippet "
+                   "FROM entries_fts JOIN entries e ON e.id = entries_fts.rowid "
+                   "JOIN files f ON f.id = e.file_id WHERE entries_fts MATCH ?")
+            params.insert(0, match)
+            order = " ORDER BY rank"
+        else:
+            # 短词无法使用 trigram 索引，退化为 LIKE 扫描
+            like_filters, like_params = [], []
+            for term in query.split():
+                like_filters.append("(e.question LIKE ? OR e.response LIKE ?)")
+                like_params.extend([f"%{term}%", f"%{term}%"])
+            params = like_params + params
+            sql = ("SELECT e.*, f.path, substr(e.response, 1, 64) AS snippet "
+                   "FROM entries e JOIN files f ON f.id = e.file_id WHERE "
+                   + (" AND ".join(like_filters) or "1"))
+            order = " ORDER BY e.timestamp DESC"
+
+        if filters:
+            sql += " AND " + " AND ".join(filters)
+        sql += order + " LIMIT ?"
+        params.append(limit)
+        return [dict(row) for row in self.conn.execute(sql, params)]
+
+    def get_session(self, session_id: str) -> List[Dict[str, Any]]:
+        """按会话ID获取全部问答条目"""
+        rows = self.conn.execute(
+            "SELECT e.*, f.path FROM entries e JOIN files f ON f.id = e.file_id "
+            "WHERE e.session_id = ? ORDER BY e.turn", (session_id,)
+        )
+        return [dict(row) for row in rows]
+
+
+def main(argv: List[str] = None):
+    """命令行入口"""
+    parser = argparse.ArgumentParser(description="会话产物全文检索归档")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    index_parser = subparsers.add_parser("index", help="增量索引输出目录")
+    index_parser.add_argument("directory", help="会话输出目录")
+    index_parser.add_argument("--db", help=f"索引数据库路径（默认: <directory>/{DEFAULT_DB_NAME}）")
+    index_parser.add_argument("--no-prune", action="store_true", help="保留已删除文件的索引")
+
+    search_parser = subparsers.add_parser("search", help="全文检索")
+    search_parser.add_argument("query", help="检索词")
+    search_parser.add_argument("--db", default=os.path.join("output", DEFAULT_DB_NAME),
+                               help="索引数据库路径")
+    search_parser.add_argument("--limit", type=int, default=20, help="最多返回条数")
+    search_parser.add_argument("--session", help="只检索指定会话ID")
+    search_parser.add_argument("--since", help="起始时间")
+    search_parser.add_argument("--until", help="结束时间")
+    search_parser.add_argument("--json", action="store_true", help="以 JSON Lines 输出")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "index":
+        db_path = args.db or os.path.join(args.directory, DEFAULT_DB_NAME)
+        with SessionArchive(db_path) as archive:
+            stats = archive.index_directory(args.directory, prune=not args.no_prune)
+        print(f"已索引 {stats['files_indexed']}/{stats['files_seen']} 个文件，"
+              f"新增 {stats['entries_added']} 条，清理 {stats['files_pruned']} 个文件")
+        return
+
+    with SessionArchive(args.db) as archive:
+        hits = archive.search(args.query, limit=args.limit, session_id=args.session,
+                              since=args.since, until=args.until)
+    for hit in hits:
+        if args.json:
+            print(json.dumps(hit, ensure_ascii=False))
+        else:
+            print(f"[{hit['timestamp']}] {hit['session_id']} #{hit['turn']}: {hit['question']}")
+            print(f"    {hit['snippet']}")
+
+
+if __name__ == "__main__":
+    main()
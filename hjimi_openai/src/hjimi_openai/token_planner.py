@@ -0,0 +1,290 @@
+"""!
+@file token_planner.py
+@brief 问题文件的 token 用量与成本预估（dry run）
+
+@details
+在真正调用 process_questions 之前，流式读取问题文件并模拟对话记忆的增长：
+- 使用快速的本地分词估算（安装了 tiktoken 时使用 tiktoken）
+- 按 EnhancedMemory 的规则模拟历史截断（达到 max_history_length 时保留后一半）
+- 支持独立问题会话（无历史）与问题树会话（共享前缀 + 分支）
+- 输出预计的 prompt/completion token、费用，以及给定并发与限流下的预计耗时；
+  会话按顺序处理，并发只作用于独立问题会话内的问题与问题树会话内的分支
+
+@example
+    planner = TokenPlanner(system_prompt="你是一个专业的AI助手", max_history_length=50)
+    report = planner.plan_file("questions.json")
+    print(report.format_table())
+
+    # 命令行
+    python -m hjimi_openai.token_planner questions.json --concurrency 4 --rpm 600
+"""
+import os
+import json
+import heapq
+import argparse
+from collections import deque
+from dataclasses import dataclass, field, asdict
+from typing import List, Dict, Any, Optional, Callable, Iterator, Iterable
+
+from .serialization import load_file
+
+try:
+    import tiktoken
+except ImportError:  # pragma: no cover - 可选依赖
+    tiktoken = None
+
+TokenCounter = Callable[[str], int]
+
+MESSAGE_OVERHEAD_TOKENS = 4  # 每条消息的角色与分隔符开销
+
+
+def approximate_token_count(text: str) -> int:
+    """快速估算 token 数：CJK 字符约 1 token，其余字符约 4 个 1 token
+
+    UTF-8 下 CJK 字符占 3 字节，(字节数 - 字符数) / 2 即为非 ASCII 字符数的近似值，
+    整个计算只依赖 C 层实现的 encode/len。
+    """
+    length = len(text)
+    wide = (len(text.encode("utf-8")) - length) // 2
+    return wide + (length - wide + 3) // 4
+
+
+def get_token_counter(encoding_name: str = "cl100k_base", exact: bool = False) -> TokenCounter:
+    """返回 token 计数函数；exact=True 且安装了 tiktoken 时使用真实分词"""
+    if exact and tiktoken is not None:
+        encoding = tiktoken.get_encoding(encoding_name)
+        return lambda text: len(encoding.encode(text, disallowed_special=()))
+    return approximate_token_count
+
+
+@dataclass
+class PlannedSession:
+    """待规划的会话"""
+    session_id: str
+    questions: Iterable[str]
+    independent: bool = False
+    branches: Dict[str, List[str]] = field(default_factory=dict)
+
+
+@dataclass
+class PlanReport:
+    """预估结果"""
+    sessions: int = 0
+    requests: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    max_prompt_tokens: int = 0
+    cost: float = 0.0
+    serial_latency_seconds: float = 0.0
+    critical_path_seconds: float = 0.0
+    estimated_seconds: float = 0.0
+    limiting_factor: str = ""
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {**asdict(self), "total_tokens": self.total_tokens}
+
+    def format_table(self) -> str:
+        """格式化为文本表格"""
+        rows = [
+            ("会话数", f"{self.sessions:,}"),
+            ("请求数", f"{self.requests:,}"),
+            ("Prompt tokens", f"{self.prompt_tokens:,}"),
+            ("Completion tokens", f"{self.completion_tokens:,}"),
+            ("Total tokens", f"{self.total_tokens:,}"),
+            ("单次最大 prompt", f"{self.max_prompt_tokens:,}"),
+            ("预计费用", f"{self.cost:,.4f}"),
+            ("串行总耗时", f"{self.serial_latency_seconds:,.1f} s"),
+            ("关键路径耗时", f"{self.critical_path_seconds:,.1f} s"),
+            ("预计耗时", f"{self.estimated_seconds:,.1f} s（瓶颈: {self.limiting_factor}）"),
+        ]
+        width = max(len(name) for name, _ in rows) + 2
+        return "\n".join(f"{name:<{width}}{value}" for name, value in rows)
+
+
+class _HistorySimulator:
+    """按 EnhancedMemory 规则模拟历史 token 数"""
+
+    __slots__ = ("max_length", "messages", "tokens")
+
+    def __init__(self, max_length: int, messages: deque = None, tokens: int = 0):
+        self.max_length = max_length
+        self.messages = messages if messages is not None else deque()
+        self.tokens = tokens
+
+    def fork(self) -> "_HistorySimulator":
+        return _HistorySimulator(self.max_length, deque(self.messages), self.tokens)
+
+    def save(self, question_tokens: int, answer_tokens: int) -> None:
+        messages = self.messages
+        if len(messages) >= self.max_length:
+            keep = self.max_length // 2
+            while len(messages) > keep:
+                self.tokens -= messages.popleft()
+        messages.append(question_tokens)
+        messages.append(answer_tokens)
+        self.tokens += question_tokens + answer_tokens
+
+
+class TokenPlanner:
+    """问题文件的 token 与成本规划器"""
+
+    def __init__(self, system_prompt: str = "", max_history_length: int = 50,
+                 completion_tokens: int = 300, max_tokens: int = 1024,
+                 prompt_price_per_1k: float = 0.0, completion_price_per_1k: float = 0.0,
+                 concurrency: int = 1, requests_per_minute: float = 0.0,
+                 tokens_per_minute: float = 0.0, base_latency: float = 0.5,
+                 output_tokens_per_second: float = 50.0, counter: TokenCounter = None):
+        """
+        :param completion_tokens: 每次回答的预计 token 数（不超过 max_tokens）
+        :param concurrency: 并发请求数（独立问题会话内的问题、问题树会话内的分支）
+        :param requests_per_minute: 提供方请求限流（0 表示不限）
+        :param tokens_per_minute: 提供方 token 限流（0 表示不限）
+        :param base_latency: 每次请求的固定延迟（秒）
+        :param output_tokens_per_second: 生成速度
+        """
+        self.count = counter or approximate_token_count
+        self.system_tokens = self.count(system_prompt) + MESSAGE_OVERHEAD_TOKENS if system_prompt else 0
+        self.max_history_length = max_history_length
+        self.completion_tokens = min(completion_tokens, max_tokens)
+        self.prompt_price_per_1k = prompt_price_per_1k
+        self.completion_price_per_1k = completion_price_per_1k
+        self.concurrency = max(1, concurrency)
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.request_latency = base_latency + self.completion_tokens / output_tokens_per_second
+
+    def _ask(self, report: PlanReport, history: Optional[_HistorySimulator], question: str) -> None:
+        """模拟一次请求"""
+        question_tokens = self.count(question) + MESSAGE_OVERHEAD_TOKENS
+        answer_tokens = self.completion_tokens + MESSAGE_OVERHEAD_TOKENS
+        prompt = self.system_tokens + question_tokens + (history.tokens if history else 0)
+        report.requests += 1
+        report.prompt_tokens += prompt
+        report.completion_tokens += self.completion_tokens
+        if prompt > report.max_prompt_tokens:
+            report.max_prompt_tokens = prompt
+        if history is not None:
+            history.save(question_tokens, answer_tokens)
+
+    def _branches_seconds(self, lengths: List[int]) -> float:
+        """各分支按提交顺序交给 concurrency 个工作线程，分支内的问题依次回答，返回全部分支完成的耗时"""
+        workers = [0.0] * min(self.concurrency, len(lengths))
+        for length in lengths:
+            heapq.heapreplace(workers, workers[0] + length * self.request_latency)
+        return max(workers, default=0.0)
+
+    def _plan_session(self, report: PlanReport, session: PlannedSession) -> float:
+        """模拟单个会话，返回该会话的预计耗时"""
+        report.sessions += 1
+        if session.independent:
+            count = 0
+            for question in session.questions:
+                self._ask(report, None, question)
+                count += 1
+            return -(-count // self.concurrency) * self.request_latency
+
+        history = _HistorySimulator(self.max_history_length)
+        chain = 0
+        for question in session.questions:
+            self._ask(report, history, question)
+            chain += 1
+
+        lengths = []
+        for questions in session.branches.values():
+            branch_history = history.fork()
+            for question in questions:
+                self._ask(report, branch_history, question)
+            lengths.append(len(questions))
+        return chain * self.request_latency + self._branches_seconds(lengths)
+
+    def plan(self, sessions: Iterable[PlannedSession]) -> PlanReport:
+        """规划一组会话（与 process_all_sessions 一致，会话之间依次处理，关键路径为各会话耗时之和）"""
+        report = PlanReport()
+        for session in sessions:
+            report.critical_path_seconds += self._plan_session(report, session)
+
+        report.serial_latency_seconds = report.requests * self.request_latency
+        report.cost = (report.prompt_tokens * self.prompt_price_per_1k
+                       + report.completion_tokens * self.completion_price_per_1k) / 1000
+
+        bounds = {"critical_path": report.critical_path_seconds}
+        if self.requests_per_minute:
+            bounds["requests_per_minute"] = report.requests / self.requests_per_minute * 60
+        if self.tokens_per_minute:
+            bounds["tokens_per_minute"] = report.total_tokens / self.tokens_per_minute * 60
+        report.limiting_factor, report.estimated_seconds = max(bounds.items(), key=lambda item: item[1])
+        return report
+
+    def plan_file(self, file_path: str) -> PlanReport:
+        """规划问题文件"""
+        return self.plan(iter_question_file(file_path))
+
+
+def iter_question_file(file_path: str) -> Iterator[PlannedSession]:
+    """按 load_questions_from_file 的格式读取问题文件；TXT 文件逐行流式读取"""
+    if not file_path.endswith(('.json', '.msgpack')):
+        def lines():
+            with open(file_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    line = line.strip()
+                    if line:
+                        yield line
+        yield PlannedSession(os.path.basename(file_path), lines())
+        return
+
+    data = load_file(file_path)
+    if isinstance(data, list):
+        yield PlannedSession(os.path.basename(file_path), data)
+        return
+    for session_id, session_info in data.items():
+        if isinstance(session_info, list):
+            yield PlannedSession(session_id, session_info)
+        elif isinstance(session_info, dict):
+            yield PlannedSession(
+                session_id,
+                session_info.get("prefix", session_info.get("questions", [])),
+                independent=bool(session_info.get("independent", False)),
+                branches=session_info.get("branches") or {}
+            )
+
+
+def main(argv: List[str] = None):
+    """命令行入口"""
+    parser = argparse.ArgumentParser(description="问题文件的 token 用量与成本预估")
+    parser.add_argument("questions_file", help="问题文件（.json 或 .txt）")
+    parser.add_argument("--system-prompt", default="你是一个专业的AI助手，请基于历史上下文（如果有）简单回答问题。")
+    parser.add_argument("--max-history", type=int, default=50, help="最大历史消息数")
+    parser.add_argument("--completion-tokens", type=int, default=300, help="每次回答的预计 token 数")
+    parser.add_argument("--max-tokens", type=int, default=1024, help="max_tokens 配置")
+    parser.add_argument("--prompt-price", type=float, default=0.0, help="每千 prompt token 价格")
+    parser.add_argument("--completion-price", type=float, default=0.0, help="每千 completion token 价格")
+    parser.add_argument("--concurrency", type=int, default=1, help="并发请求数")
+    parser.add_argument("--rpm", type=float, default=0.0, help="每分钟请求数限制")
+    parser.add_argument("--tpm", type=float, default=0.0, help="每分钟 token 数限制")
+    parser.add_argument("--latency", type=float, default=0.5, help="每次请求的固定延迟（秒）")
+    parser.add_argument("--tokens-per-second", type=float, default=50.0, help="生成速度")
+    parser.add_argument("--exact", action="store_true", help="使用 tiktoken 精确分词（较慢）")
+    parser.add_argument("--json", action="store_true", help="以 JSON 输出")
+    args = parser.parse_args(argv)
+
+    planner = TokenPlanner(
+        system_prompt=args.system_prompt, max_history_length=args.max_history,
+        completion_tokens=args.completion_tokens, max_tokens=args.max_tokens,
+        prompt_price_per_1k=args.prompt_price, completion_price_per_1k=args.completion_price,
+        concurrency=args.concurrency, requests_per_minute=args.rpm, tokens_per_minute=args.tpm,
+        base_latency=args.latency, output_tokens_per_second=args.tokens_per_second,
+        counter=get_token_counter(exact=args.exact)
+    )
+    report = planner.plan_file(args.questions_file)
+    if args.json:
+        print(json.dumps(report.to_dict(), ensure_ascii=False, indent=2))
+    else:
+        print(report.format_table())
+
+
+if __name__ == "__main__":
+    main()
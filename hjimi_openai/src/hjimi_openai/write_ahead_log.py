@@ -0,0 +1,148 @@
+"""!
+@file write_ahead_log.py
+@brief 对话状态的预写日志（WAL）
+
+@details
+每轮对话完成后先写入一条 WAL 记录，再更新对话记忆和输出文件；进程在两者之间崩溃时，
+重启后可以从 WAL 重建记忆、输出文件和会话 Markdown：
+- 记录格式：4 字节长度 + 4 字节 CRC32 + JSON 负载，读取时校验，尾部不完整的记录被截断
+- 每条记录写入后立即刷新到操作系统（进程崩溃不丢数据）
+- fsync 按组提交：累计 sync_every 条记录或距上次同步超过 sync_interval 秒时才 fsync，
+  后台线程保证最后一批记录在 sync_interval 内落盘
+- 正常关闭时 checkpoint 清空日志
+
+@example
+    wal = WriteAheadLog("output/conversation.wal", sync_every=8, sync_interval=1.0)
+    wal.append({"type": "turn", "problem": "问题", "response": "回答"})
+    records = WriteAheadLog.read_records("output/conversation.wal")
+    wal.checkpoint()
+    wal.close()
+"""
+import os
+import time
+import struct
+import zlib
+import threading
+from typing import List, Dict, Any
+
+from .serialization import get_serializer
+
+MAGIC = b"HJIMIWAL"
+_FRAME = struct.Struct("<II")  # (负载长度, CRC32)
+_serializer = get_serializer()
+
+
+def _scan(data: bytes) -> tuple:
+    """解析日志内容，返回 (记录列表, 最后一条完整记录的结束偏移)"""
+    records = []
+    offset = len(MAGIC)
+    while offset + _FRAME.size <= len(data):
+        length, checksum = _FRAME.unpack_from(data, offset)
+        start = offset + _FRAME.size
+        payload = data[start:start + length]
+        if len(payload) < length or zlib.crc32(payload) != checksum:
+            break
+        records.append(_serializer.loads(payload))
+        offset = start + length
+    return records, offset
+
+
+class WriteAheadLog:
+    """带校验与组提交的追加日志"""
+
+    def __init__(self, path: str, sync_every: int = 8, sync_interval: float = 1.0):
+        """
+        :param path: 日志文件路径
+        :param sync_every: 累计多少条记录执行一次 fsync（1 表示每条都 fsync）
+        :param sync_interval: 两次 fsync 的最长间隔（秒，0 表示不按时间同步）
+        """
+        self.path = path
+        self.sync_every = max(1, sync_every)
+        self.sync_interval = sync_interval
+        self.recovered = self._open()
+        self._lock = threading.Lock()
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+        self._stop = threading.Event()
+        self._syncer = None
+        if sync_interval > 0 and self.sync_every > 1:
+            self._syncer = threading.Thread(target=self._sync_loop, name="hjimi-wal-sync", daemon=True)
+            self._syncer.start()
+
+    def _open(self) -> List[Dict[str, Any]]:
+        """打开日志，截断尾部残缺记录，返回已有的完整记录"""
+        records = []
+        if os.path.exists(self.path):
+            with open(self.path, 'rb') as f:
+                data = f.read()
+            if data.startswith(MAGIC):
+                records, end = _scan(data)
+                if end < len(data):
+                    with open(self.path, 'r+b') as f:
+                        f.truncate(end)
+                        os.fsync(f.fileno())
+            else:
+                data = b""
+        else:
+            data = b""
+        self._file = open(self.path, 'ab')
+        if not data.startswith(MAGIC):
+            self._file.truncate(0)
+            self._file.write(MAGIC)
+            self._fsync()
+        return records
+
+    @staticmethod
+    def read_records(path: str) -> List[Dict[str, Any]]:
+        """只读地解析日志文件中的完整记录"""
+        if not os.path.exists(path):
+            return []
+        with open(path, 'rb') as f:
+            data = f.read()
+        return _scan(data)[0] if data.startswith(MAGIC) else []
+
+    def _fsync(self) -> None:
+        """刷新缓冲区并 fsync（调用方持有锁或处于初始化阶段）"""
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def append(self, record: Dict[str, Any]) -> None:
+        """追加一条记录；按组提交规则决定是否 fsync"""
+        payload = _serializer.dumps(record)
+        frame = _FRAME.pack(len(payload), zlib.crc32(payload)) + payload
+        with self._lock:
+            self._file.write(frame)
+            self._file.flush()
+            self._unsynced += 1
+            if self._unsynced >= self.sync_every or (
+                    self.sync_interval and time.monotonic() - self._last_sync >= self.sync_interval):
+                self._fsync()
+
+    def sync(self) -> None:
+        """立即 fsync 尚未落盘的记录"""
+        with self._lock:
+            if self._unsynced and not self._file.closed:
+                self._fsync()
+
+    def _sync_loop(self) -> None:
+        """后台线程：保证未落盘记录的等待时间不超过 sync_interval"""
+        while not self._stop.wait(self.sync_interval):
+            self.sync()
+
+    def checkpoint(self) -> None:
+        """状态已完整落盘后清空日志"""
+        with self._lock:
+            self._file.truncate(len(MAGIC))
+            self._fsync()
+
+    def close(self) -> None:
+        """停止后台同步线程，fsync 剩余记录并关闭文件"""
+        self._stop.set()
+        if self._syncer is not None:
+            self._syncer.join()
+        with self._lock:
+            if not self._file.closed:
+                self._fsync()
+                self._file.close()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import shutil
+import tempfile
+import unittest
+from datetime import datetime
+
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+from hjimi_openai import AIConversationManager, ConversationConfig, OutputFormat
+from hjimi_openai.formatters import create_renderer, SessionMarkdownWriter
+from hjimi_openai.session_archive import parse_session_markdown
+
+
+class TestFormatters(unittest.TestCase):
+    def setUp(self):
+        """创建临时目录"""
+        self.temp_dir = tempfile.mkdtemp(prefix="hjimi_format_")
+        os.environ.setdefault("DASHSCOPE_API_KEY", "test-key")
+
+    def tearDown(self):
+        """删除临时目录"""
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_html_escaping(self):
+        """测试 HTML 内容转义"""
+        renderer = create_renderer(OutputFormat.HTML)
+        text = renderer.render("<script>alert(1)</script>", "a & b", {"number": 1})
+        self.assertIn("&lt;script&gt;", text)
+        self.assertIn("a &amp; b", text)
+        self.assertNotIn("<script>", text)
+
+    def test_render_many_matches_single(self):
+        """测试批量渲染与逐条渲染结果一致"""
+        renderer = create_renderer(OutputFormat.MARKDOWN)
+        turns = [("q1", "r1", {"number": 1}), ("q2", "r2", {"number": 2})]
+        batched = renderer.render_many(turns)
+        single = "".join(renderer.render(*turn, timestamp=renderer._clock.now()) for turn in turns)
+        self.assertEqual(batched, single)
+
+    def test_output_files_are_well_formed(self):
+        """测试 JSON 与 HTML 输出文件在关闭后完整"""
+        for output_format in (OutputFormat.JSON, OutputFormat.HTML):
+            config = ConversationConfig(output_dir=self.temp_dir, output_format=output_format)
+            with AIConversationManager(config) as manager:
+                manager.llm = FakeListChatModel(responses=["<b>1</b>", "2"])
+                manager.process_questions(["问题1", "问题2"])
+                output_path = manager.output_handler.output_path
+
+            with open(output_path, 'r', encoding='utf-8') as f:
+                text = f.read()
+            if output_format == OutputFormat.JSON:
+                records = json.loads(text)
+                self.assertEqual([r["response"] for r in records], ["<b>1</b>", "2"])
+            else:
+                self.assertTrue(text.rstrip().endswith("</body></html>"))
+                self.assertIn("&lt;b&gt;1&lt;/b&gt;", text)
+
+    def test_session_markdown_is_streamed(self):
+        """测试会话 Markdown 逐块写出，关闭时回填结束时间，且可被归档解析"""
+        path = os.path.join(self.temp_dir, "session_s_20240101_120000.md")
+        template = ConversationConfig().markdown_template
+        writer = SessionMarkdownWriter(path, template, "标题", "s", datetime(2024, 1, 1, 12, 0, 0))
+        writer.write_qa({"question": "前缀", "response": "回答0", "number": 1})
+        with open(path, 'r', encoding='utf-8') as f:
+            partial = f.read()
+        self.assertIn("回答0", partial)
+        self.assertIn("结束时间: 进行中", partial)
+
+        writer.write_many([{"question": "q", "response": "回答1", "number": 2, "branch": "a"},
+                           {"question": "q", "response": "回答2", "number": 2, "branch": "b"}])
+        writer.close(datetime(2024, 1, 1, 12, 30, 0))
+        with open(path, 'r', encoding='utf-8') as f:
+            text = f.read()
+        self.assertIn("结束时间: 2024-01-01 12:30:00\n", text)
+        self.assertIn("## 分支：b", text)
+        entries = list(parse_session_markdown(path))
+        self.assertEqual([e["response"] for e in entries], ["回答0", "回答1", "回答2"])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import shutil
+import tempfile
+import unittest
+
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+from hjimi_openai import AIConversationManager, ConversationConfig
+from hjimi_openai.history_exporter import ColumnarHistoryExporter, read_columns, pa
+
+
+@unittest.skipIf(pa is None, "pyarrow 未安装")
+class TestColumnarHistoryExporter(unittest.TestCase):
+    def setUp(self):
+        """创建临时输出目录"""
+        self.temp_dir = tempfile.mkdtemp(prefix="hjimi_export_")
+        os.environ.setdefault("DASHSCOPE_API_KEY", "test-key")
+
+    def tearDown(self):
+        """删除临时输出目录"""
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_batched_parquet_export(self):
+        """测试按批写出并按列读取"""
+        base_path = os.path.join(self.temp_dir, "run")
+        exporter = ColumnarHistoryExporter(base_path, batch_size=2)
+        for i in range(5):
+            exporter.add_turn({"session_id": "s1", "turn": i + 1, "question": f"q{i}"})
+        self.assertEqual(exporter.turns.rows_written, 4)
+        # 关闭前只有临时文件，最终文件名不会指向缺少文件尾的文件
+        self.assertFalse(os.path.exists(exporter.turns_path))
+        self.assertTrue(os.path.exists(exporter.turns_path + ".partial"))
+        exporter.close()
+        self.assertFalse(os.path.exists(exporter.turns_path + ".partial"))
+
+        table = read_columns(exporter.turns_path, columns=["turn"])
+        self.assertEqual(table.column_names, ["turn"])
+        self.assertEqual(table.column("turn").to_pylist(), [1, 2, 3, 4, 5])
+
+    def test_arrow_history_file_import(self):
+        """测试从 chat_history 文件导入轮次"""
+        history_path = os.path.join(self.temp_dir, "chat_history_1.json")
+        with open(history_path, 'w', encoding='utf-8') as f:
+            json.dump([
+                {"role": "user", "content": "问题1"},
+                {"role": "assistant", "content": "回答1"},
+                {"role": "user", "content": "问题2"},
+                {"role": "assistant", "content": "回答2"},
+            ], f, ensure_ascii=False)
+
+        exporter = ColumnarHistoryExporter(os.path.join(self.temp_dir, "run"), export_format="arrow")
+        self.assertEqual(exporter.export_history_file(history_path, session_id="h1"), 2)
+        exporter.close()
+
+        table = read_columns(exporter.turns_path, columns=["question", "response"])
+        self.assertEqual(table.column("question").to_pylist(), ["问题1", "问题2"])
+
+    def test_manager_exports_sessions(self):
+        """测试管理器在处理会话时导出轮次与会话汇总"""
+        config = ConversationConfig(output_dir=self.temp_dir, analytics_format="parquet")
+        with AIConversationManager(config) as manager:
+            manager.llm = FakeListChatModel(responses=["回答A", "回答B"])
+            manager.process_questions({"demo": ["问题A", "问题B"]})
+            exporter = manager.analytics_exporter
+
+        turns = read_columns(exporter.turns_path, columns=["session_id", "response"])
+        self.assertEqual(turns.column("response").to_pylist(), ["回答A", "回答B"])
+        sessions = read_columns(exporter.sessions_path)
+        self.assertEqual(sessions.column("turns").to_pylist(), [2])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import time
+import shutil
+import tempfile
+import threading
+import unittest
+
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+from hjimi_openai import AIConversationManager, ConversationConfig
+from hjimi_openai.job_scheduler import JobScheduler, JobPriority, DeadlineExceeded
+
+
+class TestJobScheduler(unittest.TestCase):
+    def test_priority_and_fair_sharing(self):
+        """测试高优先级先执行，同优先级内租户轮转"""
+        order = []
+        gate = threading.Event()
+
+        def handler(job):
+            gate.wait()
+            order.append(job.problem)
+            return job.problem
+
+        scheduler = JobScheduler([handler])
+        scheduler.submit_batch(["a1", "a2", "a3"], tenant="a")
+        scheduler.submit_batch(["b1", "b2"], tenant="b")
+        interactive = scheduler.submit("i1", tenant="c", priority=JobPriority.INTERACTIVE)
+        scheduler.start()
+        gate.set()
+        scheduler.shutdown()
+
+        self.assertEqual(interactive.result(), "i1")
+        self.assertEqual(order, ["i1", "a1", "b1", "a2", "b2", "a3"])
+        self.assertEqual(scheduler.stats()["completed"], 6)
+
+    def test_reserved_worker_serves_interactive_during_batch(self):
+        """测试批量任务占满通用线程时，交互任务由预留线程立即执行"""
+        release = threading.Event()
+
+        def handler(job):
+            if job.priority == JobPriority.BATCH:
+                release.wait(5)
+            return job.problem
+
+        scheduler = JobScheduler([handler, handler], reserved_interactive_workers=1)
+        scheduler.start()
+        batch = scheduler.submit_batch(["b1", "b2"], tenant="batch")
+        time.sleep(0.05)
+        interactive = scheduler.submit("hi", tenant="alice", priority=JobPriority.INTERACTIVE)
+        self.assertEqual(interactive.result(timeout=1), "hi")
+        self.assertFalse(batch[0].future.done())
+        release.set()
+        scheduler.shutdown()
+        self.assertEqual([job.result() for job in batch], ["b1", "b2"])
+
+    def test_deadline_and_cancellation(self):
+        """测试超时与取消的任务不会执行"""
+        executed = []
+        scheduler = JobScheduler([lambda job: executed.append(job.problem)])
+        expired = scheduler.submit("late", timeout=0)
+        cancelled = scheduler.submit("cancel-me")
+        kept = scheduler.submit("kept")
+        self.assertTrue(cancelled.cancel())
+        time.sleep(0.01)
+        scheduler.start()
+        scheduler.shutdown()
+
+        with self.assertRaises(DeadlineExceeded):
+            expired.result()
+        self.assertTrue(cancelled.future.cancelled())
+        kept.result()
+        self.assertEqual(executed, ["kept"])
+        stats = scheduler.stats()
+        self.assertEqual((stats["expired"], stats["cancelled"]), (1, 1))
+
+    def test_for_managers_isolates_tenant_memory(self):
+        """测试每个租户使用独立的对话记忆"""
+        temp_dir = tempfile.mkdtemp(prefix="hjimi_scheduler_")
+        os.environ.setdefault("DASHSCOPE_API_KEY", "test-key")
+        try:
+            manager = AIConversationManager(ConversationConfig(output_dir=temp_dir, log_to_console=False))
+            manager.llm = FakeListChatModel(responses=["r1", "r2", "r3"])
+            scheduler = JobScheduler.for_managers([manager])
+            scheduler.submit("alice-1", tenant="alice")
+            scheduler.submit("bob-1", tenant="bob")
+            scheduler.submit("alice-2", tenant="alice")
+            scheduler.start()
+            scheduler.shutdown()
+            manager.close()
+
+            alice = [m.content for m in scheduler.tenant_memories["alice"].chat_history.messages]
+            bob = [m.content for m in scheduler.tenant_memories["bob"].chat_history.messages]
+            self.assertEqual(alice[0::2], ["alice-1", "alice-2"])
+            self.assertEqual(bob[0::2], ["bob-1"])
+            self.assertEqual(manager.memory.chat_history.messages, [])
+
+            # 超出租户上限时丢弃最久未使用租户的记忆
+            scheduler = JobScheduler.for_managers([manager], max_tenants=2)
+            manager.llm = FakeListChatModel(responses=["ok"])
+            scheduler.start()
+            for tenant in ["alice", "bob", "alice", "carol"]:
+                scheduler.submit(f"{tenant}-q", tenant=tenant).result(timeout=5)
+            scheduler.shutdown()
+            self.assertEqual(list(scheduler.tenant_memories), ["alice", "carol"])
+            self.assertEqual(len(scheduler.tenant_memories["alice"].chat_history.messages), 4)
+        finally:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import sys
+import shutil
+import logging
+import subprocess
+import tempfile
+import unittest
+
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+from hjimi_openai import AIConversationManager, ConversationConfig
+
+
+class TestLoggingPipeline(unittest.TestCase):
+    def setUp(self):
+        """创建临时目录"""
+        self.temp_dir = tempfile.mkdtemp(prefix="hjimi_logging_")
+        os.environ.setdefault("DASHSCOPE_API_KEY", "test-key")
+
+    def tearDown(self):
+        """删除临时目录"""
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_structured_records_with_session_context(self):
+        """测试 JSON 日志记录带有会话上下文，且不修改根 logger"""
+        root_handlers = list(logging.getLogger().handlers)
+        config = ConversationConfig(output_dir=self.temp_dir, log_to_console=False)
+        with AIConversationManager(config) as manager:
+            manager.llm = FakeListChatModel(responses=["回答"])
+            manager.process_questions({"demo": ["问题" * 100]})
+            pipeline = manager.log_pipeline
+
+        self.assertFalse(pipeline.listener._thread)
+        self.assertEqual(logging.getLogger().handlers, root_handlers)
+        self.assertNotIn(pipeline.logger.name, logging.Logger.manager.loggerDict)
+
+        with open(os.path.join(self.temp_dir, "conversation.log"), 'r', encoding='utf-8') as f:
+            records = [json.loads(line) for line in f]
+        processing = [r for r in records if r["message"].startswith("Processing conversation")]
+        self.assertEqual(len(processing), 1)
+        self.assertEqual(processing[0]["session_id"], "demo")
+        self.assertIn("manager_id", processing[0])
+        self.assertLessEqual(len(processing[0]["message"]), len("Processing conversation 1: ...") + 100)
+
+    def test_queued_records_are_written_at_exit(self):
+        """测试未调用 stop 时，解释器退出前仍会写完队列中的记录"""
+        log_file = os.path.join(self.temp_dir, "exit.log")
+        script = (
+            "import sys\n"
+            "from hjimi_openai.logging_pipeline import setup_manager_logging\n"
+            "pipeline = setup_manager_logging('hjimi_openai.exit', sys.argv[1], console=False)\n"
+            "for i in range(1000):\n"
+            "    pipeline.logger.info('record %d', i)\n"
+        )
+        env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+        subprocess.run([sys.executable, "-c", script, log_file], check=True, env=env)
+        with open(log_file, 'r', encoding='utf-8') as f:
+            records = [json.loads(line) for line in f]
+        self.assertEqual(len(records), 1000)
+        self.assertEqual(records[-1]["message"], "record 999")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import io
+import os
+import json
+import time
+import shutil
+import tempfile
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import redirect_stdout
+from pathlib import Path
+
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+from hjimi_openai import ConversationConfig, ManagerPool, OutputFormat
+
+
+class StreamingFakeModel(FakeListChatModel):
+    """像开启 streaming 的模型客户端一样逐 token 触发回调的假模型"""
+
+    def _should_stream(self, **kwargs) -> bool:
+        return True
+
+class TestManagerPool(unittest.TestCase):
+    def setUp(self):
+        """创建共享管理器池"""
+        self.temp_dir = tempfile.mkdtemp(prefix="hjimi_pool_")
+        os.environ.setdefault("DASHSCOPE_API_KEY", "test-key")
+        self.pool = ManagerPool(ConversationConfig(output_dir=self.temp_dir, log_to_console=False))
+        self.pool.manager.llm = FakeListChatModel(responses=["好的"])
+
+    def tearDown(self):
+        """关闭管理器池并删除临时目录"""
+        self.pool.close()
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_tenants_have_isolated_memory(self):
+        """测试租户之间的记忆与输出文件相互隔离"""
+        self.pool.context("alice").ask("alice-1")
+        self.pool.context("bob").ask("bob-1")
+        self.pool.context("alice").ask("alice-2")
+
+        alice = self.pool.context("alice").get_chat_history()
+        self.assertEqual([m["content"] for m in alice if m["role"] == "user"], ["alice-1", "alice-2"])
+        self.assertEqual(len(self.pool.context("bob").memory.chat_history.messages), 2)
+
+        self.pool.release("alice")
+        output = Path(self.temp_dir, "tenants", "alice.markdown").read_text(encoding='utf-8')
+        self.assertIn("alice-2", output)
+        self.assertNotIn("bob-1", output)
+        self.assertEqual(self.pool.tenants(), ["bob"])
+
+    def test_tenant_output_survives_release_and_restart(self):
+        """测试租户释放或管理器池重建后再次提问时，输出文件接着写入且格式完整"""
+        config = ConversationConfig(output_dir=self.temp_dir, log_to_console=False,
+                                    output_format=OutputFormat.JSON)
+        with ManagerPool(config) as pool:
+            pool.manager.llm = FakeListChatModel(responses=["好的"])
+            pool.context("carol").ask("carol-1")
+            pool.release("carol")
+            pool.context("carol").ask("carol-2")
+        with ManagerPool(config) as pool:
+            pool.manager.llm = FakeListChatModel(responses=["好的"])
+            pool.context("carol").ask("carol-3")
+
+        with open(os.path.join(self.temp_dir, "tenants", "carol.json"), 'r', encoding='utf-8') as f:
+            records = json.load(f)
+        self.assertEqual([r["problem"] for r in records], ["carol-1", "carol-2", "carol-3"])
+
+    def test_context_creation_is_cheap(self):
+        """测试为新租户创建上下文不涉及 I/O，耗时远低于创建管理器"""
+        started = time.perf_counter()
+        for i in range(1000):
+            self.pool.context(f"t{i}")
+        self.assertLess((time.perf_counter() - started) / 1000, 1e-3)
+        self.assertEqual(len(self.pool.tenants()), 1000)
+        self.assertFalse(Path(self.temp_dir, "tenants").exists())
+
+    def test_tenants_do_not_stream_through_shared_callbacks(self):
+        """测试租户的回答不写入共享管理器的流式输出回调"""
+        self.pool.manager.llm = StreamingFakeModel(responses=["好的"])
+        stdout = io.StringIO()
+        with redirect_stdout(stdout):
+            self.assertEqual(self.pool.context("alice").ask("alice-1"), "好的")
+        self.assertEqual(stdout.getvalue(), "")
+        self.assertEqual(self.pool.manager.output_handler.current_content, [])
+
+        # 管理器自己的对话仍然流式输出
+        with redirect_stdout(stdout):
+            self.pool.manager.process_conversation("manager-1")
+        self.assertEqual("".join(self.pool.manager.output_handler.current_content), "好的")
+
+    def test_concurrent_tenants(self):
+        """测试多个租户并发提问时各自的历史按顺序推进"""
+        def run(tenant):
+            context = self.pool.context(tenant)
+            for i in range(3):
+                context.ask(f"{tenant}-{i}")
+            return [m["content"] for m in context.get_chat_history() if m["role"] == "user"]
+
+        tenants = [f"t{i}" for i in range(4)]
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            histories = list(executor.map(run, tenants))
+        for tenant, history in zip(tenants, histories):
+            self.assertEqual(history, [f"{tenant}-{i}" for i in range(3)])
+
+
+if __name__ == '__main__':
+    unittest.main()
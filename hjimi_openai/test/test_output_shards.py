@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import gzip
+import json
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+from hjimi_openai import AIConversationManager, ConversationConfig, OutputFormat
+from hjimi_openai.output_shards import ShardManifest
+
+
+class TestOutputShards(unittest.TestCase):
+    def setUp(self):
+        """创建临时目录"""
+        self.temp_dir = tempfile.mkdtemp(prefix="hjimi_shards_")
+        self.shard_dir = os.path.join(self.temp_dir, "shards")
+        os.environ.setdefault("DASHSCOPE_API_KEY", "test-key")
+
+    def tearDown(self):
+        """删除临时目录"""
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def _run(self, sessions, **options):
+        config = ConversationConfig(output_dir=self.temp_dir, log_to_console=False,
+                                    output_sharding=True, **options)
+        with AIConversationManager(config) as manager:
+            manager.llm = FakeListChatModel(responses=[f"回答{i}" for i in range(20)])
+            manager.process_questions(sessions)
+
+    def test_rotation_by_turns_and_session_lookup(self):
+        """测试按轮数轮转，并通过清单定位会话"""
+        self._run({"a": ["a1", "a2", "a3"], "b": ["b1", "b2"]}, output_shard_max_turns=2)
+
+        shards = sorted(p.name for p in Path(self.shard_dir).glob("conversation_*.markdown"))
+        self.assertEqual(len(shards), 3)
+        manifest = ShardManifest(self.shard_dir)
+        self.assertEqual(manifest.session_ids(), ["a", "b"])
+        # 会话 a 的第 3 轮与会话 b 的第 1 轮落在同一分片
+        self.assertEqual(len(manifest.locate("a")), 2)
+        text_b = manifest.read_session("b")
+        self.assertIn("b1", text_b)
+        self.assertIn("b2", text_b)
+        self.assertNotIn("a3", text_b)
+
+    def test_session_naming_json_and_compression(self):
+        """测试按会话命名的 JSON 分片均为合法数组，并在后台压缩"""
+        self._run({"math": ["m1", "m2"], "art": ["x1"]}, output_format=OutputFormat.JSON,
+                  output_shard_naming="session", output_shard_compress=True)
+
+        files = sorted(p.name for p in Path(self.shard_dir).iterdir() if p.name != "manifest.jsonl")
+        self.assertEqual(files, ["conversation_art_00002.json.gz", "conversation_math_00001.json.gz"])
+        manifest = ShardManifest(self.shard_dir)
+        self.assertIn("x1", manifest.read_session("art"))
+        with gzip.open(os.path.join(self.shard_dir, files[1]), 'rt', encoding='utf-8') as f:
+            records = json.load(f)
+        self.assertEqual([r["problem"] for r in records], ["m1", "m2"])
+
+    def test_restart_keeps_existing_shards(self):
+        """测试重新启动不会覆盖已有分片"""
+        self._run({"a": ["a1"]})
+        self._run({"b": ["b1"]})
+        shards = sorted(Path(self.shard_dir).glob("conversation_*.markdown"))
+        self.assertEqual(len(shards), 2)
+        self.assertTrue(shards[1].name.endswith("_00002.markdown"))
+        self.assertIn("a1", ShardManifest(self.shard_dir).read_session("a"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import time
+import shutil
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+from typing import Any
+
+from langchain_core.language_models.chat_models import SimpleChatModel
+
+from hjimi_openai import AIConversationManager, ConversationConfig
+
+
+class SlowEchoModel(SimpleChatModel):
+    """延迟固定时间后回显最后一条消息，并记录收到的历史长度"""
+
+    delay: float = 0.2
+    history_lengths: list = []
+    barrier: Any = None  # 设置后每次调用都要等到足够多的调用同时到达，调用未并发时超时并损坏
+
+    @property
+    def _llm_type(self) -> str:
+        return "slow-echo"
+
+    def _call(self, messages, stop=None, run_manager=None, **kwargs) -> str:
+        if self.barrier is not None:
+            try:
+                self.barrier.wait(timeout=5)
+            except threading.BrokenBarrierError:
+                pass
+        time.sleep(self.delay)
+        self.history_lengths.append(len(messages))
+        return f"答：{messages[-1].content}"
+
+
+class TestParallelSessions(unittest.TestCase):
+    def setUp(self):
+        """创建临时目录"""
+        self.temp_dir = tempfile.mkdtemp(prefix="hjimi_parallel_")
+        os.environ.setdefault("DASHSCOPE_API_KEY", "test-key")
+
+    def tearDown(self):
+        """删除临时目录"""
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_independent_session_runs_in_parallel(self):
+        """测试独立问题并行回答、无历史，且结果保持原顺序"""
+        questions_file = Path(self.temp_dir) / "questions.json"
+        questions = [f"问题{i}" for i in range(4)]
+        with open(questions_file, 'w', encoding='utf-8') as f:
+            json.dump({"misc": {"title": "杂项", "independent": True, "questions": questions}},
+                      f, ensure_ascii=False)
+
+        config = ConversationConfig(output_dir=self.temp_dir, log_to_console=False,
+                                    max_parallel_questions=4)
+        barrier = threading.Barrier(len(questions))
+        with AIConversationManager(config) as manager:
+            manager.llm = SlowEchoModel(history_lengths=[], delay=0, barrier=barrier)
+            manager.process_questions(str(questions_file))
+            session = manager.sessions["misc"]
+
+        # 四个问题的模型调用同时进行，栅栏才会放行而不超时
+        self.assertFalse(barrier.broken)
+        self.assertEqual([qa["response"] for qa in session.content], [f"答：{q}" for q in questions])
+        self.assertEqual([qa["number"] for qa in session.content], [1, 2, 3, 4])
+        # 每次调用只有 system + human 两条消息
+        self.assertEqual(manager.llm.history_lengths, [2] * len(questions))
+
+        output = Path(self.temp_dir, "conversation.markdown").read_text(encoding='utf-8')
+        positions = [output.index(f"答：{q}") for q in questions]
+        self.assertEqual(positions, sorted(positions))
+
+    def test_question_tree_reuses_prefix(self):
+        """测试问题树的共享前缀只回答一次，分支在前缀历史上并发运行"""
+        sessions = {
+            "tree": {
+                "title": "问题树",
+                "prefix": ["前缀1", "前缀2"],
+                "branches": {"a": ["分支A"], "b": ["分支B"], "c": ["分支C"]}
+            }
+        }
+        config = ConversationConfig(output_dir=self.temp_dir, log_to_console=False)
+        with AIConversationManager(config) as manager:
+            manager.llm = SlowEchoModel(history_lengths=[])
+            manager.process_questions(sessions)
+            session = manager.sessions["tree"]
+            prefix_history = len(manager.memory.chat_history.messages)
+
+        # 2 次前缀调用 + 3 次分支调用；分支调用看到 system + 4 条前缀消息 + 问题
+        self.assertEqual(manager.llm.history_lengths[:2], [2, 4])
+        self.assertEqual(sorted(manager.llm.history_lengths[2:]), [6, 6, 6])
+        self.assertEqual(prefix_history, 4)
+        self.assertEqual([qa.get("branch") for qa in session.content], [None, None, "a", "b", "c"])
+        self.assertEqual([qa["number"] for qa in session.content], [1, 2, 3, 3, 3])
+
+        markdown = next(Path(self.temp_dir).glob("session_tree_*.md")).read_text(encoding='utf-8')
+        self.assertIn("## 分支：b", markdown)
+
+
+if __name__ == '__main__':
+    unittest.main()
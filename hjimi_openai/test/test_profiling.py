@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import io
+import os
+import pstats
+import shutil
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from unittest import mock
+
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+from hjimi_openai import AIConversationManager, ConversationConfig
+from hjimi_openai import profiling
+from hjimi_openai.profiling import StageProfiler, profile_run
+
+
+class TestProfiling(unittest.TestCase):
+    def setUp(self):
+        """创建临时目录"""
+        self.temp_dir = tempfile.mkdtemp(prefix="hjimi_profile_")
+        os.environ.setdefault("DASHSCOPE_API_KEY", "test-key")
+
+    def tearDown(self):
+        """删除临时目录"""
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_disabled_profiler_records_nothing(self):
+        """测试未启用时不记录任何数据"""
+        profiler = StageProfiler(enabled=False)
+        with profiler.stage("llm_call"):
+            pass
+        self.assertEqual(profiler.summary(), {})
+
+    def test_stage_breakdown_per_session(self):
+        """测试按会话汇总各阶段耗时，并输出 cProfile 文件与汇总表"""
+        prof_path = os.path.join(self.temp_dir, "run.prof")
+        config = ConversationConfig(output_dir=self.temp_dir, log_to_console=False,
+                                    profile_enabled=True, profile_output=prof_path)
+        with AIConversationManager(config) as manager:
+            manager.llm = FakeListChatModel(responses=["r1", "r2", "r3", "r4"])
+            stdout = io.StringIO()
+            with redirect_stdout(stdout):
+                manager.process_questions({
+                    "a": ["q1", "q2"],
+                    "b": {"independent": True, "questions": ["q3", "q4"]}
+                })
+            profiler = manager.profiler
+
+        total = profiler.summary()
+        for stage in ("prompt_render", "llm_call", "memory_update", "output_write", "session_markdown"):
+            self.assertIn(stage, total)
+        self.assertEqual(total["llm_call"]["calls"], 4)
+        # 独立问题在工作线程中执行，仍归属会话 b
+        self.assertEqual(profiler.summary("a")["llm_call"]["calls"], 2)
+        self.assertEqual(profiler.summary("b")["llm_call"]["calls"], 2)
+        self.assertIn("llm_call", stdout.getvalue())
+        self.assertGreater(pstats.Stats(prof_path).total_calls, 0)
+
+    def test_text_profile_requires_pyinstrument(self):
+        """测试未安装 pyinstrument 时 .html/.txt 路径报错且不写出文件"""
+        html_path = os.path.join(self.temp_dir, "run.html")
+        with mock.patch.object(profiling, "PyinstrumentProfiler", None):
+            with self.assertRaises(ImportError):
+                with profile_run(html_path):
+                    pass
+        self.assertFalse(os.path.exists(html_path))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import shutil
+import tempfile
+import unittest
+
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+from hjimi_openai import AIConversationManager, ConversationConfig
+from hjimi_openai.semantic_cache import HashingEmbedder, SemanticAnswerCache, np
+
+
+@unittest.skipIf(np is None, "numpy 未安装")
+class TestSemanticAnswerCache(unittest.TestCase):
+    def setUp(self):
+        """创建临时目录"""
+        self.temp_dir = tempfile.mkdtemp(prefix="hjimi_semantic_")
+        os.environ.setdefault("DASHSCOPE_API_KEY", "test-key")
+
+    def tearDown(self):
+        """删除临时目录"""
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_exact_matching_by_default(self):
+        """测试默认只复用归一化后相同的问题：字面相近但含义不同的问题不命中"""
+        cache = SemanticAnswerCache()
+        cache.add("How do I create a file in Linux?", "touch file")
+        cache.add("Python中列表和元组有什么区别？", "元组不可变")
+        self.assertEqual(cache.lookup("how do I create a file in linux"), "touch file")
+        for question in ["How do I delete a file in Linux?", "How do I not create a file in Linux?",
+                         "Python中列表和字典有什么区别？"]:
+            self.assertIsNone(cache.lookup(question), question)
+
+    def test_embedder_requires_calibrated_threshold(self):
+        """测试使用嵌入函数时必须给出阈值；字符级嵌入在高阈值下不把相反含义的问题当作命中"""
+        with self.assertRaises(ValueError):
+            SemanticAnswerCache(embed_fn=HashingEmbedder())
+        cache = SemanticAnswerCache(embed_fn=HashingEmbedder(), threshold=0.97)
+        cache.add("How do I create a file in Linux?", "touch file")
+        cache.add("Python中列表和元组有什么区别？", "元组不可变")
+        for question in ["How do I delete a file in Linux?", "How do I not create a file in Linux?",
+                         "Python中列表和字典有什么区别？"]:
+            self.assertIsNone(cache.lookup(question), question)
+
+    def test_paraphrase_hit_and_stats(self):
+        """测试提供嵌入函数时改写问题命中与命中率统计"""
+        cache = SemanticAnswerCache(embed_fn=HashingEmbedder(), threshold=0.8)
+        cache.add("什么是量子计算？", "量子计算利用量子力学原理进行计算。")
+        self.assertIsNotNone(cache.lookup("量子计算是什么"))
+        self.assertIsNone(cache.lookup("如何烹饪红烧肉？"))
+        stats = cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (1, 1))
+        self.assertAlmostEqual(stats["hit_rate"], 0.5)
+
+    def test_ivf_rebuild_from_store(self):
+        """测试从问答存储文件批量重建 IVF 索引"""
+        store_path = os.path.join(self.temp_dir, "semantic_cache.jsonl")
+        writer = SemanticAnswerCache(store_path=store_path)
+        for i in range(200):
+            writer.add(f"第{i}号问题：编号{i * 7919}的含义", f"回答{i}")
+
+        cache = SemanticAnswerCache(embed_fn=HashingEmbedder(), threshold=0.95, index_type="ivf",
+                                    nlist=8, nprobe=8)
+        self.assertEqual(cache.rebuild_from_history_files([store_path]), 200)
+        self.assertIsNotNone(cache.index.centroids)
+        self.assertEqual(cache.lookup(f"第42号问题：编号{42 * 7919}的含义"), "回答42")
+
+    def test_history_rebuild_skips_follow_ups(self):
+        """测试从对话历史重建时只取第一组问答，依赖上文的追问不会被复用"""
+        with open(os.path.join(self.temp_dir, "chat_history_1.json"), 'w', encoding='utf-8') as f:
+            json.dump([
+                {"role": "user", "content": "解释一下量子计算"},
+                {"role": "assistant", "content": "量子计算……"},
+                {"role": "user", "content": "基于上文，它有什么应用？"},
+                {"role": "assistant", "content": "量子计算的应用……"},
+            ], f, ensure_ascii=False)
+        cache = SemanticAnswerCache()
+        self.assertEqual(cache.rebuild_from_history_files([self.temp_dir]), 1)
+        self.assertIsNone(cache.lookup("基于上文，它有什么应用？"))
+
+    def test_manager_reuses_answer(self):
+        """测试管理器复用无上下文问题的答案；预热只载入无历史时回答的问答"""
+        config = ConversationConfig(output_dir=self.temp_dir, semantic_cache_enabled=True)
+        with AIConversationManager(config) as manager:
+            manager.llm = FakeListChatModel(responses=["第一次回答", "追问回答", "不应被调用"])
+            manager.process_questions({"a": ["什么是量子计算？", "基于上文，它有什么应用？"],
+                                       "b": ["什么是量子计算"]})
+            self.assertEqual(manager.sessions["b"].content[0]["response"], "第一次回答")
+            self.assertEqual(manager.semantic_cache.stats()["hits"], 1)
+            manager.save_history()
+
+        with AIConversationManager(config) as manager:
+            self.assertEqual(len(manager.semantic_cache), 1)
+            self.assertIsNone(manager.semantic_cache.lookup("基于上文，它有什么应用？"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import shutil
+import tempfile
+import unittest
+from datetime import datetime
+
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+from hjimi_openai import AIConversationManager, ConversationConfig, OutputFormat
+from hjimi_openai import serialization
+from hjimi_openai.serialization import get_serializer, dumps, dump_file, load_file
+
+
+class TestSerialization(unittest.TestCase):
+    def setUp(self):
+        """创建临时目录"""
+        self.temp_dir = tempfile.mkdtemp(prefix="hjimi_serialize_")
+        os.environ.setdefault("DASHSCOPE_API_KEY", "test-key")
+
+    def tearDown(self):
+        """删除临时目录"""
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_backends_round_trip(self):
+        """测试各个已安装后端的序列化结果一致"""
+        record = {"问题": "量子计算", "number": 1, "tags": ["物理", None]}
+        backends = ["json"] + [name for name, module in (("orjson", serialization.orjson),
+                                                          ("msgspec", serialization.msgspec)) if module]
+        for backend in backends:
+            serializer = get_serializer(backend)
+            compact = serializer.dumps(record)
+            pretty = serializer.dumps(record, pretty=True)
+            self.assertLess(len(compact), len(pretty))
+            self.assertEqual(serializer.loads(compact), record)
+            self.assertEqual(serializer.loads(pretty), record)
+            self.assertEqual(json.loads(compact), record)
+            # 非 JSON 原生类型（如 datetime）不会导致序列化失败
+            self.assertTrue(serializer.dumps({"time": datetime(2024, 1, 1)}))
+
+    @unittest.skipIf(serialization.msgspec is None, "msgspec is not installed")
+    def test_msgpack_file(self):
+        """测试 MessagePack 文件读写"""
+        path = os.path.join(self.temp_dir, "chat_history_1.msgpack")
+        dump_file(path, [{"role": "user", "content": "你好"}], "msgpack")
+        self.assertEqual(load_file(path), [{"role": "user", "content": "你好"}])
+
+    def test_manager_history_formats(self):
+        """测试对话历史按配置格式保存，角色通过消息类型映射"""
+        config = ConversationConfig(output_dir=self.temp_dir, log_to_console=False, history_format="compact")
+        with AIConversationManager(config) as manager:
+            manager.llm = FakeListChatModel(responses=["回答"])
+            manager.process_conversation("问题")
+            self.assertEqual(manager.get_chat_history(), [{"role": "user", "content": "问题"},
+                                                          {"role": "assistant", "content": "回答"}])
+            manager.save_history("chat_history_test.json")
+
+        with open(os.path.join(self.temp_dir, "chat_history_test.json"), 'rb') as f:
+            data = f.read()
+        self.assertNotIn(b"\n", data)
+        self.assertEqual(load_file(os.path.join(self.temp_dir, "chat_history_test.json"))[1]["content"], "回答")
+        with self.assertRaises(ValueError):
+            dumps({}, "yaml")
+
+    def test_json_output_uses_configured_backend(self):
+        """测试 JSON 输出文件使用配置的序列化后端"""
+        config = ConversationConfig(output_dir=self.temp_dir, log_to_console=False,
+                                    output_format=OutputFormat.JSON, serializer_backend="json")
+        with AIConversationManager(config) as manager:
+            self.assertIs(manager.output_handler.renderer._dumps.__self__, get_serializer("json"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+from hjimi_openai import AIConversationManager, ConversationConfig
+from hjimi_openai.session_archive import SessionArchive
+
+
+class TestSessionArchive(unittest.TestCase):
+    def setUp(self):
+        """生成一批会话产物"""
+        self.temp_dir = tempfile.mkdtemp(prefix="hjimi_archive_")
+        os.environ.setdefault("DASHSCOPE_API_KEY", "test-key")
+        config = ConversationConfig(output_dir=self.temp_dir, save_interval=2)
+        manager = AIConversationManager(config)
+        manager.llm = FakeListChatModel(responses=["量子比特可以处于叠加态", "经典比特只有0和1"])
+        manager.process_questions({"quantum": ["什么是量子比特？", "经典比特呢？"]})
+        manager.close()
+        self.db_path = os.path.join(self.temp_dir, "archive.sqlite3")
+
+    def tearDown(self):
+        """删除临时目录"""
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_index_and_search(self):
+        """测试索引与全文检索"""
+        with SessionArchive(self.db_path) as archive:
+            stats = archive.index_directory(self.temp_dir)
+            self.assertGreater(stats["entries_added"], 0)
+
+            hits = archive.search("叠加态", session_id="quantum")
+            self.assertEqual(len(hits), 1)
+            self.assertEqual(hits[0]["question"], "什么是量子比特？")
+
+            # 短词走 LIKE 回退路径
+            self.assertTrue(archive.search("比特"))
+            self.assertEqual(len(archive.get_session("quantum")), 2)
+
+    def test_incremental_reindex(self):
+        """测试重新索引只处理变化的文件"""
+        with SessionArchive(self.db_path) as archive:
+            archive.index_directory(self.temp_dir)
+            stats = archive.index_directory(self.temp_dir)
+            self.assertEqual(stats["files_indexed"], 0)
+
+            extra = os.path.join(self.temp_dir, "chat_history_20240101_000000.json")
+            with open(extra, 'w', encoding='utf-8') as f:
+                f.write('[{"role": "user", "content": "新问题"}, {"role": "assistant", "content": "新回答内容"}]')
+            stats = archive.index_directory(self.temp_dir)
+            self.assertEqual(stats["files_indexed"], 1)
+            self.assertEqual(stats["entries_added"], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
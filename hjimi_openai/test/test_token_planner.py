@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import time
+import shutil
+import tempfile
+import unittest
+
+from hjimi_openai.token_planner import TokenPlanner, PlannedSession, approximate_token_count
+
+
+class TestTokenPlanner(unittest.TestCase):
+    def setUp(self):
+        """创建临时目录"""
+        self.temp_dir = tempfile.mkdtemp(prefix="hjimi_planner_")
+
+    def tearDown(self):
+        """删除临时目录"""
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_approximate_token_count(self):
+        """测试中英文 token 估算"""
+        self.assertEqual(approximate_token_count("量子计算"), 4)
+        self.assertEqual(approximate_token_count("abcdefgh"), 2)
+        self.assertEqual(approximate_token_count(""), 0)
+
+    def test_history_growth_and_truncation(self):
+        """测试历史增长与 EnhancedMemory 截断规则"""
+        planner = TokenPlanner(max_history_length=4, completion_tokens=10,
+                               counter=lambda text: 1)
+        report = planner.plan([PlannedSession("s", ["q"] * 4)])
+        # 每条消息 = 内容 + 4 开销：问题 5，回答 14；历史在第 3 次保存前截断为 2 条
+        self.assertEqual(report.requests, 4)
+        self.assertEqual(report.prompt_tokens, 5 + (5 + 19) + (5 + 38) + (5 + 38))
+        self.assertEqual(report.completion_tokens, 40)
+
+    def test_independent_and_tree_sessions(self):
+        """测试独立会话无历史、问题树分支共享前缀"""
+        planner = TokenPlanner(completion_tokens=10, counter=lambda text: 1, base_latency=1,
+                               output_tokens_per_second=1e9, concurrency=2)
+        independent = planner.plan([PlannedSession("s", ["q"] * 4, independent=True)])
+        self.assertEqual(independent.prompt_tokens, 4 * 5)
+        self.assertAlmostEqual(independent.critical_path_seconds, 2)
+
+        tree = planner.plan([PlannedSession("t", ["p"], branches={"a": ["x"], "b": ["y", "z"]})])
+        self.assertEqual(tree.requests, 4)
+        self.assertEqual(tree.prompt_tokens, 5 + (5 + 19) * 2 + (5 + 38))
+        self.assertAlmostEqual(tree.critical_path_seconds, 3)
+
+    def test_sessions_run_sequentially(self):
+        """测试会话依次处理：多个顺序会话的耗时相加，并发只缩短会话内的独立问题与分支"""
+        planner = TokenPlanner(counter=lambda text: 1, base_latency=1,
+                               output_tokens_per_second=1e9, concurrency=4)
+        chained = planner.plan([PlannedSession(f"s{i}", ["q"] * 10) for i in range(4)])
+        self.assertAlmostEqual(chained.estimated_seconds, 40, places=3)
+        self.assertEqual(chained.limiting_factor, "critical_path")
+
+        mixed = planner.plan([
+            PlannedSession("chain", ["q"] * 10),
+            PlannedSession("independent", ["q"] * 10, independent=True),
+            PlannedSession("tree", ["p"] * 2, branches={"a": ["x"] * 3, "b": ["y"], "c": ["z"] * 2}),
+        ])
+        # 10 + ceil(10 / 4) + (2 + 最长分支 3)
+        self.assertAlmostEqual(mixed.estimated_seconds, 10 + 3 + 5, places=3)
+
+    def test_large_text_file_is_fast(self):
+        """测试百万行问题文件可在数秒内规划完成"""
+        path = os.path.join(self.temp_dir, "questions.txt")
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write("请解释一下量子计算的基本原理？\n" * 1_000_000)
+        started = time.perf_counter()
+        report = TokenPlanner(concurrency=8, requests_per_minute=600).plan_file(path)
+        self.assertLess(time.perf_counter() - started, 10)
+        self.assertEqual(report.requests, 1_000_000)
+        # TXT 文件是单个顺序会话，瓶颈在依赖链而不是并发或限流
+        self.assertEqual(report.limiting_factor, "critical_path")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+from hjimi_openai import AIConversationManager, ConversationConfig
+from hjimi_openai.output_shards import ShardManifest
+from hjimi_openai.write_ahead_log import WriteAheadLog
+
+
+class TestWriteAheadLog(unittest.TestCase):
+    def setUp(self):
+        """创建临时目录"""
+        self.temp_dir = tempfile.mkdtemp(prefix="hjimi_wal_")
+        self.wal_path = os.path.join(self.temp_dir, "conversation.wal")
+        os.environ.setdefault("DASHSCOPE_API_KEY", "test-key")
+
+    def tearDown(self):
+        """删除临时目录"""
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_torn_tail_is_truncated(self):
+        """测试残缺的尾部记录在重新打开时被丢弃"""
+        wal = WriteAheadLog(self.wal_path, sync_every=4, sync_interval=0)
+        for i in range(3):
+            wal.append({"type": "turn", "index": i})
+        wal.close()
+        size = os.path.getsize(self.wal_path)
+        with open(self.wal_path, 'ab') as f:
+            f.write(b"\x20\x00\x00\x00garbage")
+
+        wal = WriteAheadLog(self.wal_path)
+        self.assertEqual([r["index"] for r in wal.recovered], [0, 1, 2])
+        self.assertEqual(os.path.getsize(self.wal_path), size)
+        wal.checkpoint()
+        wal.close()
+        self.assertEqual(WriteAheadLog.read_records(self.wal_path), [])
+
+    def test_manager_recovers_after_crash(self):
+        """测试异常退出后从日志重建记忆、输出文件与会话 Markdown"""
+        config = ConversationConfig(output_dir=self.temp_dir, log_to_console=False, wal_enabled=True)
+        manager = AIConversationManager(config)
+        manager.llm = FakeListChatModel(responses=["回答1", "回答2", "回答3"])
+        manager.process_questions({"a": ["问题1"], "b": ["问题2", "问题3"]})
+        expected_memory = [m.content for m in manager.memory.chat_history.messages]
+        # 模拟崩溃：不执行 checkpoint，输出文件与会话文件丢失
+        manager.wal.close()
+        manager.log_pipeline.stop()
+        output_path = Path(self.temp_dir, "conversation.markdown")
+        output_path.write_text("", encoding='utf-8')
+        for path in Path(self.temp_dir).glob("session_*.md"):
+            path.unlink()
+
+        recovered = AIConversationManager(config)
+        self.assertEqual([m.content for m in recovered.memory.chat_history.messages], expected_memory)
+        self.assertEqual(recovered.conversation_count, 3)
+        self.assertEqual([qa["number"] for qa in recovered.sessions["b"].content], [1, 2])
+        recovered.close()
+
+        output = output_path.read_text(encoding='utf-8')
+        self.assertEqual([output.count(f"回答{i}") for i in (1, 2, 3)], [1, 1, 1])
+        self.assertEqual(len(list(Path(self.temp_dir).glob("session_*.md"))), 2)
+        self.assertEqual(WriteAheadLog.read_records(self.wal_path), [])
+
+    def test_sharded_recovery_skips_written_turns(self):
+        """测试分片输出：会话结束后压缩日志，恢复时只补写尚未写入分片的轮次"""
+        config = ConversationConfig(output_dir=self.temp_dir, log_to_console=False, wal_enabled=True,
+                                    output_sharding=True)
+        manager = AIConversationManager(config)
+        manager.llm = FakeListChatModel(responses=["R1", "R2", "R3"])
+        manager.process_questions({"a": ["问题1", "问题2"]})
+        self.assertEqual(WriteAheadLog.read_records(self.wal_path),
+                         [{"type": "checkpoint", "conversation_count": 2}])
+        manager.process_conversation("问题3", {"session_id": "b"})
+        # 模拟崩溃：分片已写出但未关闭，日志未 checkpoint
+        manager.wal.close()
+        manager.output_handler.writer._file.close()
+        manager.output_handler.writer._manifest.close()
+        manager.log_pipeline.stop()
+
+        recovered = AIConversationManager(config)
+        self.assertEqual(recovered.conversation_count, 3)
+        self.assertEqual([m.content for m in recovered.memory.chat_history.messages], ["问题3", "R3"])
+        recovered.close()
+
+        manifest = ShardManifest(os.path.join(self.temp_dir, "shards"))
+        self.assertEqual(len(manifest.locate("a")), 1)
+        self.assertEqual(manifest.read_session("a").count("R1"), 1)
+        self.assertEqual(manifest.read_session("b").count("R3"), 1)
+        self.assertEqual(WriteAheadLog.read_records(self.wal_path), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
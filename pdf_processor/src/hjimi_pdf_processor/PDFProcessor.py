@@ -2,10 +2,45 @@ import os
 import re
 from PyPDF2 import PdfReader, PdfWriter
 
+from .optimizer import format_size_change, optimize_pdf
+from .outline_splitter import OutlineIndex
+from .metadata_index import MetadataIndex
+from .page_count import read_page_count
+from .page_extractor import extract_pages
+from .parallel_split import write_parts
+from .size_splitter import SizeSplitter
+from .streaming_writer import StreamingPdfWriter
+from .text_extractor import TextChunker, iter_page_text, write_jsonl
+
 class PDFProcessor:
     """
     PDF 文件处理工具类，提供 PDF 的分割、合并、读取等功能
     """
+
+    metadata_index = None  # 启用后页数、书签与页面大小估算从索引读取（见 use_metadata_index）
+
+    @staticmethod
+    def use_metadata_index(db_path):
+        """
+        启用 SQLite 元数据索引：同一文件未变化时，获取页数与拆分不再重新解析文件结构
+        :param db_path: 数据库文件路径，None 表示停用索引
+        :return: MetadataIndex 对象，可用于 refresh 批量增量刷新
+        """
+        if PDFProcessor.metadata_index is not None:
+            PDFProcessor.metadata_index.close()
+        PDFProcessor.metadata_index = MetadataIndex(db_path) if db_path is not None else None
+        return PDFProcessor.metadata_index
+
+    @staticmethod
+    def _metadata(input_file):
+        """启用索引时返回文件的元数据，否则或出错时返回 None"""
+        if PDFProcessor.metadata_index is None:
+            return None
+        try:
+            return PDFProcessor.metadata_index.get(input_file)
+        except Exception as e:
+            print(f"读取元数据索引时出错: {e}")
+            return None
     
     @staticmethod
     def sanitize_filename(filename):
@@ -21,12 +56,21 @@ class PDFProcessor:
     def get_pdf_page_count(file_path):
         """
         获取 PDF 文件的总页数
+        优先只读取 trailer 和交叉引用表取得 /Pages 的 /Count，无法处理时回退到完整解析；
+        启用元数据索引时优先使用索引中仍然有效的页数，未索引或已变化的文件不为获取页数而完整解析
+        （索引由拆分操作或 MetadataIndex.refresh 写入）
         :param file_path: PDF 文件路径
         :return: 总页数
         """
+        if PDFProcessor.metadata_index is not None:
+            try:
+                page_count = PDFProcessor.metadata_index.cached_page_count(file_path)
+                if page_count is not None:
+                    return page_count
+            except Exception as e:
+                print(f"读取元数据索引时出错: {e}")
         try:
-            reader = PdfReader(file_path)
-            return len(reader.pages)
+            return read_page_count(file_path)
         except Exception as e:
             print(f"读取 PDF 文件时出错: {e}")
             return None
@@ -35,129 +79,229 @@ class PDFProcessor:
     def split_pdf_by_size(input_file, max_size_kb):
         """
         按文件大小拆分 PDF
+        逐页估算大小（共享资源只计一次），只在分片边界核对实际大小，不产生临时文件，耗时与文档大小成线性关系；
+        启用元数据索引时逐页估算直接使用索引中的数据
         :param input_file: 输入 PDF 文件路径
-        :param max_size_kb: 每个拆分文件的最大大小（KB）
+        :param max_size_kb: 每个拆分文件的最大大小（KB），单页超过上限时单独成为一个文件
+        :return: 生成的文件路径列表
         """
-        reader = PdfReader(input_file)
-        writer = PdfWriter()
-        part_number = 0
-        current_size = 0
-
-        for page_num, page in enumerate(reader.pages):
-            writer.add_page(page)
-            
-            temp_file = f"temp_part_{part_number}.pdf"
-            with open(temp_file, "wb") as temp_pdf:
-                writer.write(temp_pdf)
-            
-            current_size = os.path.getsize(temp_file) / 1024
-            if current_size > max_size_kb:
-                output_file = f"{input_file.replace('.pdf', '')}_part_{part_number}.pdf"
-                with open(output_file, "wb") as output_pdf:
-                    writer.write(output_pdf)
-                print(f"生成文件: {output_file}，大小: {current_size:.2f} KB")
-
-                writer = PdfWriter()
-                part_number += 1
-
-        if writer.pages:
-            output_file = f"{input_file.replace('.pdf', '')}_part_{part_number}.pdf"
-            with open(output_file, "wb") as output_pdf:
-                writer.write(output_pdf)
-            print(f"生成文件: {output_file}")
-
-        if os.path.exists(temp_file):
-            os.remove(temp_file)
+        estimator = None
+        if PDFProcessor._metadata(input_file) is not None:
+            estimator = PDFProcessor.metadata_index.size_estimator(input_file)
+        outputs = SizeSplitter(input_file, max_size_kb, estimator).split()
         print("PDF 按大小拆分完成！")
+        return outputs
 
     @staticmethod
-    def split_pdf_by_pages(input_file, pages_per_split):
+    def split_pdf_by_pages(input_file, pages_per_split, workers=1, optimize=False):
         """
         按指定页数拆分 PDF 文件
         :param input_file: 输入 PDF 文件路径
         :param pages_per_split: 每个文件包含的页数
+        :param workers: 并行写出分片的进程数，1 为串行，None 为使用全部 CPU 核心；输出与串行逐字节一致
+        :param optimize: 优化每个分片（共享资源去重、压缩流、移除未使用的对象）并输出优化前后的大小
+        :return: 生成的文件路径列表
         """
-        reader = PdfReader(input_file)
-        total_pages = len(reader.pages)
+        metadata = PDFProcessor._metadata(input_file)
+        if metadata is not None:
+            reader = None  # 由 write_parts 按需打开
+            total_pages = metadata.page_count
+        else:
+            reader = PdfReader(input_file)
+            total_pages = len(reader.pages)
         print(f"总页数: {total_pages}")
         
         base_name = input_file.replace('.pdf', '')
+        jobs = [(f"{base_name}_part_{start_page // pages_per_split + 1}.pdf",
+                 start_page, min(start_page + pages_per_split, total_pages))
+                for start_page in range(0, total_pages, pages_per_split)]
         
-        for start_page in range(0, total_pages, pages_per_split):
-            writer = PdfWriter()
-            end_page = min(start_page + pages_per_split, total_pages)
-            
-            for page_num in range(start_page, end_page):
-                writer.add_page(reader.pages[page_num])
-            
-            output_file = f"{base_name}_part_{start_page // pages_per_split + 1}.pdf"
-            with open(output_file, "wb") as output_pdf:
-                writer.write(output_pdf)
-            print(f"生成文件: {output_file}，包含页数: {start_page + 1} - {end_page}")
+        outputs = PDFProcessor._write_split_parts(input_file, jobs, workers, reader, optimize)
         
         print("PDF 拆分完成！")
+        return outputs
 
     @staticmethod
-    def split_pdf_by_bookmarks(input_file):
+    def split_pdf_by_bookmarks(input_file, workers=1, optimize=False, depth=1):
         """
-        按书签拆分 PDF 文件（仅处理主书签）
+        按书签拆分 PDF 文件
+        书签目标一次性解析为页码表；层级不超过 depth 的书签都是分界点，父章节在子章节之前的页面单独成为一个文件
+        启用元数据索引时书签与页码从索引读取
         :param input_file: 输入 PDF 文件路径
+        :param workers: 并行写出分片的进程数，1 为串行，None 为使用全部 CPU 核心；输出与串行逐字节一致
+        :param optimize: 优化每个分片（共享资源去重、压缩流、移除未使用的对象）并输出优化前后的大小
+        :param depth: 拆分到第几级书签，1 为仅按主书签拆分
+        :return: 生成的文件路径列表，文件名包含完整的书签路径
         """
-        reader = PdfReader(input_file)
-        bookmarks = reader.outline
+        metadata = PDFProcessor._metadata(input_file)
+        if metadata is not None:
+            reader = None
+            outline = metadata.outline_index()
+        else:
+            reader = PdfReader(input_file)
+            outline = OutlineIndex(reader)
         
-        if not bookmarks:
+        if not outline.entries:
             print("此 PDF 文件没有书签，无法按书签拆分。")
-            return
+            return []
         
-        main_bookmarks = [bookmark for bookmark in bookmarks if not isinstance(bookmark, list)]
-        print(f"发现一级书签数量: {len(main_bookmarks)}")
+        print(f"发现书签数量: {len(outline.entries)}，最大层级: {outline.max_depth}，按第 {depth} 级拆分")
+        jobs = outline.jobs(input_file, depth, PDFProcessor.sanitize_filename)
         
-        for i, bookmark in enumerate(main_bookmarks):
-            start_page = reader.get_destination_page_number(bookmark)
-            end_page = (reader.get_destination_page_number(main_bookmarks[i + 1]) 
-                       if i + 1 < len(main_bookmarks) else len(reader.pages))
-            
-            writer = PdfWriter()
-            for page_num in range(start_page, end_page):
-                writer.add_page(reader.pages[page_num])
-            
-            safe_title = PDFProcessor.sanitize_filename(bookmark.title)
-            output_file = f"{input_file.replace('.pdf', '')}_part_{i+1}_{safe_title}.pdf"
-            
-            with open(output_file, "wb") as output_pdf:
-                writer.write(output_pdf)
-            
-            print(f"生成文件: {output_file}，包含页数: {start_page + 1} - {end_page}")
+        outputs = PDFProcessor._write_split_parts(input_file, jobs, workers, reader, optimize)
         
         print("PDF 按书签拆分完成！")
+        return outputs
 
     @staticmethod
-    def merge_pdfs(pdf_files, output_path):
+    def _write_split_parts(input_file, jobs, workers, reader, optimize):
+        """写出拆分任务中的全部分片并输出进度"""
+        outputs = []
+        original_total = optimized_total = 0
+        for output_file, start_page, end_page, original_size, size in write_parts(
+                input_file, jobs, workers, reader, optimize):
+            outputs.append(output_file)
+            message = f"生成文件: {output_file}，包含页数: {start_page + 1} - {end_page}"
+            if optimize:
+                message += f"，大小: {format_size_change(original_size, size)}"
+                original_total += original_size
+                optimized_total += size
+            print(message)
+        if optimize and outputs:
+            print(f"优化合计: {format_size_change(original_total, optimized_total)}")
+        return outputs
+
+    @staticmethod
+    def extract_pages(input_file, ranges, output_file=None, optimize=False):
+        """
+        提取指定页码范围的页面到新文件，只加载请求的页面及其依赖的对象，耗时与提取的页数成正比
+        :param input_file: 输入 PDF 文件路径
+        :param ranges: 页码范围（从 1 开始，包含两端），如 "10-20,400-410"，或 [(10, 20), (400, 410)]
+        :param output_file: 输出文件路径，默认为 "<输入文件名>_pages.pdf"
+        :param optimize: 是否压缩输出文件中的流
+        :return: 输出文件路径，出错时返回 None
+        """
+        if output_file is None:
+            output_file = f"{input_file.replace('.pdf', '')}_pages.pdf"
+        try:
+            page_count = extract_pages(input_file, ranges, output_file, optimize)
+        except Exception as e:
+            print(f"提取页面时出错: {e}")
+            return None
+        print(f"生成文件: {output_file}，包含页数: {page_count}")
+        return output_file
+
+    @staticmethod
+    def extract_text(input_file, output_file=None, workers=None, chunk_size=None, chunk_overlap=0):
+        """
+        提取 PDF 文本并逐行写入 JSON Lines 文件
+        页面分批交给多个进程提取，按页码顺序边提取边写出，内存占用与文档页数无关
+        :param input_file: 输入 PDF 文件路径
+        :param output_file: 输出文件路径，默认为 "<输入文件名>.jsonl"
+        :param workers: 提取文本的进程数，1 为在当前进程中提取，None 为使用全部 CPU 核心
+        :param chunk_size: 按字符数把文本切分为块（每行为 {"text", "start_page", "end_page"}），
+                           None 表示每页一行（{"page", "text"}）
+        :param chunk_overlap: 相邻文本块之间重叠的字符数
+        :return: 输出文件路径，出错时返回 None
+        """
+        if output_file is None:
+            output_file = f"{input_file.replace('.pdf', '')}.jsonl"
+        try:
+            records = iter_page_text(input_file, workers)
+            if chunk_size:
+                records = TextChunker(chunk_size, chunk_overlap).chunks(records)
+            count = write_jsonl(records, output_file)
+        except Exception as e:
+            print(f"提取文本时出错: {e}")
+            return None
+        print(f"生成文件: {output_file}，包含{'文本块' if chunk_size else '页'}数: {count}")
+        return output_file
+
+    @staticmethod
+    def optimize_pdf(input_file, output_file=None):
+        """
+        优化 PDF 文件：内容相同的流与对象只保留一份，压缩流，移除未使用的对象
+        :param input_file: 输入 PDF 文件路径
+        :param output_file: 输出文件路径，默认为 "<输入文件名>_optimized.pdf"
+        :return: 优化报告（原始大小、优化后大小、节省比例等），出错时返回 None
+        """
+        try:
+            report = optimize_pdf(input_file, output_file)
+        except Exception as e:
+            print(f"优化 PDF 文件时出错: {e}")
+            return None
+        print(f"生成文件: {report['output']}，大小: "
+              f"{format_size_change(report['original_size'], report['optimized_size'])}，"
+              f"去重对象: {report['objects_deduplicated']} 个")
+        return report
+
+    @staticmethod
+    def merge_pdfs(pdf_files, output_path, streaming=False, deduplicate=True, optimize=False):
         """
         合并多个 PDF 文件为一个 PDF 文件
         :param pdf_files: 待合并的 PDF 文件路径列表
         :param output_path: 合并后 PDF 文件的保存路径
+        :param streaming: 流式合并：对象逐个写入输出文件，每个输入文件写完即释放，峰值内存取决于最大的单个输入文件
+        :param deduplicate: 流式合并时对内容相同的共享资源（字体、图片等）只写一份
+        :param optimize: 在流式合并的基础上压缩流，并输出输入文件总大小与合并结果大小的对比
+        :return: 读取失败、未合并的输入文件及错误信息 {文件: 错误}；合并本身出错时返回 None
         """
+        if streaming or optimize:
+            return PDFProcessor._merge_pdfs_streaming(pdf_files, output_path, deduplicate, optimize)
+
+        failed = {}
         try:
             writer = PdfWriter()
+            # PdfWriter 按 id(reader) 记录已复制的对象，读取器被回收后 id 可能被下一个文件复用，
+            # 导致其对象被错误地映射到上一个文件的对象上，因此写出前保留所有读取器
+            readers = []
 
             for file in pdf_files:
                 try:
                     reader = PdfReader(file)
+                    readers.append(reader)
                     for page in reader.pages:
                         writer.add_page(page)
                     print(f"成功合并: {file}")
                 except Exception as e:
+                    failed[file] = f"{type(e).__name__}: {e}"
                     print(f"读取文件 {file} 时出错: {e}")
             
             with open(output_path, "wb") as output_file:
                 writer.write(output_file)
             
             print(f"合并完成！合并文件已保存为: {output_path}")
+            return failed
+
+        except Exception as e:
+            print(f"合并过程中发生错误: {e}")
+            return None
+
+    @staticmethod
+    def _merge_pdfs_streaming(pdf_files, output_path, deduplicate, optimize):
+        """流式合并（见 merge_pdfs）"""
+        failed = {}
+        try:
+            original_size = 0
+            with StreamingPdfWriter(output_path, deduplicate, compress_streams=optimize) as writer:
+                for file in pdf_files:
+                    try:
+                        writer.add_file(file)
+                        original_size += os.path.getsize(file)
+                        print(f"成功合并: {file}")
+                    except Exception as e:
+                        failed[file] = f"{type(e).__name__}: {e}"
+                        print(f"读取文件 {file} 时出错: {e}")
+
+            print(f"合并完成！合并文件已保存为: {output_path}，共 {writer.page_count} 页，"
+                  f"去重对象: {writer.objects_deduplicated} 个（{writer.bytes_deduplicated / 1024:.2f} KB）")
+            if optimize:
+                print(f"优化: {format_size_change(original_size, writer.size)}")
+            return failed
 
         except Exception as e:
             print(f"合并过程中发生错误: {e}")
+            return None
 
 
 # 使用示例
@@ -0,0 +1,298 @@
+import io
+import os
+import re
+import sys
+import glob
+import json
+import time
+import argparse
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from contextlib import redirect_stdout
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .PDFProcessor import PDFProcessor
+
+OPERATIONS = ("count", "split-pages", "split-size", "split-bookmarks", "merge", "optimize", "extract", "extract-text")
+
+
+def iter_input_files(inputs: Iterable[str], recursive: bool = False) -> Iterator[str]:
+    """
+    逐个生成输入的 PDF 文件（不预先收集完整列表）
+    :param inputs: 文件、目录或 glob 模式
+    :param recursive: 目录是否递归遍历子目录
+    """
+    for item in inputs:
+        if os.path.isdir(item):
+            if recursive:
+                for root, dirs, files in os.walk(item):
+                    dirs.sort()
+                    for name in sorted(files):
+                        if name.lower().endswith(".pdf"):
+                            yield os.path.join(root, name)
+            else:
+                for name in sorted(os.listdir(item)):
+                    path = os.path.join(item, name)
+                    if name.lower().endswith(".pdf") and os.path.isfile(path):
+                        yield path
+        elif glob.has_magic(item):
+            yield from sorted(glob.iglob(item, recursive=recursive))
+        else:
+            yield item
+
+
+def group_files(files: Iterable[str], pattern: Optional[str] = None) -> "OrderedDict[str, List[str]]":
+    """
+    把文件分组用于合并
+    :param pattern: 正则表达式，文件名的第一个捕获组（没有捕获组时为整个匹配）作为组名；未提供或不匹配时按所在目录分组
+    """
+    regex = re.compile(pattern) if pattern else None
+    groups: "OrderedDict[str, List[str]]" = OrderedDict()
+    for path in files:
+        match = regex.search(os.path.basename(path)) if regex else None
+        if match:
+            key = match.group(1) if regex.groups else match.group(0)
+        else:
+            key = os.path.basename(os.path.dirname(os.path.abspath(path)))
+        groups.setdefault(key, []).append(path)
+    return groups
+
+
+def run_task(operation: str, inputs: List[str], options: Dict) -> Dict:
+    """
+    工作进程：对一个文件（合并时为一组文件）执行操作，异常只影响本任务
+    PDFProcessor 的输出被捕获到结果的 messages 中；合并时部分输入文件失败记为 partial，失败的文件记入 failed_inputs
+    """
+    record = {"operation": operation, "file": inputs[0] if operation != "merge" else None,
+              "status": "ok", "outputs": [], "pages": None, "error": None}
+    buffer = io.StringIO()
+    start = time.perf_counter()
+    try:
+        with redirect_stdout(buffer):
+            if operation == "count":
+                record["pages"] = PDFProcessor.get_pdf_page_count(inputs[0])
+                if record["pages"] is None:
+                    raise ValueError("无法读取页数")
+            elif operation == "split-pages":
+                record["outputs"] = PDFProcessor.split_pdf_by_pages(inputs[0], options["pages_per_split"],
+                                                                    optimize=options.get("optimize", False))
+            elif operation == "split-size":
+                record["outputs"] = PDFProcessor.split_pdf_by_size(inputs[0], options["max_size_kb"])
+            elif operation == "split-bookmarks":
+                record["outputs"] = PDFProcessor.split_pdf_by_bookmarks(inputs[0], optimize=options.get("optimize", False),
+                                                                        depth=options.get("depth") or 1)
+            elif operation == "merge":
+                record["group"] = options["group"]
+                record["inputs"] = inputs
+                output_path = os.path.join(options["output_dir"],
+                                           PDFProcessor.sanitize_filename(options["group"]) + ".pdf")
+                failed = PDFProcessor.merge_pdfs(inputs, output_path, streaming=options.get("streaming", False),
+                                                 optimize=options.get("optimize", False))
+                if failed is None or not os.path.exists(output_path):
+                    raise ValueError("合并文件未生成")
+                if failed:
+                    record["failed_inputs"] = failed
+                    if len(failed) == len(inputs):
+                        raise ValueError("所有输入文件都读取失败")
+                    record["status"] = "partial"
+                    record["error"] = f"PartialMerge: {len(failed)}/{len(inputs)} 个输入文件读取失败"
+                record["outputs"] = [output_path]
+            elif operation == "extract":
+                output_file = PDFProcessor.extract_pages(inputs[0], options["ranges"],
+                                                         optimize=options.get("optimize", False))
+                if output_file is None:
+                    raise ValueError("提取页面失败")
+                record["outputs"] = [output_file]
+            elif operation == "extract-text":
+                # 文件之间已经并行，单个文件在任务进程内提取
+                output_file = PDFProcessor.extract_text(inputs[0], workers=1, chunk_size=options.get("chunk_size"),
+                                                        chunk_overlap=options.get("chunk_overlap") or 0)
+                if output_file is None:
+                    raise ValueError("提取文本失败")
+                record["outputs"] = [output_file]
+            elif operation == "optimize":
+                report = PDFProcessor.optimize_pdf(inputs[0])
+                if report is None:
+                    raise ValueError("优化失败")
+                record["outputs"] = [report["output"]]
+                record["original_size"] = report["original_size"]
+                record["optimized_size"] = report["optimized_size"]
+            else:
+                raise ValueError(f"不支持的操作: {operation}")
+    except Exception as e:
+        record["status"] = "error"
+        record["error"] = f"{type(e).__name__}: {e}"
+    record["seconds"] = round(time.perf_counter() - start, 4)
+    record["messages"] = buffer.getvalue().splitlines()
+    return record
+
+
+class BatchProcessor:
+    """
+    批量处理 PDF 文件
+    使用进程池并行处理，同时在途的任务数有上限（输入按需读取，内存占用与文件总数无关），
+    工作进程处理一定数量的任务后重启以释放内存；每个文件的结果逐行写入 JSONL 清单
+    """
+
+    def __init__(self, operation: str, workers: Optional[int] = None, max_tasks_per_child: int = 200,
+                 manifest_path: Optional[str] = None, progress_every: int = 100, **options):
+        """
+        :param operation: 操作，见 OPERATIONS
+        :param workers: 进程数，None 为全部 CPU 核心
+        :param max_tasks_per_child: 工作进程处理多少个任务后重启
+        :param manifest_path: 结果清单（JSONL）路径，None 表示不写清单
+        :param progress_every: 每完成多少个任务打印一次进度，0 表示不打印
+        :param options: 操作参数：pages_per_split、max_size_kb、ranges、depth、chunk_size、chunk_overlap、output_dir、group_pattern、streaming、optimize
+        """
+        if operation not in OPERATIONS:
+            raise ValueError(f"不支持的操作: {operation}")
+        if operation == "split-pages" and not options.get("pages_per_split"):
+            raise ValueError("split-pages 需要 pages_per_split")
+        if operation == "split-size" and not options.get("max_size_kb"):
+            raise ValueError("split-size 需要 max_size_kb")
+        if operation == "extract" and not options.get("ranges"):
+            raise ValueError("extract 需要 ranges")
+        if operation == "merge" and not options.get("output_dir"):
+            raise ValueError("merge 需要 output_dir")
+        self.operation = operation
+        self.workers = max(1, workers or os.cpu_count() or 1)
+        self.max_tasks_per_child = max_tasks_per_child
+        self.manifest_path = manifest_path
+        self.progress_every = progress_every
+        self.options = options
+
+    def _tasks(self, files: Iterable[str]) -> Iterator[Tuple[List[str], Dict]]:
+        if self.operation != "merge":
+            for path in files:
+                yield [path], self.options
+            return
+        os.makedirs(self.options["output_dir"], exist_ok=True)
+        for group, paths in group_files(files, self.options.get("group_pattern")).items():
+            yield paths, dict(self.options, group=group)
+
+    def _executor(self) -> ProcessPoolExecutor:
+        if sys.version_info >= (3, 11):
+            return ProcessPoolExecutor(max_workers=self.workers, max_tasks_per_child=self.max_tasks_per_child)
+        return ProcessPoolExecutor(max_workers=self.workers)
+
+    def iter_results(self, files: Iterable[str]) -> Iterator[Dict]:
+        """按完成顺序生成每个任务的结果"""
+        tasks = self._tasks(files)
+        limit = self.workers * 2
+        with self._executor() as executor:
+            pending = {}
+            for inputs, options in tasks:
+                pending[executor.submit(run_task, self.operation, inputs, options)] = inputs
+                if len(pending) >= limit:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        yield self._result(future, pending.pop(future))
+            for future in list(pending):
+                yield self._result(future, pending.pop(future))
+
+    def _result(self, future, inputs: List[str]) -> Dict:
+        """取出任务结果；工作进程异常退出时记录为失败"""
+        try:
+            return future.result()
+        except Exception as e:
+            return {"operation": self.operation, "file": inputs[0] if self.operation != "merge" else None,
+                    "inputs": inputs, "status": "error", "outputs": [], "pages": None,
+                    "error": f"{type(e).__name__}: {e}", "seconds": None, "messages": []}
+
+    def run(self, files: Iterable[str]) -> Dict:
+        """
+        处理全部文件，写出结果清单
+        :return: 汇总：任务数、成功、部分成功与失败数、总页数、耗时与吞吐量、失败原因统计
+        """
+        summary = {"operation": self.operation, "tasks": 0, "ok": 0, "partial": 0, "failed": 0, "pages": 0,
+                   "outputs": 0, "errors": {}}
+        start = time.perf_counter()
+        manifest = open(self.manifest_path, "w", encoding="utf-8") if self.manifest_path else None
+        try:
+            for record in self.iter_results(files):
+                summary["tasks"] += 1
+                if record["status"] in ("ok", "partial"):
+                    summary[record["status"]] += 1
+                    summary["pages"] += record["pages"] or 0
+                    summary["outputs"] += len(record["outputs"])
+                else:
+                    summary["failed"] += 1
+                    reason = record["error"].split(":", 1)[0]
+                    summary["errors"][reason] = summary["errors"].get(reason, 0) + 1
+                if manifest is not None:
+                    manifest.write(json.dumps(record, ensure_ascii=False) + "\n")
+                if self.progress_every and summary["tasks"] % self.progress_every == 0:
+                    elapsed = time.perf_counter() - start
+                    print(f"已处理: {summary['tasks']}，失败: {summary['failed']}，"
+                          f"速度: {summary['tasks'] / elapsed:.1f} 个/秒")
+        finally:
+            if manifest is not None:
+                manifest.close()
+        elapsed = time.perf_counter() - start
+        summary["seconds"] = round(elapsed, 3)
+        summary["tasks_per_second"] = round(summary["tasks"] / elapsed, 2) if elapsed else None
+        return summary
+
+
+def format_summary(summary: Dict) -> str:
+    """格式化汇总信息"""
+    lines = [
+        f"操作: {summary['operation']}",
+        f"任务数: {summary['tasks']}，成功: {summary['ok']}，失败: {summary['failed']}",
+        f"耗时: {summary['seconds']:.2f} 秒，速度: {summary['tasks_per_second'] or 0:.1f} 个/秒",
+    ]
+    if summary["partial"]:
+        lines.append(f"部分成功: {summary['partial']}")
+    if summary["pages"]:
+        lines.append(f"总页数: {summary['pages']}")
+    if summary["outputs"]:
+        lines.append(f"生成文件数: {summary['outputs']}")
+    for reason, count in sorted(summary["errors"].items(), key=lambda item: -item[1]):
+        lines.append(f"错误 {reason}: {count}")
+    return "\n".join(lines)
+
+
+def main(argv: List[str] = None):
+    """命令行入口"""
+    parser = argparse.ArgumentParser(description="批量处理 PDF 文件")
+    parser.add_argument("operation", choices=OPERATIONS, help="操作")
+    parser.add_argument("inputs", nargs="+", help="PDF 文件、目录或 glob 模式")
+    parser.add_argument("-r", "--recursive", action="store_true", help="递归遍历目录（glob 支持 **）")
+    parser.add_argument("-w", "--workers", type=int, default=None, help="进程数，默认为 CPU 核心数")
+    parser.add_argument("--manifest", default="pdf_batch_results.jsonl", help="结果清单（JSONL）路径")
+    parser.add_argument("--pages-per-split", type=int, help="split-pages：每个文件的页数")
+    parser.add_argument("--max-size-kb", type=float, help="split-size：每个文件的最大大小（KB）")
+    parser.add_argument("--ranges", help='extract：页码范围，如 "10-20,400-410"')
+    parser.add_argument("--depth", type=int, default=1, help="split-bookmarks：拆分到第几级书签")
+    parser.add_argument("--chunk-size", type=int, help="extract-text：按字符数切分文本块，默认每页一行")
+    parser.add_argument("--chunk-overlap", type=int, default=0, help="extract-text：相邻文本块重叠的字符数")
+    parser.add_argument("--output-dir", help="merge：合并结果的输出目录")
+    parser.add_argument("--group-pattern", help="merge：从文件名提取组名的正则表达式，默认按目录分组")
+    parser.add_argument("--streaming", action="store_true", help="merge：流式合并并对共享资源去重")
+    parser.add_argument("--optimize", action="store_true", help="split-pages/split-bookmarks/merge/extract：优化输出文件")
+    parser.add_argument("--max-tasks-per-child", type=int, default=200, help="工作进程处理多少个任务后重启")
+    parser.add_argument("--progress-every", type=int, default=100, help="每完成多少个任务打印一次进度")
+    parser.add_argument("--json", action="store_true", help="以 JSON 输出汇总")
+    args = parser.parse_args(argv)
+
+    try:
+        processor = BatchProcessor(
+            args.operation, workers=args.workers, max_tasks_per_child=args.max_tasks_per_child,
+            manifest_path=args.manifest, progress_every=args.progress_every,
+            pages_per_split=args.pages_per_split, max_size_kb=args.max_size_kb, ranges=args.ranges, depth=args.depth,
+            chunk_size=args.chunk_size, chunk_overlap=args.chunk_overlap,
+            output_dir=args.output_dir, group_pattern=args.group_pattern, streaming=args.streaming,
+            optimize=args.optimize
+        )
+    except ValueError as e:
+        parser.error(str(e))
+    summary = processor.run(iter_input_files(args.inputs, args.recursive))
+    if args.json:
+        print(json.dumps(summary, ensure_ascii=False, indent=2))
+    else:
+        print(format_summary(summary))
+    return 1 if summary["failed"] or summary["partial"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
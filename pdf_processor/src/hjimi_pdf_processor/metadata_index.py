@@ -0,0 +1,290 @@
+import os
+import json
+import time
+import hashlib
+import sqlite3
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .outline_splitter import OutlineEntry, OutlineIndex
+from .size_splitter import PageSizeEstimator
+from .sources import open_source
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    path TEXT PRIMARY KEY,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    content_hash TEXT NOT NULL,
+    page_count INTEGER NOT NULL,
+    indexed_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS outline (
+    path TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    title_path TEXT NOT NULL,
+    page INTEGER NOT NULL,
+    PRIMARY KEY (path, position)
+);
+CREATE TABLE IF NOT EXISTS pages (
+    path TEXT NOT NULL,
+    page INTEGER NOT NULL,
+    own_size INTEGER NOT NULL,
+    shared TEXT NOT NULL,
+    PRIMARY KEY (path, page)
+);
+CREATE TABLE IF NOT EXISTS shared_objects (
+    path TEXT NOT NULL,
+    ordinal INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    PRIMARY KEY (path, ordinal)
+);
+"""
+DETAIL_TABLES = ("outline", "pages", "shared_objects")
+
+
+def content_hash(file_path: str, block_size: int = 1 << 20) -> str:
+    """计算文件内容的 blake2b 摘要"""
+    digest = hashlib.blake2b(digest_size=20)
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class DocumentMetadata:
+    """一个文件的缓存元数据：页数、书签（带页码）与逐页大小估算"""
+
+    __slots__ = ("path", "mtime_ns", "size", "content_hash", "page_count", "outline")
+
+    def __init__(self, path: str, mtime_ns: int, size: int, content_hash: str, page_count: int,
+                 outline: List[OutlineEntry]):
+        self.path = path
+        self.mtime_ns = mtime_ns
+        self.size = size
+        self.content_hash = content_hash
+        self.page_count = page_count
+        self.outline = outline
+
+    def outline_index(self) -> OutlineIndex:
+        """返回可直接生成拆分任务的 OutlineIndex（不需要打开文件）"""
+        return OutlineIndex.from_entries(self.outline, self.page_count)
+
+
+class CachedSizeEstimator:
+    """
+    与 PageSizeEstimator 接口相同、数据来自索引的页面大小估算器
+    每页记录只被该页引用的对象的字节数，以及被多个页面共享的对象的序号；
+    页面引用的对象集合是完整的闭包，因此 new_objects 的结果与逐个遍历对象图时相同
+    """
+
+    def __init__(self, own_sizes: List[int], shared: List[Tuple[int, ...]], shared_sizes: Dict[int, int]):
+        self.own_sizes = own_sizes
+        self.shared = shared
+        self.shared_sizes = shared_sizes
+
+    def new_objects(self, page_index: int, known: set) -> Dict[tuple, int]:
+        found = {("page", page_index): self.own_sizes[page_index]}
+        for ordinal in self.shared[page_index]:
+            key = ("shared", ordinal)
+            if key not in known:
+                found[key] = self.shared_sizes[ordinal]
+        return found
+
+
+def scan_document(file_path: str) -> Tuple[int, List[Tuple[Tuple[str, ...], int]], List[int],
+                                           List[Tuple[int, ...]], List[int]]:
+    """
+    完整解析一个文件，返回 (页数, 书签, 每页独占字节数, 每页引用的共享对象序号, 共享对象字节数)
+    书签为 (标题路径, 页码)，按先序排列
+    """
+    with open_source(file_path) as reader:
+        outline = [(entry.path, entry.page) for entry in OutlineIndex(reader).entries]
+        estimator = PageSizeEstimator(reader)
+        closures = [estimator.new_objects(page_index, set()) for page_index in range(len(reader.pages))]
+
+    references = Counter(key for closure in closures for key in closure)
+    ordinals: Dict[tuple, int] = {}
+    own_sizes, shared = [], []
+    for closure in closures:
+        own = 0
+        page_shared = []
+        for key, size in closure.items():
+            if references[key] > 1:
+                page_shared.append(ordinals.setdefault(key, len(ordinals)))
+            else:
+                own += size
+        own_sizes.append(own)
+        shared.append(tuple(page_shared))
+    shared_sizes = [0] * len(ordinals)
+    for key, ordinal in ordinals.items():
+        shared_sizes[ordinal] = estimator._sizes[key]
+    return len(closures), outline, own_sizes, shared, shared_sizes
+
+
+def _scan_job(job: Tuple[str, Optional[str]]):
+    """工作进程：计算摘要（如尚未计算）并解析文件"""
+    file_path, digest = job
+    try:
+        return file_path, digest or content_hash(file_path), scan_document(file_path), None
+    except Exception as e:
+        return file_path, digest, None, f"{type(e).__name__}: {e}"
+
+
+class MetadataIndex:
+    """
+    基于 SQLite 的 PDF 元数据索引
+    以 (路径, 修改时间, 大小, 内容摘要) 识别文件：修改时间与大小未变时直接使用缓存；
+    变化时再计算摘要，内容相同（如仅被复制或 touch）只更新记录，内容不同才重新解析
+    """
+
+    def __init__(self, db_path: str):
+        """
+        :param db_path: SQLite 数据库文件路径，":memory:" 为内存数据库
+        """
+        self.db_path = db_path
+        self.connection = sqlite3.connect(db_path)
+        self.connection.executescript(SCHEMA)
+        self.parsed = 0  # 解析过的文件数
+
+    @staticmethod
+    def _key(file_path: str) -> str:
+        return os.path.abspath(file_path)
+
+    def _row(self, path: str):
+        return self.connection.execute(
+            "SELECT mtime_ns, size, content_hash, page_count FROM documents WHERE path = ?", (path,)).fetchone()
+
+    def _is_current(self, path: str, stat: os.stat_result) -> Tuple[bool, Optional[str]]:
+        """
+        判断缓存是否仍然有效
+        :return: (是否有效, 已计算的内容摘要)；未索引过的文件不在这里计算摘要
+        """
+        row = self._row(path)
+        if row is None:
+            return False, None
+        if row[0] == stat.st_mtime_ns and row[1] == stat.st_size:
+            return True, None
+        digest = content_hash(path)
+        if row[2] == digest:
+            with self.connection:
+                self.connection.execute("UPDATE documents SET mtime_ns = ?, size = ? WHERE path = ?",
+                                        (stat.st_mtime_ns, stat.st_size, path))
+            return True, digest
+        return False, digest
+
+    def _store(self, path: str, digest: str, scan) -> None:
+        page_count, outline, own_sizes, shared, shared_sizes = scan
+        stat = os.stat(path)
+        with self.connection:
+            for table in DETAIL_TABLES:
+                self.connection.execute(f"DELETE FROM {table} WHERE path = ?", (path,))
+            self.connection.execute("INSERT OR REPLACE INTO documents VALUES (?, ?, ?, ?, ?, ?)",
+                                    (path, stat.st_mtime_ns, stat.st_size, digest, page_count, time.time()))
+            self.connection.executemany(
+                "INSERT INTO outline VALUES (?, ?, ?, ?)",
+                ((path, position, json.dumps(title_path, ensure_ascii=False), page)
+                 for position, (title_path, page) in enumerate(outline)))
+            self.connection.executemany(
+                "INSERT INTO pages VALUES (?, ?, ?, ?)",
+                ((path, page, own_sizes[page], " ".join(map(str, shared[page]))) for page in range(page_count)))
+            self.connection.executemany(
+                "INSERT INTO shared_objects VALUES (?, ?, ?)",
+                ((path, ordinal, size) for ordinal, size in enumerate(shared_sizes)))
+        self.parsed += 1
+
+    def get(self, file_path: str) -> DocumentMetadata:
+        """返回文件的元数据，缓存失效时重新解析并写入索引"""
+        path = self._key(file_path)
+        current, digest = self._is_current(path, os.stat(path))
+        if not current:
+            self._store(path, digest or content_hash(path), scan_document(path))
+        mtime_ns, size, digest, page_count = self._row(path)
+        outline = []
+        for title_path, page in self.connection.execute(
+                "SELECT title_path, page FROM outline WHERE path = ? ORDER BY position", (path,)):
+            title_path = tuple(json.loads(title_path))
+            outline.append(OutlineEntry(title_path[-1], title_path, page))
+        return DocumentMetadata(path, mtime_ns, size, digest, page_count, outline)
+
+    def page_count(self, file_path: str) -> int:
+        return self.get(file_path).page_count
+
+    def cached_page_count(self, file_path: str) -> Optional[int]:
+        """
+        返回索引中仍然有效的页数，不计算摘要也不解析文件
+        :return: 未索引或修改时间、大小已变化时返回 None
+        """
+        path = self._key(file_path)
+        row = self._row(path)
+        if row is None:
+            return None
+        stat = os.stat(path)
+        return row[3] if row[0] == stat.st_mtime_ns and row[1] == stat.st_size else None
+
+    def size_estimator(self, file_path: str) -> CachedSizeEstimator:
+        """返回基于索引的页面大小估算器（用于 SizeSplitter）"""
+        path = self.get(file_path).path
+        own_sizes, shared = [], []
+        for own_size, page_shared in self.connection.execute(
+                "SELECT own_size, shared FROM pages WHERE path = ? ORDER BY page", (path,)):
+            own_sizes.append(own_size)
+            shared.append(tuple(map(int, page_shared.split())))
+        shared_sizes = dict(self.connection.execute(
+            "SELECT ordinal, size FROM shared_objects WHERE path = ?", (path,)))
+        return CachedSizeEstimator(own_sizes, shared, shared_sizes)
+
+    def refresh(self, files: Iterable[str], workers: Optional[int] = None) -> Dict[str, object]:
+        """
+        增量刷新：只重新解析新增或内容变化的文件
+        :param files: 文件路径（可用 batch.iter_input_files 展开目录与 glob 模式）
+        :param workers: 解析文件的进程数，1 表示在当前进程中执行，None 为全部 CPU 核心
+        :return: {"unchanged": 数量, "updated": 数量, "failed": {文件: 错误}}
+        """
+        summary = {"unchanged": 0, "updated": 0, "failed": {}}
+        jobs = []
+        for file_path in files:
+            path = self._key(file_path)
+            try:
+                current, digest = self._is_current(path, os.stat(path))
+            except OSError as e:
+                summary["failed"][path] = f"{type(e).__name__}: {e}"
+                continue
+            if current:
+                summary["unchanged"] += 1
+            else:
+                jobs.append((path, digest))
+
+        if workers == 1 or len(jobs) <= 1:
+            self._collect(map(_scan_job, jobs), summary)
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                self._collect(executor.map(_scan_job, jobs, chunksize=4), summary)
+        return summary
+
+    def _collect(self, results, summary: dict) -> None:
+        for path, digest, scan, error in results:
+            if error is None:
+                self._store(path, digest, scan)
+                summary["updated"] += 1
+            else:
+                summary["failed"][path] = error
+
+    def prune(self) -> int:
+        """删除已不存在的文件的记录，返回删除的数量"""
+        missing = [(path,) for (path,) in self.connection.execute("SELECT path FROM documents")
+                   if not os.path.isfile(path)]
+        with self.connection:
+            for table in ("documents",) + DETAIL_TABLES:
+                self.connection.executemany(f"DELETE FROM {table} WHERE path = ?", missing)
+        return len(missing)
+
+    def close(self) -> None:
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,58 @@
+import os
+from typing import Dict, List, Optional
+
+from PyPDF2 import PdfReader
+
+from .sources import open_source
+from .streaming_writer import StreamingPdfWriter
+
+
+def optimize_reader(reader: PdfReader, output_file: str, pages: Optional[List[int]] = None,
+                    deduplicate: bool = True, compress_streams: bool = True,
+                    compression_level: int = 9) -> StreamingPdfWriter:
+    """
+    把文档（或部分页面）优化后写入文件，返回已关闭的写入器（含 size 与去重、压缩统计）
+    - 内容相同的流和对象只写一份（按序列化结果的摘要去重）
+    - 未压缩的流用 FlateDecode 压缩，已有的 Flate 流以更高级别重新压缩
+    - 只复制从页面可达的对象，未使用的对象不会写出
+    """
+    with StreamingPdfWriter(output_file, deduplicate=deduplicate, compress_streams=compress_streams,
+                            compression_level=compression_level) as writer:
+        writer.add_document(reader, pages)
+    return writer
+
+
+def optimize_pdf(input_file: str, output_file: Optional[str] = None, **options) -> Dict:
+    """
+    优化 PDF 文件
+    :param input_file: 输入 PDF 文件路径
+    :param output_file: 输出文件路径，默认 "<输入文件名>_optimized.pdf"
+    :param options: 传给 optimize_reader 的参数
+    :return: 优化报告：原始大小、优化后大小、节省字节数与比例、去重对象数、重新压缩节省的字节数
+    """
+    if output_file is None:
+        output_file = f"{input_file.replace('.pdf', '')}_optimized.pdf"
+    with open_source(input_file) as reader:
+        writer = optimize_reader(reader, output_file, **options)
+    return size_report(input_file, output_file, os.path.getsize(input_file), writer)
+
+
+def size_report(input_file: Optional[str], output_file: str, original_size: int, writer: StreamingPdfWriter) -> Dict:
+    """生成原始大小与优化后大小的对比报告"""
+    saved = original_size - writer.size
+    return {
+        "input": input_file,
+        "output": output_file,
+        "original_size": original_size,
+        "optimized_size": writer.size,
+        "saved": saved,
+        "ratio": round(saved / original_size, 4) if original_size else 0.0,
+        "objects_deduplicated": writer.objects_deduplicated,
+        "bytes_recompressed": writer.bytes_recompressed,
+    }
+
+
+def format_size_change(original_size: int, optimized_size: int) -> str:
+    """格式化大小变化，如 "120.00 KB -> 80.00 KB（节省 33.3%）" """
+    saved = (original_size - optimized_size) / original_size if original_size else 0.0
+    return f"{original_size / 1024:.2f} KB -> {optimized_size / 1024:.2f} KB（节省 {saved:.1%}）"
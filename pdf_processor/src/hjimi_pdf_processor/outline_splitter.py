@@ -0,0 +1,118 @@
+import os
+import hashlib
+from typing import Dict, List, Optional, Tuple
+
+from PyPDF2 import PdfReader
+from PyPDF2.generic import IndirectObject, NullObject
+
+from .parallel_split import PartJob
+
+NAME_MAX = 255  # 常见文件系统对单个文件名的字节数限制
+
+
+class OutlineEntry:
+    """书签：标题、从根开始的完整路径、层级（从 1 开始）与目标页码（从 0 开始）"""
+
+    __slots__ = ("title", "path", "depth", "page")
+
+    def __init__(self, title: str, path: Tuple[str, ...], page: int):
+        self.title = title
+        self.path = path
+        self.depth = len(path)
+        self.page = page
+
+    def __repr__(self):
+        return f"OutlineEntry({'/'.join(self.path)!r}, page={self.page})"
+
+
+class OutlineIndex:
+    """
+    一次性解析书签树
+    先建立 页面对象编号 -> 页码 的表，再按先序遍历把每个书签的目标解析为页码，
+    之后任意层级的拆分都只查表，不再逐个调用 get_destination_page_number
+    """
+
+    def __init__(self, reader: PdfReader):
+        self.reader = reader
+        self.page_count = len(reader.pages)
+        self.page_numbers: Dict[Tuple[int, int], int] = {}
+        for index, page in enumerate(reader.pages):
+            ref = page.indirect_reference
+            if ref is not None:
+                self.page_numbers[(ref.idnum, ref.generation)] = index
+        self.entries: List[OutlineEntry] = []
+        self._walk(reader.outline, ())
+
+    @classmethod
+    def from_entries(cls, entries: List[OutlineEntry], page_count: int) -> "OutlineIndex":
+        """由已解析的书签（如元数据索引中缓存的书签）构造，不需要 PdfReader"""
+        index = cls.__new__(cls)
+        index.reader = None
+        index.page_count = page_count
+        index.page_numbers = {}
+        index.entries = list(entries)
+        return index
+
+    def _walk(self, items, parent_path: Tuple[str, ...]) -> None:
+        """reader.outline 中子书签列表紧跟在父书签之后"""
+        path = parent_path
+        for item in items:
+            if isinstance(item, list):
+                self._walk(item, path)
+                continue
+            path = parent_path + (str(item.title),)
+            page = self._page_number(item.page)
+            if page is not None:
+                self.entries.append(OutlineEntry(str(item.title), path, page))
+
+    def _page_number(self, destination) -> Optional[int]:
+        if isinstance(destination, IndirectObject):
+            return self.page_numbers.get((destination.idnum, destination.generation))
+        if destination is None or isinstance(destination, NullObject):
+            return None
+        try:
+            page = int(destination)  # 远程跳转等使用页码作为目标
+        except (TypeError, ValueError):
+            return None  # 无法识别的目标（如命名目标、损坏的对象），跳过该书签
+        return page if 0 <= page < self.page_count else None
+
+    @property
+    def max_depth(self) -> int:
+        return max((entry.depth for entry in self.entries), default=0)
+
+    def sections(self, depth: int = 1) -> List[Tuple[OutlineEntry, int, int]]:
+        """
+        返回按指定层级划分的章节 (书签, 起始页, 结束页)，结束页不含
+        层级不超过 depth 的书签都是分界点：父章节在第一个子章节之前的页面（如章节导言）单独成为一节，
+        与子章节从同一页开始的父章节不产生空的分片；第一个书签之前的页面不包含在内
+        """
+        bounds = sorted((entry for entry in self.entries if entry.depth <= depth), key=lambda entry: entry.page)
+        sections = []
+        for i, entry in enumerate(bounds):
+            end = bounds[i + 1].page if i + 1 < len(bounds) else self.page_count
+            if end > entry.page:
+                sections.append((entry, entry.page, end))
+        return sections
+
+    def jobs(self, input_file: str, depth: int, sanitize) -> List[PartJob]:
+        """生成拆分任务，文件名为 "<输入文件名>_part_<序号>_<完整书签路径>.pdf" """
+        base_name = input_file.replace('.pdf', '')
+        return [(part_file_name(base_name, number, entry.path, sanitize), start, end)
+                for number, (entry, start, end) in enumerate(self.sections(depth), start=1)]
+
+
+def part_file_name(base_name: str, number: int, path: Tuple[str, ...], sanitize) -> str:
+    """
+    返回分片文件路径 "<base_name>_part_<序号>_<完整书签路径>.pdf"
+    文件名超过 NAME_MAX 字节时（层级深或 CJK 标题，每个汉字占 3 字节），
+    只保留最后一级标题并附加完整路径的短摘要，仍然过长时截断标题
+    """
+    directory, prefix = os.path.split(f"{base_name}_part_{number}_")
+    title = sanitize('/'.join(path))
+    if len(f"{prefix}{title}.pdf".encode('utf-8')) > NAME_MAX:
+        digest = hashlib.blake2b('/'.join(path).encode('utf-8'), digest_size=4).hexdigest()
+        suffix = f"_{digest}.pdf"
+        budget = NAME_MAX - len(prefix.encode('utf-8')) - len(suffix)
+        title = sanitize(path[-1]).encode('utf-8')[:max(budget, 0)].decode('utf-8', errors='ignore')
+        return os.path.join(directory, f"{prefix}{title}{suffix}")
+    return os.path.join(directory, f"{prefix}{title}.pdf")
@@ -0,0 +1,350 @@
+import os
+import re
+import mmap
+import zlib
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from PyPDF2 import PdfReader
+
+TAIL_BYTES = 4096  # 在文件末尾多少字节内查找 startxref
+MAX_XREF_SECTIONS = 64  # /Prev 链的最大长度（防止循环引用）
+
+_STARTXREF = re.compile(rb"startxref\s+(\d+)")
+_OBJ_HEADER = re.compile(rb"\s*(\d+)\s+(\d+)\s+obj\b")
+_SUBSECTION = re.compile(rb"\s*(\d+)\s+(\d+)\s*?(?:\r\n|\r|\n)")
+_ROOT = re.compile(rb"/Root\s+(\d+)\s+\d+\s+R")
+_PAGES = re.compile(rb"/Pages\s+(\d+)\s+\d+\s+R")
+_COUNT = re.compile(rb"/Count\s+(\d+)\b(?!\s+\d+\s+R)")
+_PREV = re.compile(rb"/Prev\s+(\d+)")
+_XREF_STM = re.compile(rb"/XRefStm\s+(\d+)")
+_LENGTH = re.compile(rb"/Length\s+(\d+)\b(?!\s+\d+\s+R)")
+_W = re.compile(rb"/W\s*\[\s*(\d+)\s+(\d+)\s+(\d+)\s*\]")
+_INDEX = re.compile(rb"/Index\s*\[([\d\s]*)\]")
+_SIZE = re.compile(rb"/Size\s+(\d+)")
+_PREDICTOR = re.compile(rb"/Predictor\s+(\d+)")
+_COLUMNS = re.compile(rb"/Columns\s+(\d+)")
+_FIRST = re.compile(rb"/First\s+(\d+)")
+_FILTER = re.compile(rb"/Filter\s*\[?\s*/(\w+)")
+
+
+class FastPathError(Exception):
+    """快速路径无法处理该文件（需要回退到完整解析）"""
+
+
+def _decode_stream(data, dict_start: int, dict_end: int) -> bytes:
+    """解码流对象（只支持无过滤器或 FlateDecode，以及 PNG 预测器）"""
+    header = bytes(data[dict_start:dict_end])
+    length = _LENGTH.search(header)
+    if length is None:
+        raise FastPathError("stream length is an indirect object")
+    start = dict_end + len(b"stream")
+    if data[start:start + 2] == b"\r\n":
+        start += 2
+    elif data[start:start + 1] in (b"\n", b"\r"):
+        start += 1
+    raw = bytes(data[start:start + int(length.group(1))])
+
+    filters = _FILTER.findall(header)
+    if filters and filters != [b"FlateDecode"]:
+        raise FastPathError(f"unsupported filter: {filters}")
+    decoded = zlib.decompress(raw) if filters else raw
+
+    predictor = _PREDICTOR.search(header)
+    if predictor is None or int(predictor.group(1)) < 10:
+        if predictor is not None and int(predictor.group(1)) > 1:
+            raise FastPathError("TIFF predictor is not supported")
+        return decoded
+    columns = _COLUMNS.search(header)
+    columns = int(columns.group(1)) if columns else 1
+    rows = []
+    previous = bytes(columns)
+    for offset in range(0, len(decoded), columns + 1):
+        kind = decoded[offset]
+        row = bytearray(decoded[offset + 1:offset + 1 + columns])
+        if kind == 2:
+            row = bytearray((a + b) & 0xFF for a, b in zip(row, previous))
+        elif kind == 1:
+            for i in range(1, len(row)):
+                row[i] = (row[i] + row[i - 1]) & 0xFF
+        elif kind != 0:
+            raise FastPathError(f"unsupported PNG predictor: {kind}")
+        previous = bytes(row)
+        rows.append(previous)
+    return b"".join(rows)
+
+
+class _TableSection:
+    """传统交叉引用表中的一个子段，条目在查找时才解析"""
+
+    __slots__ = ("first", "count", "offset", "entry_size")
+
+    def __init__(self, first: int, count: int, offset: int, entry_size: int):
+        self.first = first
+        self.count = count
+        self.offset = offset
+        self.entry_size = entry_size
+
+    def lookup(self, data, number: int) -> Optional[Tuple[int, int]]:
+        if not self.first <= number < self.first + self.count:
+            return None
+        position = self.offset + (number - self.first) * self.entry_size
+        entry = bytes(data[position:position + 18])
+        if entry[17:18] != b"n":
+            return 0, 0  # 空闲对象
+        return 1, int(entry[:10])
+
+
+class _StreamSection:
+    """交叉引用流（PDF 1.5+）中的一个子段"""
+
+    __slots__ = ("first", "count", "rows", "base", "widths")
+
+    def __init__(self, first: int, count: int, rows: bytes, base: int, widths: Tuple[int, int, int]):
+        self.first = first
+        self.count = count
+        self.rows = rows
+        self.base = base
+        self.widths = widths
+
+    def lookup(self, data, number: int) -> Optional[Tuple[int, int]]:
+        if not self.first <= number < self.first + self.count:
+            return None
+        w1, w2, w3 = self.widths
+        position = (self.base + number - self.first) * (w1 + w2 + w3)
+        row = self.rows[position:position + w1 + w2 + w3]
+        kind = int.from_bytes(row[:w1], "big") if w1 else 1
+        field = int.from_bytes(row[w1:w1 + w2], "big")
+        if kind == 2:
+            return 2, (field, int.from_bytes(row[w1 + w2:], "big"))
+        return kind, field
+
+
+class FastPageCounter:
+    """
+    只读取文件末尾的 trailer 和交叉引用表，沿 /Root -> /Pages -> /Count 取得页数
+    不构建完整的对象图也不遍历页面树；支持增量更新（/Prev 链）、交叉引用流与对象流
+    """
+
+    def __init__(self, data):
+        """
+        :param data: 文件内容（bytes 或 mmap）
+        """
+        self.data = data
+        self.sections: List = []  # 从新到旧
+        self.root = None
+        self._object_streams: Dict[int, Tuple[bytes, List[int], int]] = {}
+
+    def _read_xref_chain(self) -> None:
+        tail_start = max(0, len(self.data) - TAIL_BYTES)
+        matches = list(_STARTXREF.finditer(bytes(self.data[tail_start:])))
+        if not matches:
+            raise FastPathError("startxref not found")
+        offset = int(matches[-1].group(1))
+        seen = set()
+        while offset is not None:
+            if offset in seen or len(seen) >= MAX_XREF_SECTIONS:
+                raise FastPathError("xref chain is too long or cyclic")
+            seen.add(offset)
+            offset = self._read_xref(offset)
+
+    def _read_xref(self, offset: int) -> Optional[int]:
+        """读取一个交叉引用段，返回上一段的偏移"""
+        data = self.data
+        start = offset
+        while data[start:start + 1] in (b" ", b"\r", b"\n", b"\t"):
+            start += 1
+        if data[start:start + 4] == b"xref":
+            return self._read_table(start + 4)
+        return self._read_stream(offset)
+
+    def _read_table(self, position: int) -> Optional[int]:
+        data = self.data
+        while True:
+            window = bytes(data[position:position + 64])
+            match = _SUBSECTION.match(window)
+            if match is None:
+                break
+            first, count = int(match.group(1)), int(match.group(2))
+            entries = position + match.end()
+            # 条目标准长度为 20 字节，部分生成器使用单字节换行（19 字节）
+            entry_size = 20 if count == 0 or data[entries + 18:entries + 19] in (b" ", b"\r", b"\n") and \
+                data[entries + 19:entries + 20] in (b"\r", b"\n") else 19
+            self.sections.append(_TableSection(first, count, entries, entry_size))
+            position = entries + count * entry_size
+        trailer_start = bytes(data[position:position + 16]).find(b"trailer")
+        if trailer_start < 0:
+            raise FastPathError("trailer not found")
+        trailer_start += position
+        trailer_end = bytes(data[trailer_start:trailer_start + 4096]).find(b"startxref")
+        trailer = bytes(data[trailer_start:trailer_start + (trailer_end if trailer_end >= 0 else 4096)])
+        self._read_trailer(trailer)
+        hybrid = _XREF_STM.search(trailer)
+        if hybrid is not None:
+            self._read_stream(int(hybrid.group(1)))
+        prev = _PREV.search(trailer)
+        return int(prev.group(1)) if prev else None
+
+    def _read_stream(self, offset: int) -> Optional[int]:
+        data = self.data
+        header = _OBJ_HEADER.match(bytes(data[offset:offset + 32]))
+        if header is None:
+            raise FastPathError("startxref does not point to an xref section")
+        dict_start = offset + header.end()
+        dict_end = bytes(data[dict_start:dict_start + 4096]).find(b"stream")
+        if dict_end < 0:
+            raise FastPathError("xref stream not found")
+        dict_end += dict_start
+        trailer = bytes(data[dict_start:dict_end])
+        if b"/XRef" not in trailer:
+            raise FastPathError("startxref does not point to an xref stream")
+        widths = _W.search(trailer)
+        if widths is None:
+            raise FastPathError("xref stream without /W")
+        widths = tuple(int(w) for w in widths.groups())
+        rows = _decode_stream(data, dict_start, dict_end)
+        index = _INDEX.search(trailer)
+        numbers = [int(n) for n in index.group(1).split()] if index else [0, int(_SIZE.search(trailer).group(1))]
+        base = 0
+        for first, count in zip(numbers[::2], numbers[1::2]):
+            self.sections.append(_StreamSection(first, count, rows, base, widths))
+            base += count
+        self._read_trailer(trailer)
+        prev = _PREV.search(trailer)
+        return int(prev.group(1)) if prev else None
+
+    def _read_trailer(self, trailer: bytes) -> None:
+        if b"/Encrypt" in trailer:
+            raise FastPathError("encrypted document")
+        if self.root is None:
+            root = _ROOT.search(trailer)
+            if root is not None:
+                self.root = int(root.group(1))
+
+    def _lookup(self, number: int) -> Tuple[int, object]:
+        for section in self.sections:
+            entry = section.lookup(self.data, number)
+            if entry is not None:
+                return entry
+        raise FastPathError(f"object {number} not found in xref")
+
+    def _object_body(self, number: int) -> bytes:
+        """返回对象的字典部分"""
+        kind, location = self._lookup(number)
+        if kind == 1:
+            header = _OBJ_HEADER.match(bytes(self.data[location:location + 32]))
+            if header is None or int(header.group(1)) != number:
+                raise FastPathError(f"bad offset for object {number}")
+            start = location + header.end()
+            end = bytes(self.data[start:start + 65536]).find(b"endobj")
+            if end < 0:
+                raise FastPathError(f"object {number} is too large")
+            body = bytes(self.data[start:start + end])
+            stream = body.find(b"stream")
+            return body if stream < 0 else body[:stream]
+        if kind == 2:
+            stream_number, index = location
+            content, offsets, first = self._object_stream(stream_number)
+            if index >= len(offsets):
+                raise FastPathError(f"bad index for object {number}")
+            end = offsets[index + 1] if index + 1 < len(offsets) else len(content) - first
+            return content[first + offsets[index]:first + end]
+        raise FastPathError(f"object {number} is free")
+
+    def _object_stream(self, number: int) -> Tuple[bytes, List[int], int]:
+        cached = self._object_streams.get(number)
+        if cached is None:
+            kind, location = self._lookup(number)
+            if kind != 1:
+                raise FastPathError("object stream is not a direct object")
+            header = _OBJ_HEADER.match(bytes(self.data[location:location + 32]))
+            if header is None:
+                raise FastPathError("bad object stream offset")
+            dict_start = location + header.end()
+            dict_end = bytes(self.data[dict_start:dict_start + 4096]).find(b"stream") + dict_start
+            first = int(_FIRST.search(bytes(self.data[dict_start:dict_end])).group(1))
+            content = _decode_stream(self.data, dict_start, dict_end)
+            pairs = [int(n) for n in content[:first].split()]
+            cached = self._object_streams[number] = (content, pairs[1::2], first)
+        return cached
+
+    def count(self) -> int:
+        """返回页数；无法处理时抛出 FastPathError"""
+        try:
+            self._read_xref_chain()
+            if self.root is None:
+                raise FastPathError("/Root not found in trailer")
+            pages = _PAGES.search(self._object_body(self.root))
+            if pages is None:
+                raise FastPathError("/Pages not found in catalog")
+            count = _COUNT.search(self._object_body(int(pages.group(1))))
+            if count is None:
+                raise FastPathError("/Count not found in page tree root")
+            return int(count.group(1))
+        except FastPathError:
+            raise
+        except (ValueError, IndexError, AttributeError, zlib.error) as e:
+            raise FastPathError(str(e)) from e
+
+
+def fast_page_count(file_path: str) -> int:
+    """
+    通过 mmap 只读取 trailer、交叉引用表和两个对象获取页数
+    :raises FastPathError: 快速路径无法处理该文件
+    """
+    with open(file_path, "rb") as f:
+        try:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError as e:  # 空文件
+            raise FastPathError(str(e)) from e
+        try:
+            return FastPageCounter(data).count()
+        finally:
+            data.close()
+
+
+def read_page_count(file_path: str) -> int:
+    """获取页数：优先使用快速路径，失败时回退到 PdfReader 完整解析"""
+    try:
+        return fast_page_count(file_path)
+    except FastPathError:
+        return len(PdfReader(file_path).pages)
+
+
+def _safe_page_count(file_path: str) -> Tuple[str, Optional[int], Optional[str]]:
+    try:
+        return file_path, read_page_count(file_path), None
+    except Exception as e:
+        return file_path, None, f"{type(e).__name__}: {e}"
+
+
+def _safe_page_counts(files: List[str]) -> List[Tuple[str, Optional[int], Optional[str]]]:
+    return [_safe_page_count(file_path) for file_path in files]
+
+
+def count_pages(files: Iterable[str], workers: Optional[int] = None,
+                chunksize: int = 64) -> Iterator[Tuple[str, Optional[int], Optional[str]]]:
+    """
+    并发获取多个文件的页数，按输入顺序生成 (文件, 页数, 错误)；出错的文件页数为 None
+    输入按需读取，同时在途的批次数有上限，内存占用与文件总数无关
+    :param workers: 进程数，1 表示在当前进程中执行，None 为全部 CPU 核心
+    :param chunksize: 每次发给工作进程的文件数
+    """
+    if workers == 1:
+        yield from map(_safe_page_count, files)
+        return
+    workers = workers or os.cpu_count() or 1
+    files = iter(files)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        while True:
+            chunk = list(islice(files, chunksize))
+            if not chunk:
+                break
+            pending.append(executor.submit(_safe_page_counts, chunk))
+            if len(pending) >= workers * 2:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
@@ -0,0 +1,151 @@
+import re
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+
+from PyPDF2 import PdfReader
+from PyPDF2.generic import DictionaryObject, IndirectObject, NameObject
+
+from .sources import open_source
+from .streaming_writer import StreamingPdfWriter
+
+INHERITABLE_KEYS = ("/Resources", "/MediaBox", "/CropBox", "/Rotate")
+PageRanges = Union[str, Sequence[Union[int, Tuple[int, int]]]]
+
+_RANGE = re.compile(r"^\s*(\d*)\s*(-)?\s*(\d*)\s*$")
+
+
+def parse_page_ranges(ranges: PageRanges, total_pages: int) -> List[int]:
+    """
+    把页码范围解析为页码列表（从 0 开始，保持给定顺序）
+    :param ranges: "10-20,400-410"、"5"、"400-"（到最后一页）形式的字符串，或页码与 (起始页, 结束页) 的列表；
+                   页码从 1 开始，范围包含两端
+    :param total_pages: 文档总页数
+    """
+    if isinstance(ranges, str):
+        parts = []
+        for item in ranges.split(","):
+            match = _RANGE.match(item)
+            if match is None or not (match.group(1) or match.group(3)):
+                raise ValueError(f"无效的页码范围: {item!r}")
+            start = int(match.group(1)) if match.group(1) else 1
+            end = int(match.group(3)) if match.group(3) else (total_pages if match.group(2) else start)
+            parts.append((start, end))
+    else:
+        parts = [item if isinstance(item, tuple) else (item, item) for item in ranges]
+
+    pages = []
+    for start, end in parts:
+        if not 1 <= start <= end <= total_pages:
+            raise ValueError(f"页码范围 {start}-{end} 超出文档页数 {total_pages}")
+        pages.extend(range(start - 1, end))
+    return pages
+
+
+class LazyPageTree:
+    """
+    按需定位页面：从 /Root -> /Pages 沿 /Kids 与 /Count 下降，只解析路径上的节点
+    PdfReader.pages 在第一次访问时会解析并展开整棵页面树，耗时与文档页数成正比；
+    这里的耗时只与树的深度和访问的页数有关，继承属性（/Resources、/MediaBox 等）沿路径合并到页面上
+    """
+
+    def __init__(self, reader: PdfReader):
+        self.reader = reader
+        self.root = reader.trailer["/Root"]["/Pages"]
+        self.count = int(self.root["/Count"])
+        self._flat = {}  # id(中间节点) -> 子节点是否全部为页面
+
+    def page(self, page_index: int) -> DictionaryObject:
+        """返回页面字典（合并了继承属性、带 indirect_reference）"""
+        if not 0 <= page_index < self.count:
+            raise IndexError(f"页码 {page_index + 1} 超出文档页数 {self.count}")
+        node = self.root
+        index = page_index
+        inherited = {}
+        while True:
+            for key in INHERITABLE_KEYS:
+                if key in node:
+                    inherited[key] = node.raw_get(key)
+            kids = node["/Kids"]
+            # 常见的扁平页面树：子节点都是页面时直接按下标定位
+            if self._is_flat(node, kids):
+                ref = kids[index]
+                return self._merge(ref.get_object(), ref, inherited)
+            for ref in kids:
+                kid = ref.get_object()
+                if kid.get("/Type") == "/Pages":
+                    count = int(kid["/Count"])
+                    if index < count:
+                        node = kid
+                        break
+                    index -= count
+                elif index == 0:
+                    return self._merge(kid, ref, inherited)
+                else:
+                    index -= 1
+            else:
+                raise IndexError(f"页面树中找不到第 {page_index + 1} 页")
+
+    def _is_flat(self, node: DictionaryObject, kids) -> bool:
+        """
+        判断节点的子节点是否全部为页面（每个节点只判断一次）
+        只比较 /Count 与 /Kids 数量不够：/Count 为 0 的中间节点可以与多页的中间节点相互抵消
+        """
+        flat = self._flat.get(id(node))
+        if flat is None:
+            flat = int(node["/Count"]) == len(kids) and \
+                all(ref.get_object().get("/Type") != "/Pages" for ref in kids)
+            self._flat[id(node)] = flat
+        return flat
+
+    @staticmethod
+    def _merge(page: DictionaryObject, ref: IndirectObject, inherited: dict) -> DictionaryObject:
+        if not any(key not in page for key in inherited):
+            page.indirect_reference = ref
+            return page
+        merged = DictionaryObject(page)
+        for key, value in inherited.items():
+            if key not in merged:
+                merged[NameObject(key)] = value
+        merged.indirect_reference = ref
+        return merged
+
+
+def extract_from_reader(reader: PdfReader, ranges: PageRanges, output_file: str, optimize: bool = False) -> int:
+    """从已打开的文档中提取页面，返回写入的页数"""
+    tree = LazyPageTree(reader)
+    pages = [tree.page(page_index) for page_index in parse_page_ranges(ranges, tree.count)]
+    with StreamingPdfWriter(output_file, compress_streams=optimize) as writer:
+        return writer.add_pages(pages, reader)
+
+
+def extract_pages(input_file: str, ranges: PageRanges, output_file: str, optimize: bool = False) -> int:
+    """
+    提取页码范围内的页面写入新文件，只加载请求的页面及其依赖的对象，返回写入的页数
+    :param input_file: 输入 PDF 文件路径
+    :param ranges: 页码范围，见 parse_page_ranges
+    :param output_file: 输出文件路径
+    :param optimize: 是否压缩输出文件中的流
+    """
+    with open_source(input_file) as reader:
+        return extract_from_reader(reader, ranges, output_file, optimize)
+
+
+def _extract_job(job: Tuple[str, PageRanges, str]) -> Tuple[str, str, Optional[int], Optional[str]]:
+    input_file, ranges, output_file = job
+    try:
+        return input_file, output_file, extract_pages(input_file, ranges, output_file), None
+    except Exception as e:
+        return input_file, output_file, None, f"{type(e).__name__}: {e}"
+
+
+def extract_many(jobs: Iterable[Tuple[str, PageRanges, str]],
+                 workers: Optional[int] = None) -> Iterator[Tuple[str, str, Optional[int], Optional[str]]]:
+    """
+    批量提取：jobs 为 (输入文件, 页码范围, 输出文件)，按输入顺序生成 (输入文件, 输出文件, 页数, 错误)
+    :param workers: 进程数，1 表示在当前进程中执行，None 为全部 CPU 核心
+    """
+    if workers == 1:
+        yield from map(_extract_job, jobs)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        yield from executor.map(_extract_job, jobs, chunksize=8)
@@ -0,0 +1,113 @@
+import io
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Tuple
+
+from PyPDF2 import PdfReader, PdfWriter
+
+from .optimizer import optimize_reader
+from .sources import open_source
+
+PartJob = Tuple[str, int, int]  # (输出文件, 起始页, 结束页)，页码从 0 开始，不含结束页
+PartResult = Tuple[str, int, int, int, int]  # (输出文件, 起始页, 结束页, 原始大小, 写出大小)
+
+
+def write_part(reader: PdfReader, output_file: str, start_page: int, end_page: int,
+               optimize: bool = False) -> Tuple[int, int]:
+    """
+    把 [start_page, end_page) 页写入一个文件（串行与并行模式共用，保证输出逐字节一致）
+    :param optimize: 写出前对分片去重、压缩流并移除未使用的对象
+    :return: (原始大小, 写出大小)
+    """
+    writer = PdfWriter()
+    for page_num in range(start_page, end_page):
+        writer.add_page(reader.pages[page_num])
+    if not optimize:
+        with open(output_file, "wb") as output_pdf:
+            writer.write(output_pdf)
+            size = output_pdf.tell()
+        return size, size
+    # 未优化的分片只用于统计大小，直接从源文档优化写出，不再把分片写出后重新解析
+    counter = _SizeCounter()
+    writer.write(counter)
+    optimized = optimize_reader(reader, output_file, pages=list(range(start_page, end_page)))
+    return counter.size, optimized.size
+
+
+class _SizeCounter(io.RawIOBase):
+    """只统计写入字节数的输出流"""
+
+    def __init__(self):
+        super().__init__()
+        self.size = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self.size += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.size
+
+
+def _write_batch(input_file: str, jobs: List[PartJob], optimize: bool = False) -> List[PartResult]:
+    """工作进程：自行打开源文件并写出一批分片"""
+    results = []
+    with open_source(input_file) as reader:
+        for job in jobs:
+            results.append(job + write_part(reader, *job, optimize=optimize))
+    return results
+
+
+def resolve_workers(workers: Optional[int]) -> int:
+    """workers 为 None 或 0 时使用全部 CPU 核心"""
+    return max(1, workers or os.cpu_count() or 1)
+
+
+def write_parts(input_file: str, jobs: List[PartJob], workers: Optional[int] = 1, reader: PdfReader = None,
+                optimize: bool = False):
+    """
+    写出全部分片，按 jobs 的顺序依次返回已完成的分片 PartResult
+    :param input_file: 输入 PDF 文件路径
+    :param jobs: 分片列表
+    :param workers: 进程数，1 表示在当前进程串行写出，None 表示使用全部 CPU 核心
+    :param reader: 串行模式下可复用的 PdfReader
+    :param optimize: 是否优化每个分片（见 write_part）
+    """
+    workers = min(resolve_workers(workers), len(jobs)) if jobs else 1
+    if workers <= 1:
+        if reader is None:
+            with open_source(input_file) as reader:
+                yield from _write_serial(reader, jobs, optimize)
+        else:
+            yield from _write_serial(reader, jobs, optimize)
+        return
+
+    batches = _balance(jobs, workers)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for done in executor.map(_write_batch, [input_file] * len(batches), batches,
+                                 [optimize] * len(batches)):
+            yield from done
+
+
+def _balance(jobs: List[PartJob], workers: int) -> List[List[PartJob]]:
+    """
+    按页数把分片切成 workers 个连续批次
+    每个批次都要在工作进程中重新解析一次源文件，因此每个进程只分一个批次，用页数而不是分片数来均衡负载
+    """
+    total = sum(max(1, end - start) for _, start, end in jobs)
+    batches: List[List[PartJob]] = [[]]
+    done = 0
+    for job in jobs:
+        if batches[-1] and done >= total * len(batches) / workers:
+            batches.append([])
+        batches[-1].append(job)
+        done += max(1, job[2] - job[1])
+    return batches
+
+
+def _write_serial(reader: PdfReader, jobs: List[PartJob], optimize: bool):
+    for job in jobs:
+        yield job + write_part(reader, *job, optimize=optimize)
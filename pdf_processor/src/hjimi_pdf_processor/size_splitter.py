@@ -0,0 +1,168 @@
+import io
+from typing import Dict, List, Optional, Tuple
+
+from PyPDF2 import PdfReader, PdfWriter
+from PyPDF2.generic import ArrayObject, DictionaryObject, IndirectObject
+
+
+class PageSizeEstimator:
+    """
+    按页估算 PDF 序列化后的字节数
+    沿页面对象图（跳过 /Parent、/StructParents，与 PdfWriter 复制页面时的规则一致）收集间接对象，
+    每个间接对象只在内存中序列化一次并缓存其字节数，字体、图片等共享资源在同一分片内只计一次
+    """
+
+    EXCLUDED_KEYS = ("/Parent", "/StructParents")
+    OBJECT_OVERHEAD = 40  # "N 0 obj\n ... \nendobj\n" 与交叉引用表中的一行
+    FILE_OVERHEAD = 400  # 文件头、目录、页面树与 trailer
+
+    def __init__(self, reader: PdfReader):
+        self.reader = reader
+        self._sizes: Dict[Tuple[int, int], int] = {}
+
+    def _object_size(self, key: Tuple[int, int], obj) -> int:
+        """返回间接对象序列化后的字节数（带缓存）"""
+        size = self._sizes.get(key)
+        if size is None:
+            buffer = io.BytesIO()
+            obj.write_to_stream(buffer, None)
+            size = self._sizes[key] = buffer.tell() + self.OBJECT_OVERHEAD
+        return size
+
+    def new_objects(self, page_index: int, known: set) -> Dict[Tuple[int, int], int]:
+        """
+        返回页面引用的、尚未出现在 known 中的间接对象及其字节数
+        :param page_index: 页码（从 0 开始）
+        :param known: 当前分片已包含的对象（遇到时不再向下遍历）
+        """
+        page = self.reader.pages[page_index]
+        found: Dict[Tuple[int, int], int] = {}
+        ref = page.indirect_reference
+        page_key = (ref.idnum, ref.generation) if ref is not None else ("page", page_index)
+        found[page_key] = self._object_size(page_key, page)
+
+        stack = [page]
+        while stack:
+            node = stack.pop()
+            if isinstance(node, DictionaryObject):
+                values = [v for k, v in node.items() if k not in self.EXCLUDED_KEYS]
+            elif isinstance(node, ArrayObject):
+                values = list(node)
+            else:
+                continue
+            for value in values:
+                if isinstance(value, IndirectObject):
+                    key = (value.idnum, value.generation)
+                    if key in known or key in found:
+                        continue
+                    obj = value.get_object()
+                    found[key] = self._object_size(key, obj)
+                    stack.append(obj)
+                elif isinstance(value, (DictionaryObject, ArrayObject)):
+                    stack.append(value)
+        return found
+
+
+class SizeSplitter:
+    """
+    单遍按大小拆分 PDF
+    逐页累加估算大小（共享资源只计一次），只在分片边界把分片写入内存缓冲区核对实际大小；
+    估算偏小导致超限时把末尾几页移到下一个分片，并用实际/估算比例校准后续估算
+    """
+
+    def __init__(self, input_file: str, max_size_kb: float, estimator=None):
+        """
+        :param input_file: 输入 PDF 文件路径
+        :param max_size_kb: 每个拆分文件的最大大小（KB），单页超过上限时单独成为一个文件
+        :param estimator: 页面大小估算器，默认遍历页面对象图；可传入元数据索引中缓存的估算（CachedSizeEstimator）
+        """
+        self.input_file = input_file
+        self.limit = max_size_kb * 1024
+        self.reader = PdfReader(input_file)
+        self.estimator = estimator if estimator is not None else PageSizeEstimator(self.reader)
+        self.ratio = 1.0  # 实际大小 / 估算大小
+        self.boundary_writes = 0
+
+    def _render(self, pages: List[int]) -> bytes:
+        """把若干页写入内存缓冲区"""
+        writer = PdfWriter()
+        for page_index in pages:
+            writer.add_page(self.reader.pages[page_index])
+        buffer = io.BytesIO()
+        writer.write(buffer)
+        self.boundary_writes += 1
+        return buffer.getvalue()
+
+    def _estimate(self, pages: List[int]) -> Tuple[float, set]:
+        """重新估算一组页面的大小"""
+        known = set()
+        total = PageSizeEstimator.FILE_OVERHEAD
+        for page_index in pages:
+            found = self.estimator.new_objects(page_index, known)
+            known.update(found)
+            total += sum(found.values())
+        return total, known
+
+    def _finish_chunk(self, pages: List[int], estimate: float) -> Tuple[bytes, List[int]]:
+        """
+        写出分片并核对实际大小
+        :return: (分片内容, 需要移到下一个分片的页面)
+        """
+        carry: List[int] = []
+        data = self._render(pages)
+        if estimate > 0:
+            self.ratio = len(data) / estimate
+        while len(data) > self.limit and len(pages) > 1:
+            keep = max(1, min(len(pages) - 1, int(len(pages) * self.limit / len(data) * 0.95)))
+            carry = pages[keep:] + carry
+            pages = pages[:keep]
+            data = self._render(pages)
+        return data, carry
+
+    def iter_chunks(self):
+        """依次生成 (页码列表, 分片内容)"""
+        pages: List[int] = []
+        known: set = set()
+        estimate = PageSizeEstimator.FILE_OVERHEAD
+        page_index = 0
+        total_pages = len(self.reader.pages)
+        while page_index < total_pages:
+            found = self.estimator.new_objects(page_index, known)
+            added = sum(found.values())
+            if pages and (estimate + added) * self.ratio > self.limit:
+                data, carry = self._finish_chunk(pages, estimate)
+                yield pages[:len(pages) - len(carry)], data
+                pages = carry
+                estimate, known = self._estimate(pages)
+                continue  # 以新的分片状态重新估算当前页
+            pages.append(page_index)
+            known.update(found)
+            estimate += added
+            page_index += 1
+
+        while pages:
+            data, carry = self._finish_chunk(pages, estimate)
+            yield pages[:len(pages) - len(carry)], data
+            pages = carry
+            estimate, _ = self._estimate(pages)
+
+    def split(self, output_pattern: Optional[str] = None) -> List[str]:
+        """
+        执行拆分并写出文件
+        :param output_pattern: 输出文件名模板，包含 {part}，默认 "<输入文件名>_part_{part}.pdf"
+        :return: 生成的文件路径列表
+        """
+        base_name = self.input_file.replace('.pdf', '')
+        outputs = []
+        for part_number, (pages, data) in enumerate(self.iter_chunks()):
+            # 默认文件名直接拼接，输入路径中的 { } 不会被当作模板字段
+            if output_pattern is None:
+                output_file = f"{base_name}_part_{part_number}.pdf"
+            else:
+                output_file = output_pattern.format(part=part_number)
+            with open(output_file, "wb") as output_pdf:
+                output_pdf.write(data)
+            outputs.append(output_file)
+            print(f"生成文件: {output_file}，包含页数: {pages[0] + 1} - {pages[-1] + 1}，"
+                  f"大小: {len(data) / 1024:.2f} KB")
+        return outputs
@@ -0,0 +1,22 @@
+import mmap
+from contextlib import contextmanager
+
+from PyPDF2 import PdfReader
+
+
+@contextmanager
+def open_source(input_file: str):
+    """
+    以内存映射方式打开 PDF 并返回 PdfReader
+    多个进程映射同一文件时共享操作系统页缓存；空文件或不支持 mmap 的文件系统退回普通文件读取
+    """
+    with open(input_file, "rb") as f:
+        try:
+            stream = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (ValueError, OSError):
+            stream = None
+        try:
+            yield PdfReader(stream if stream is not None else f)
+        finally:
+            if stream is not None:
+                stream.close()
@@ -0,0 +1,269 @@
+import io
+import zlib
+import hashlib
+from typing import Dict, List, Optional, Tuple
+
+from PyPDF2 import PdfReader
+from PyPDF2.generic import ArrayObject, DictionaryObject, IndirectObject, NameObject, NullObject, StreamObject
+
+from .sources import open_source
+
+CATALOG_NUMBER = 1
+PAGES_NUMBER = 2
+PAGE_EXCLUDED_KEYS = ("/Parent", "/StructParents")  # 与 PdfWriter.add_page 的处理一致
+
+
+class StreamingPdfWriter:
+    """
+    流式 PDF 写入器
+    每个对象在复制时重新编号并立即写入输出文件，内存中只保留对象偏移、页面编号和去重表；
+    当前文档写完后即可释放其 PdfReader，峰值内存取决于最大的单个输入文件。
+    内容相同的对象（字体、图片、表单等共享资源）只写一次，引用它们的对象序列化后也会相同，因而逐层去重；
+    页面内容流几乎不会重复，不进入去重表（去重表每项只保存 16 字节摘要和编号）。
+    只有从页面可达的对象会被复制，源文件中未使用的对象不会写出
+    """
+
+    def __init__(self, output_path: str, deduplicate: bool = True, compress_streams: bool = False,
+                 compression_level: int = 9):
+        """
+        :param output_path: 输出文件路径
+        :param deduplicate: 是否对内容相同的对象去重
+        :param compress_streams: 是否用 FlateDecode 压缩未压缩的流，并以更高压缩级别重新压缩已有的 Flate 流
+        :param compression_level: zlib 压缩级别
+        """
+        self.output_path = output_path
+        self.deduplicate = deduplicate
+        self.compress_streams = compress_streams
+        self.compression_level = compression_level
+        self._file = open(output_path, "wb")
+        self._offsets: Dict[int, int] = {}
+        self._next_number = PAGES_NUMBER + 1
+        self._kids: List[int] = []
+        self._dedup: Dict[bytes, int] = {}
+        self._version = b"1.3"
+        self.objects_written = 0
+        self.objects_deduplicated = 0
+        self.bytes_deduplicated = 0
+        self.bytes_recompressed = 0  # 重新压缩节省的字节数
+        self.size = 0  # 关闭后为输出文件大小
+        self._file.write(b"%PDF-1.3\n%\xe2\xe3\xcf\xd3\n")
+
+    @property
+    def page_count(self) -> int:
+        return len(self._kids)
+
+    def _allocate(self) -> int:
+        number = self._next_number
+        self._next_number += 1
+        return number
+
+    def _write_object(self, number: int, body: bytes) -> None:
+        self._offsets[number] = self._file.tell()
+        self._file.write(b"%d 0 obj\n" % number)
+        self._file.write(body)
+        self._file.write(b"\nendobj\n")
+        self.objects_written += 1
+
+    def _store(self, body: bytes, dedup: bool) -> int:
+        """写入对象；内容相同的对象已写过时返回已有编号"""
+        if dedup and self.deduplicate:
+            digest = hashlib.blake2b(body, digest_size=16).digest()
+            number = self._dedup.get(digest)
+            if number is not None:
+                self.objects_deduplicated += 1
+                self.bytes_deduplicated += len(body)
+                return number
+            number = self._dedup[digest] = self._allocate()
+        else:
+            number = self._allocate()
+        self._write_object(number, body)
+        return number
+
+    def add_document(self, reader: PdfReader, pages: Optional[List[int]] = None) -> int:
+        """
+        复制文档的页面（默认全部页面），返回写入的页数
+        :param pages: 页码列表（从 0 开始）
+        """
+        page_indices = range(len(reader.pages)) if pages is None else pages
+        return self.add_pages([reader.pages[page_index] for page_index in page_indices], reader)
+
+    def add_pages(self, pages: List[DictionaryObject], reader: PdfReader = None) -> int:
+        """
+        复制同一文档中的若干页面对象，返回写入的页数
+        页面需带 indirect_reference，继承自页面树的属性应已合并到页面字典中；
+        对未复制页面的引用（如链接注释的目标）写为 null，不会把其他页面当作普通对象复制。
+        复制中途出错时撤销本次已写出的页面和对象后再抛出异常，输出中不会留下半个文档
+        :param reader: 源文档（用于沿用其 PDF 版本号）
+        """
+        checkpoint = self._checkpoint()
+        try:
+            if reader is not None:
+                header = reader.pdf_header.encode() if isinstance(reader.pdf_header, str) else reader.pdf_header
+                if header and header[5:8] > self._version and header[5:6].isdigit():
+                    self._version = header[5:8]
+            copier = _DocumentCopier(self, pages)
+            for page in pages:
+                copier.copy_page(page)
+        except Exception:
+            self._rollback(checkpoint)
+            raise
+        return len(pages)
+
+    def add_file(self, input_file: str, pages: Optional[List[int]] = None) -> int:
+        """打开文件、复制页面后立即释放其 PdfReader，返回写入的页数"""
+        with open_source(input_file) as reader:
+            return self.add_document(reader, pages)
+
+    def _checkpoint(self) -> tuple:
+        return (self._file.tell(), self._next_number, len(self._kids), self._version, self.objects_written,
+                self.objects_deduplicated, self.bytes_deduplicated, self.bytes_recompressed)
+
+    def _rollback(self, checkpoint: tuple) -> None:
+        """截断输出文件并丢弃检查点之后分配的编号、页面和去重记录"""
+        (position, next_number, page_count, self._version, self.objects_written,
+         self.objects_deduplicated, self.bytes_deduplicated, self.bytes_recompressed) = checkpoint
+        self._file.seek(position)
+        self._file.truncate()
+        for number in range(next_number, self._next_number):
+            self._offsets.pop(number, None)
+        self._dedup = {digest: number for digest, number in self._dedup.items() if number < next_number}
+        self._next_number = next_number
+        del self._kids[page_count:]
+
+    def close(self) -> None:
+        """写出页面树、目录、交叉引用表与 trailer"""
+        if self._file.closed:
+            return
+        kids = b" ".join(b"%d 0 R" % number for number in self._kids)
+        self._write_object(PAGES_NUMBER, b"<< /Type /Pages /Kids [ %s ] /Count %d >>" % (kids, len(self._kids)))
+        self._write_object(CATALOG_NUMBER, b"<< /Type /Catalog /Pages %d 0 R >>" % PAGES_NUMBER)
+
+        xref_offset = self._file.tell()
+        size = self._next_number
+        self._file.write(b"xref\n0 %d\n0000000000 65535 f \n" % size)
+        entries = []
+        for number in range(1, size):
+            offset = self._offsets.get(number)
+            entries.append(b"%010d 00000 n \n" % offset if offset is not None else b"0000000000 65535 f \n")
+            if len(entries) >= 4096:
+                self._file.write(b"".join(entries))
+                entries = []
+        self._file.write(b"".join(entries))
+        self._file.write(b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n"
+                         % (size, CATALOG_NUMBER, xref_offset))
+        self.size = self._file.tell()
+        if self._version != b"1.3":
+            self._file.seek(5)
+            self._file.write(self._version)
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class _DocumentCopier:
+    """把一个源文档的对象复制到 StreamingPdfWriter（编号映射只在当前文档内有效）"""
+
+    def __init__(self, writer: StreamingPdfWriter, pages: List[DictionaryObject]):
+        self.writer = writer
+        self.mapping: Dict[Tuple[int, int], int] = {}
+        self.in_progress: Dict[Tuple[int, int], Optional[int]] = {}
+        # 页面编号预先分配：链接注释等对其他页面的引用直接指向新页面，不会把页面当作普通对象复制
+        self.page_numbers: Dict[Tuple[int, int], int] = {}
+        for page in pages:
+            ref = page.indirect_reference
+            if ref is not None and (ref.idnum, ref.generation) not in self.page_numbers:
+                self.page_numbers[(ref.idnum, ref.generation)] = writer._allocate()
+
+    def copy_page(self, page: DictionaryObject) -> None:
+        ref = page.indirect_reference
+        number = self.page_numbers[(ref.idnum, ref.generation)] if ref is not None else self.writer._allocate()
+        if number in self.writer._offsets:  # 同一页面重复添加时另写一份
+            number = self.writer._allocate()
+        copy = DictionaryObject()
+        for key, value in page.items():
+            if key not in PAGE_EXCLUDED_KEYS:
+                copy[NameObject(key)] = self._copy(value, dedup=key != "/Contents")
+        copy[NameObject("/Parent")] = IndirectObject(PAGES_NUMBER, 0, None)
+        self.writer._write_object(number, _serialize(copy))
+        self.writer._kids.append(number)
+
+    def _copy(self, value, dedup: bool = True):
+        """返回引用已替换为新编号的对象副本"""
+        if isinstance(value, IndirectObject):
+            number = self._copy_reference(value, dedup)
+            return NullObject() if number is None else IndirectObject(number, 0, None)
+        if isinstance(value, StreamObject):
+            copy = type(value)()
+            copy._data = value._data
+            for key, item in value.items():
+                copy[NameObject(key)] = self._copy(item)
+            if self.writer.compress_streams:
+                self._compress(copy)
+            return copy
+        if isinstance(value, DictionaryObject):
+            copy = DictionaryObject()
+            for key, item in value.items():
+                copy[NameObject(key)] = self._copy(item)
+            return copy
+        if isinstance(value, ArrayObject):
+            return ArrayObject(self._copy(item, dedup) for item in value)
+        return value
+
+    def _compress(self, stream: StreamObject) -> None:
+        """压缩未压缩的流，或重新压缩只使用 FlateDecode（无预测器参数）的流；结果更小时才替换"""
+        filters = dict.get(stream, "/Filter")  # 副本中的间接引用已指向新编号，不能解析
+        if isinstance(filters, ArrayObject):
+            filters = filters[0] if len(filters) == 1 else None
+        try:
+            if filters is None and "/Filter" not in stream:
+                data = stream._data
+            elif filters == "/FlateDecode" and "/DecodeParms" not in stream:
+                data = zlib.decompress(stream._data)
+            else:
+                return
+        except zlib.error:
+            return
+        compressed = zlib.compress(data, self.writer.compression_level)
+        if len(compressed) < len(stream._data):
+            self.writer.bytes_recompressed += len(stream._data) - len(compressed)
+            stream._data = compressed
+            stream[NameObject("/Filter")] = NameObject("/FlateDecode")
+
+    def _copy_reference(self, ref: IndirectObject, dedup: bool = True) -> Optional[int]:
+        key = (ref.idnum, ref.generation)
+        number = self.page_numbers.get(key) or self.mapping.get(key)
+        if number is not None:
+            return number
+        if key in self.in_progress:
+            # 循环引用：为仍在复制中的对象预留编号，该对象不参与去重
+            if self.in_progress[key] is None:
+                self.in_progress[key] = self.writer._allocate()
+            return self.in_progress[key]
+
+        obj = ref.get_object()
+        if isinstance(obj, DictionaryObject) and dict.get(obj, "/Type") == "/Page":
+            return None  # 未复制的页面
+
+        self.in_progress[key] = None
+        try:
+            copy = self._copy(obj)
+        finally:
+            reserved = self.in_progress.pop(key)
+        body = _serialize(copy)
+        if reserved is None:
+            number = self.writer._store(body, dedup)
+        else:
+            number = reserved
+            self.writer._write_object(number, body)
+        self.mapping[key] = number
+        return number
+
+
+def _serialize(obj) -> bytes:
+    buffer = io.BytesIO()
+    obj.write_to_stream(buffer, None)
+    return buffer.getvalue()
@@ -0,0 +1,174 @@
+import json
+import re
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from PyPDF2 import PageObject, PdfReader
+from PyPDF2.generic import NameObject
+
+from .page_extractor import LazyPageTree
+from .parallel_split import resolve_workers
+
+PageText = Tuple[int, str]  # (页码，从 1 开始, 文本)
+SEPARATOR = "\n\n"
+
+_worker_documents: Dict[str, Tuple[PdfReader, LazyPageTree]] = {}
+
+
+def page_text(reader: PdfReader, tree: LazyPageTree, page_index: int) -> str:
+    """提取一页的文本（只解析该页在页面树中的路径，工作进程只加载分配给它的页面）"""
+    node = tree.page(page_index)
+    page = PageObject(reader, node.indirect_reference)
+    for key, value in node.items():
+        page[NameObject(key)] = value
+    return page.extract_text()
+
+
+def _open_document(input_file: str) -> Tuple[PdfReader, LazyPageTree]:
+    """工作进程：每个进程只保留最近一个文件的 PdfReader，同一文件的后续批次不再重新读取交叉引用表"""
+    document = _worker_documents.get(input_file)
+    if document is None:
+        _worker_documents.clear()
+        reader = PdfReader(input_file)
+        document = _worker_documents[input_file] = (reader, LazyPageTree(reader))
+    return document
+
+
+def _extract_batch(input_file: str, start_page: int, end_page: int) -> List[PageText]:
+    """工作进程：提取 [start_page, end_page) 页的文本"""
+    reader, tree = _open_document(input_file)
+    return [(page_index + 1, page_text(reader, tree, page_index)) for page_index in range(start_page, end_page)]
+
+
+def iter_page_text(input_file: str, workers: Optional[int] = None, batch_pages: int = 16,
+                   start_page: int = 0, end_page: Optional[int] = None) -> Iterator[PageText]:
+    """
+    按页码顺序逐页生成 (页码, 文本)
+    页面按 batch_pages 分批交给工作进程，同时在途的批次数为进程数的两倍，
+    内存中最多保留这些批次的文本，与文档总页数无关
+    :param input_file: 输入 PDF 文件路径
+    :param workers: 进程数，1 表示在当前进程中提取，None 为全部 CPU 核心
+    :param batch_pages: 每批页数
+    :param start_page: 起始页（从 0 开始）
+    :param end_page: 结束页（不含），默认到最后一页
+    """
+    workers = resolve_workers(workers)
+    if end_page is None:
+        end_page = LazyPageTree(PdfReader(input_file)).count
+
+    if workers == 1:
+        # 在当前进程中提取全部页面时，PdfReader.pages 展开页面树的开销可以摊到每一页上
+        pages = PdfReader(input_file).pages
+        for page_index in range(start_page, end_page):
+            yield page_index + 1, pages[page_index].extract_text()
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for start in range(start_page, end_page, batch_pages):
+            end = min(start + batch_pages, end_page)
+            pending.append(executor.submit(_extract_batch, input_file, start, end))
+            if len(pending) >= workers * 2:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+
+class TextChunker:
+    """
+    把逐页文本合并切分为长度受限的文本块，每块记录起止页码
+    优先在段落（空行）处切分，其次在行尾，超长的行按长度硬切；相邻块之间可保留重叠的尾部文本
+    """
+
+    def __init__(self, max_length: int = 2000, overlap: int = 0, length_function: Callable[[str], int] = len):
+        """
+        :param max_length: 每块的最大长度（按 length_function 计算）
+        :param overlap: 下一块开头重复上一块末尾的长度，便于保留上下文
+        :param length_function: 长度计算函数，默认按字符数；可传入 token 计数函数
+        """
+        if overlap >= max_length:
+            raise ValueError("overlap 必须小于 max_length")
+        self.max_length = max_length
+        self.overlap = overlap
+        self.length_function = length_function
+        self._separator_length = length_function(SEPARATOR)
+        self._pieces: List[Tuple[int, str]] = []  # 当前块中的 (页码, 片段)
+        self._length = 0
+
+    def _units(self, text: str) -> Iterator[str]:
+        """把文本拆成不超过 max_length 的段落、行或硬切片段"""
+        for paragraph in re.split(r"\n\s*\n", text):
+            paragraph = paragraph.strip()
+            if not paragraph:
+                continue
+            if self.length_function(paragraph) <= self.max_length:
+                yield paragraph
+                continue
+            for line in paragraph.splitlines():
+                while line:
+                    cut = len(line)
+                    while self.length_function(line[:cut]) > self.max_length:
+                        cut = max(1, min(cut - 1, cut * self.max_length // self.length_function(line[:cut])))
+                    yield line[:cut]
+                    line = line[cut:]
+
+    def _emit(self) -> Dict[str, object]:
+        chunk = {"text": SEPARATOR.join(piece for _, piece in self._pieces),
+                 "start_page": self._pieces[0][0], "end_page": self._pieces[-1][0]}
+        tail: List[Tuple[int, str]] = []
+        length = 0
+        if self.overlap:
+            for page_number, piece in reversed(self._pieces):
+                piece_length = self.length_function(piece) + (self._separator_length if tail else 0)
+                if length + piece_length > self.overlap:
+                    break
+                tail.insert(0, (page_number, piece))
+                length += piece_length
+        self._pieces = tail
+        self._length = length
+        return chunk
+
+    def feed(self, page_number: int, text: str) -> Iterator[Dict[str, object]]:
+        """加入一页文本，生成已经填满的文本块 {"text", "start_page", "end_page"}"""
+        for unit in self._units(text):
+            length = self.length_function(unit)
+            if self._pieces and self._length + self._separator_length + length > self.max_length:
+                yield self._emit()
+                if self._pieces and self._length + self._separator_length + length > self.max_length:
+                    self._pieces, self._length = [], 0  # 重叠部分放不下时不保留
+            if self._pieces:
+                length += self._separator_length
+            self._pieces.append((page_number, unit))
+            self._length += length
+
+    def flush(self) -> Iterator[Dict[str, object]]:
+        """生成剩余的文本块"""
+        if self._pieces:
+            chunk = self._emit()
+            self._pieces, self._length = [], 0
+            yield chunk
+
+    def chunks(self, records: Iterable[PageText]) -> Iterator[Dict[str, object]]:
+        """把 (页码, 文本) 流转换为文本块流"""
+        for page_number, text in records:
+            yield from self.feed(page_number, text)
+        yield from self.flush()
+
+
+def write_jsonl(records: Iterable, output_file: str, source: Optional[str] = None) -> int:
+    """
+    把逐页文本或文本块逐行写入 JSON Lines 文件，返回写入的行数
+    :param records: (页码, 文本) 或文本块字典
+    :param source: 写入每行的 "file" 字段，None 表示不写
+    """
+    count = 0
+    with open(output_file, "w", encoding="utf-8") as f:
+        for record in records:
+            if isinstance(record, tuple):
+                record = {"page": record[0], "text": record[1]}
+            if source is not None:
+                record = dict(file=source, **record)
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            count += 1
+    return count
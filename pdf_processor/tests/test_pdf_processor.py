@@ -1,6 +1,177 @@
 import os
+import json
+import random
+import shutil
+import zlib
+import tempfile
 import unittest
+
+from PyPDF2 import PageObject, PdfReader, PdfWriter
+from PyPDF2.generic import (
+    ArrayObject, DecodedStreamObject, DictionaryObject, FloatObject, IndirectObject, NameObject, NumberObject
+)
+
 from hjimi_pdf_processor import PDFProcessor
+from hjimi_pdf_processor.batch import BatchProcessor, iter_input_files
+from hjimi_pdf_processor.page_count import FastPathError, count_pages, fast_page_count
+from hjimi_pdf_processor.optimizer import optimize_pdf
+from hjimi_pdf_processor.outline_splitter import NAME_MAX, OutlineEntry, OutlineIndex
+from hjimi_pdf_processor.parallel_split import write_parts
+from hjimi_pdf_processor.size_splitter import PageSizeEstimator
+from hjimi_pdf_processor.page_extractor import LazyPageTree, extract_many, parse_page_ranges
+from hjimi_pdf_processor.streaming_writer import StreamingPdfWriter
+from hjimi_pdf_processor.text_extractor import TextChunker, iter_page_text
+
+
+def build_sample_pdf(path, page_count, page_bytes=0, shared_bytes=0, seed=0, outline=None):
+    """
+    生成测试用 PDF：每页有独立的内容流（可填充随机注释），所有页面共享同一个字体和表单对象
+    :param page_bytes: 每页内容流的填充字节数
+    :param shared_bytes: 共享表单对象的填充字节数
+    :param outline: 书签列表 [(标题, 页码[, 子书签列表]), ...]，页码从 0 开始
+    """
+    rng = random.Random(seed)
+
+    def padding(size):
+        lines = [b"% " + rng.getrandbits(256).to_bytes(32, "big").hex().encode() for _ in range(size // 67)]
+        return b"\n".join(lines) + b"\n" if lines else b""
+
+    writer = PdfWriter()
+    font = DictionaryObject({
+        NameObject("/Type"): NameObject("/Font"),
+        NameObject("/Subtype"): NameObject("/Type1"),
+        NameObject("/BaseFont"): NameObject("/Helvetica"),
+    })
+    font_ref = writer._add_object(font)
+    shared = DecodedStreamObject()
+    shared.set_data(padding(shared_bytes))
+    shared.update({
+        NameObject("/Type"): NameObject("/XObject"),
+        NameObject("/Subtype"): NameObject("/Form"),
+        NameObject("/BBox"): ArrayObject([FloatObject(0), FloatObject(0), FloatObject(1), FloatObject(1)]),
+    })
+    shared_ref = writer._add_object(shared)
+
+    for number in range(1, page_count + 1):
+        page = PageObject.create_blank_page(None, 612, 792)
+        content = DecodedStreamObject()
+        content.set_data(b"BT /F1 12 Tf 72 720 Td (Page %d) Tj ET\n/X1 Do\n" % number + padding(page_bytes))
+        page[NameObject("/Contents")] = writer._add_object(content)
+        page[NameObject("/Resources")] = DictionaryObject({
+            NameObject("/Font"): DictionaryObject({NameObject("/F1"): font_ref}),
+            NameObject("/XObject"): DictionaryObject({NameObject("/X1"): shared_ref}),
+        })
+        writer.add_page(page)
+    def add_outline(items, parent=None):
+        for title, page_number, *children in items:
+            item = writer.add_outline_item(title, page_number, parent)
+            if children:
+                add_outline(children[0], item)
+
+    add_outline(outline or [])
+    with open(path, "wb") as f:
+        writer.write(f)
+    return path
+
+
+class FailingReader:
+    """读取任何对象都失败的读取器（模拟复制中途损坏的输入文件）"""
+
+    def get_object(self, ref):
+        raise OSError("文件已损坏")
+
+
+def build_xref_stream_pdf(path, page_count):
+    """生成使用交叉引用流与对象流（PDF 1.5）的测试文件：目录和页面树位于对象流中"""
+    kids = " ".join(f"{3 + i} 0 R" for i in range(page_count)).encode()
+    packed = [b"<< /Type /Catalog /Pages 2 0 R >>", b"<< /Type /Pages /Kids [" + kids + b"] /Count %d >>" % page_count]
+    header = b"1 0 2 %d " % (len(packed[0]) + 1)
+    object_stream = zlib.compress(header + b"\n".join(packed))
+    stream_number = 3 + page_count
+
+    body = b"%PDF-1.5\n"
+    offsets = {}
+    for i in range(page_count):
+        offsets[3 + i] = len(body)
+        body += b"%d 0 obj\n<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] >>\nendobj\n" % (3 + i)
+    offsets[stream_number] = len(body)
+    body += (b"%d 0 obj\n<< /Type /ObjStm /N 2 /First %d /Length %d /Filter /FlateDecode >>\nstream\n"
+             % (stream_number, len(header), len(object_stream)) + object_stream + b"\nendstream\nendobj\n")
+
+    xref_number = stream_number + 1
+    rows = [bytes([0, 0, 0, 0])]
+    rows += [bytes([2, 0, stream_number, index]) for index in range(2)]
+    rows += [bytes([1]) + offsets[n].to_bytes(2, "big") + bytes([0]) for n in range(3, xref_number)]
+    rows += [bytes([1]) + len(body).to_bytes(2, "big") + bytes([0])]
+    previous = bytes(4)
+    encoded = b""
+    for row in rows:  # PNG Up 预测器
+        encoded += bytes([2]) + bytes((a - b) & 0xFF for a, b in zip(row, previous))
+        previous = row
+    xref_data = zlib.compress(encoded)
+    xref_offset = len(body)
+    body += (b"%d 0 obj\n<< /Type /XRef /Size %d /W [1 2 1] /Root 1 0 R /Length %d /Filter /FlateDecode "
+             b"/DecodeParms << /Predictor 12 /Columns 4 >> >>\nstream\n" % (xref_number, xref_number + 1, len(xref_data))
+             + xref_data + b"\nendstream\nendobj\nstartxref\n%d\n%%%%EOF\n" % xref_offset)
+    with open(path, "wb") as f:
+        f.write(body)
+    return path
+
+
+def build_nested_tree_pdf(path, group_sizes):
+    """
+    生成多层页面树的测试文件：每组页面挂在一个中间节点下，/Resources 与 /MediaBox 由上层节点继承
+    :param group_sizes: 每个中间节点下的页数（可以为 0）；None 表示直接挂在根节点下的一个页面
+    """
+    writer = PdfWriter()
+    font_ref = writer._add_object(DictionaryObject({
+        NameObject("/Type"): NameObject("/Font"),
+        NameObject("/Subtype"): NameObject("/Type1"),
+        NameObject("/BaseFont"): NameObject("/Helvetica"),
+    }))
+    root_ref = writer._pages
+    root = writer.get_object(root_ref)
+    number = 0
+    for size in group_sizes:
+        if size is None:
+            number += 1
+            content = DecodedStreamObject()
+            content.set_data(b"BT /F1 12 Tf 72 720 Td (Page %d) Tj ET" % number)
+            root[NameObject("/Kids")].append(writer._add_object(DictionaryObject({
+                NameObject("/Type"): NameObject("/Page"),
+                NameObject("/Parent"): root_ref,
+                NameObject("/Contents"): writer._add_object(content),
+                NameObject("/Resources"): DictionaryObject({
+                    NameObject("/Font"): DictionaryObject({NameObject("/F1"): font_ref})}),
+            })))
+            continue
+        node = DictionaryObject({
+            NameObject("/Type"): NameObject("/Pages"),
+            NameObject("/Parent"): root_ref,
+            NameObject("/Count"): NumberObject(size),
+            NameObject("/Resources"): DictionaryObject({
+                NameObject("/Font"): DictionaryObject({NameObject("/F1"): font_ref})}),
+        })
+        node_ref = writer._add_object(node)
+        kids = ArrayObject()
+        for _ in range(size):
+            number += 1
+            content = DecodedStreamObject()
+            content.set_data(b"BT /F1 12 Tf 72 720 Td (Page %d) Tj ET" % number)
+            kids.append(writer._add_object(DictionaryObject({
+                NameObject("/Type"): NameObject("/Page"),
+                NameObject("/Parent"): node_ref,
+                NameObject("/Contents"): writer._add_object(content),
+            })))
+        node[NameObject("/Kids")] = kids
+        root[NameObject("/Kids")].append(node_ref)
+    root[NameObject("/Count")] = NumberObject(number)
+    root[NameObject("/MediaBox")] = ArrayObject([NumberObject(0), NumberObject(0),
+                                                 NumberObject(300), NumberObject(400)])
+    with open(path, "wb") as f:
+        writer.write(f)
+    return path
+
 
 class TestPDFProcessor(unittest.TestCase):
     def setUp(self):
@@ -40,6 +211,62 @@ class TestPDFProcessor(unittest.TestCase):
         else:
             self.skipTest("测试 PDF 文件不存在")
 
+    def test_fast_page_count(self):
+        """测试快速页数读取：交叉引用表、增量更新、交叉引用流，以及无法处理时的回退"""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            table = build_sample_pdf(os.path.join(tmp_dir, "table.pdf"), 7)
+            self.assertEqual(fast_page_count(table), 7)
+
+            # 增量更新：追加新的页面树根（去掉最后一页）和指向旧交叉引用表的 /Prev
+            reader = PdfReader(table)
+            pages_ref = reader.trailer["/Root"].raw_get("/Pages")
+            kids = " ".join(f"{kid.idnum} 0 R" for kid in reader.trailer["/Root"]["/Pages"]["/Kids"][:-1])
+            with open(table, "rb") as f:
+                data = f.read()
+            previous = int(data.rpartition(b"startxref")[2].split()[0])
+            offset = len(data)
+            data += b"%d 0 obj\n<< /Type /Pages /Kids [%s] /Count 6 >>\nendobj\n" % (pages_ref.idnum, kids.encode())
+            xref_offset = len(data)
+            data += (b"xref\n%d 1\n%010d 00000 n \ntrailer\n<< /Size %d /Root %d 0 R /Prev %d >>\n"
+                     b"startxref\n%d\n%%%%EOF\n" % (pages_ref.idnum, offset, reader.trailer["/Size"],
+                                                  reader.trailer.raw_get("/Root").idnum, previous, xref_offset))
+            updated = os.path.join(tmp_dir, "updated.pdf")
+            with open(updated, "wb") as f:
+                f.write(data)
+            self.assertEqual(fast_page_count(updated), 6)
+            self.assertEqual(len(PdfReader(updated).pages), 6)
+
+            compressed = build_xref_stream_pdf(os.path.join(tmp_dir, "compressed.pdf"), 5)
+            self.assertEqual(fast_page_count(compressed), 5)
+            self.assertEqual(len(PdfReader(compressed).pages), 5)
+
+            broken = os.path.join(tmp_dir, "broken_xref.pdf")
+            with open(table, "rb") as f:
+                data = f.read()
+            head, _, _ = data.rpartition(b"startxref")
+            with open(broken, "wb") as f:
+                f.write(head + b"startxref\n12\n%%EOF\n")
+            with self.assertRaises(FastPathError):
+                fast_page_count(broken)
+            self.assertEqual(PDFProcessor.get_pdf_page_count(broken), 7)
+
+            results = list(count_pages([table, compressed, os.path.join(tmp_dir, "missing.pdf")], workers=2))
+            self.assertEqual([pages for _, pages, _ in results], [7, 5, None])
+            self.assertIn("FileNotFoundError", results[2][2])
+
+            # 输入按需读取：取出第一个结果时只消耗了有限的几批文件
+            consumed = []
+
+            def lazy_files():
+                for i in range(10000):
+                    consumed.append(i)
+                    yield table if i % 2 else compressed
+
+            results = count_pages(lazy_files(), workers=2, chunksize=4)
+            self.assertEqual(next(results), (compressed, 5, None))
+            self.assertLessEqual(len(consumed), 4 * 2 * 2)
+            results.close()
+
     def test_split_pdf_by_size(self):
         """测试按大小分割 PDF"""
         if os.path.exists(self.test_file):
@@ -54,6 +281,33 @@ class TestPDFProcessor(unittest.TestCase):
         else:
             self.skipTest("测试 PDF 文件不存在")
 
+    def test_split_pdf_by_size_stays_under_limit(self):
+        """测试按大小分割：每个分片不超过上限、页数完整、不产生临时文件"""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            source = build_sample_pdf(os.path.join(tmp_dir, "sample.pdf"), 40,
+                                      page_bytes=3000, shared_bytes=20000)
+            outputs = PDFProcessor.split_pdf_by_size(source, 30)
+
+            self.assertGreater(len(outputs), 1)
+            self.assertEqual(sorted(os.listdir(tmp_dir)),
+                             sorted(["sample.pdf"] + [os.path.basename(f) for f in outputs]))
+            total_pages = 0
+            for output in outputs:
+                pages = len(PdfReader(output).pages)
+                total_pages += pages
+                if pages > 1:
+                    self.assertLessEqual(os.path.getsize(output), 30 * 1024)
+            self.assertEqual(total_pages, 40)
+            self.assertEqual(PdfReader(outputs[-1]).pages[-1].extract_text().strip(), "Page 40")
+
+    def test_split_pdf_by_size_with_braces_in_path(self):
+        """测试输入路径包含花括号时默认输出文件名正确"""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            source = build_sample_pdf(os.path.join(tmp_dir, "report{v2}.pdf"), 4, page_bytes=3000)
+            outputs = PDFProcessor.split_pdf_by_size(source, 5)
+            self.assertEqual(outputs[0], os.path.join(tmp_dir, "report{v2}_part_0.pdf"))
+            self.assertTrue(all(os.path.exists(f) for f in outputs))
+
     def test_split_pdf_by_pages(self):
         """测试按页数分割 PDF"""
         if os.path.exists(self.test_file):
@@ -68,6 +322,173 @@ class TestPDFProcessor(unittest.TestCase):
         else:
             self.skipTest("测试 PDF 文件不存在")
 
+    def test_parallel_split_matches_serial(self):
+        """测试多进程拆分的输出与串行拆分逐字节一致"""
+        outline = [("第一章", 0), ("第二章", 5), ("第三章: 附录", 12)]
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            results = {}
+            for workers in (1, 3):
+                work_dir = os.path.join(tmp_dir, f"workers_{workers}")
+                os.mkdir(work_dir)
+                source = build_sample_pdf(os.path.join(work_dir, "sample.pdf"), 20,
+                                          page_bytes=500, shared_bytes=2000, outline=outline)
+                outputs = PDFProcessor.split_pdf_by_pages(source, 3, workers=workers)
+                outputs += PDFProcessor.split_pdf_by_bookmarks(source, workers=workers)
+                results[workers] = [(os.path.basename(f), open(f, "rb").read()) for f in outputs]
+
+            self.assertEqual(len(results[1]), 7 + 3)
+            self.assertEqual(results[1][-1][0], "sample_part_3_第三章_ 附录.pdf")
+            self.assertEqual(results[1], results[3])
+
+    def test_batch_processor_isolates_failures(self):
+        """测试批量处理：单个文件失败不影响其他文件，结果写入清单"""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            for name, pages in (("a_1.pdf", 2), ("a_2.pdf", 3), ("b_1.pdf", 4)):
+                build_sample_pdf(os.path.join(tmp_dir, name), pages)
+            with open(os.path.join(tmp_dir, "broken.pdf"), "wb") as f:
+                f.write(b"not a pdf")
+            manifest = os.path.join(tmp_dir, "results.jsonl")
+
+            summary = BatchProcessor("count", workers=2, manifest_path=manifest).run(
+                iter_input_files([tmp_dir]))
+            self.assertEqual((summary["tasks"], summary["ok"], summary["failed"]), (4, 3, 1))
+            self.assertEqual(summary["pages"], 9)
+            with open(manifest, encoding="utf-8") as f:
+                records = {os.path.basename(r["file"]): r for r in map(json.loads, f)}
+            self.assertEqual(records["b_1.pdf"]["pages"], 4)
+            self.assertEqual(records["broken.pdf"]["status"], "error")
+
+            merged_dir = os.path.join(tmp_dir, "merged")
+            summary = BatchProcessor("merge", workers=2, output_dir=merged_dir, group_pattern=r"^(\w)_").run(
+                iter_input_files([os.path.join(tmp_dir, "?_*.pdf")]))
+            self.assertEqual(summary["ok"], 2)
+            self.assertEqual(len(PdfReader(os.path.join(merged_dir, "a.pdf")).pages), 5)
+
+            # 组内部分文件读取失败时记为 partial，全部失败时记为 error
+            shutil.copy(os.path.join(tmp_dir, "broken.pdf"), os.path.join(tmp_dir, "a_3.pdf"))
+            shutil.copy(os.path.join(tmp_dir, "broken.pdf"), os.path.join(tmp_dir, "c_1.pdf"))
+            for streaming in (False, True):
+                summary = BatchProcessor("merge", workers=2, output_dir=merged_dir, group_pattern=r"^(\w)_",
+                                         manifest_path=manifest, streaming=streaming).run(
+                    iter_input_files([os.path.join(tmp_dir, "?_*.pdf")]))
+                self.assertEqual((summary["ok"], summary["partial"], summary["failed"]), (1, 1, 1))
+                with open(manifest, encoding="utf-8") as f:
+                    records = {r["group"]: r for r in map(json.loads, f)}
+                self.assertEqual([records[group]["status"] for group in "abc"], ["partial", "ok", "error"])
+                self.assertEqual(list(records["a"]["failed_inputs"]), [os.path.join(tmp_dir, "a_3.pdf")])
+                self.assertEqual(len(PdfReader(os.path.join(merged_dir, "a.pdf")).pages), 5)
+
+    def test_split_pdf_by_outline_depth(self):
+        """测试按多级书签拆分：完整路径命名、章节导言单独成片、与子章节同页的父章节不产生空文件"""
+        outline = [
+            ("第一章", 0, [("1.1 概述", 0), ("1.2 安装", 2)]),
+            ("第二章", 4, [("2.1 配置", 5, [("2.1.1 文件", 6)]), ("2.2 运行", 8)]),
+        ]
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            source = build_sample_pdf(os.path.join(tmp_dir, "manual.pdf"), 10, outline=outline)
+
+            index = OutlineIndex(PdfReader(source))
+            self.assertEqual(index.max_depth, 3)
+            self.assertEqual([(e.path[-1], e.page) for e in index.entries][:3],
+                             [("第一章", 0), ("1.1 概述", 0), ("1.2 安装", 2)])
+
+            outputs = PDFProcessor.split_pdf_by_bookmarks(source, depth=2, workers=2)
+            names = [os.path.basename(f) for f in outputs]
+            self.assertEqual(names, [
+                "manual_part_1_第一章_1.1 概述.pdf", "manual_part_2_第一章_1.2 安装.pdf",
+                "manual_part_3_第二章.pdf", "manual_part_4_第二章_2.1 配置.pdf", "manual_part_5_第二章_2.2 运行.pdf",
+            ])
+            self.assertEqual([len(PdfReader(f).pages) for f in outputs], [2, 2, 1, 3, 2])
+
+            top_level = PDFProcessor.split_pdf_by_bookmarks(source)
+            self.assertEqual([len(PdfReader(f).pages) for f in top_level], [4, 6])
+
+    def test_outline_jobs_with_unusual_bookmarks(self):
+        """测试无法识别的书签目标被跳过，过长的书签路径生成的文件名不超过 NAME_MAX 字节"""
+        index = OutlineIndex.from_entries([], 10)
+        self.assertIsNone(index._page_number(DictionaryObject()))
+        self.assertIsNone(index._page_number(NameObject("/Chapter1")))
+        self.assertEqual(index._page_number(NumberObject(3)), 3)
+
+        deep = tuple(f"第{i}章 很长的章节标题" for i in range(1, 13))
+        index = OutlineIndex.from_entries([OutlineEntry(deep[0], deep[:1], 0), OutlineEntry(deep[-1], deep, 2)], 5)
+        names = [name for name, _, _ in index.jobs(os.path.join("out", "manual.pdf"), len(deep),
+                                                     PDFProcessor.sanitize_filename)]
+        self.assertEqual(os.path.basename(names[0]), "manual_part_1_第1章 很长的章节标题.pdf")
+        self.assertEqual(os.path.dirname(names[1]), "out")
+        self.assertLessEqual(len(os.path.basename(names[1]).encode('utf-8')), NAME_MAX)
+        self.assertRegex(os.path.basename(names[1]), r"^manual_part_2_第12章 很长的章节标题_[0-9a-f]{8}\.pdf$")
+
+    def test_metadata_index(self):
+        """测试元数据索引：未变化的文件不重新解析，仅 touch 的文件按内容摘要识别，拆分结果与不使用索引时一致"""
+        outline = [("第一章", 0, [("1.1 概述", 1)]), ("第二章", 3)]
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            source = build_sample_pdf(os.path.join(tmp_dir, "doc.pdf"), 6, page_bytes=800, shared_bytes=4000,
+                                      outline=outline)
+            other = build_sample_pdf(os.path.join(tmp_dir, "other.pdf"), 3)
+            plain = [len(PdfReader(f).pages) for f in PDFProcessor.split_pdf_by_size(source, max_size_kb=8)]
+
+            index = PDFProcessor.use_metadata_index(os.path.join(tmp_dir, "index.sqlite"))
+            try:
+                self.assertEqual(index.refresh([source, other], workers=1),
+                                 {"unchanged": 0, "updated": 2, "failed": {}})
+                self.assertEqual(PDFProcessor.get_pdf_page_count(source), 6)
+                self.assertEqual([(e.path, e.page) for e in index.get(source).outline],
+                                 [(("第一章",), 0), (("第一章", "1.1 概述"), 1), (("第二章",), 3)])
+
+                cached, walked = index.size_estimator(source), PageSizeEstimator(PdfReader(source))
+                cached_known, walked_known = set(), set()
+                for page_index in range(6):
+                    cached_found = cached.new_objects(page_index, cached_known)
+                    walked_found = walked.new_objects(page_index, walked_known)
+                    cached_known.update(cached_found)
+                    walked_known.update(walked_found)
+                    self.assertEqual(sum(cached_found.values()), sum(walked_found.values()))
+
+                outputs = PDFProcessor.split_pdf_by_size(source, max_size_kb=8)
+                self.assertEqual([len(PdfReader(f).pages) for f in outputs], plain)
+                bookmarks = PDFProcessor.split_pdf_by_bookmarks(source, depth=2)
+                self.assertEqual([len(PdfReader(f).pages) for f in bookmarks], [1, 2, 3])
+                self.assertEqual(index.parsed, 2)
+
+                os.utime(other, ns=(0, 0))
+                self.assertEqual(index.refresh([source, other], workers=1),
+                                 {"unchanged": 2, "updated": 0, "failed": {}})
+                # 获取页数不会为未索引或已变化的文件完整解析，由 refresh 更新索引
+                build_sample_pdf(other, 5)
+                cold = build_sample_pdf(os.path.join(tmp_dir, "cold.pdf"), 4)
+                self.assertEqual(PDFProcessor.get_pdf_page_count(other), 5)
+                self.assertEqual(PDFProcessor.get_pdf_page_count(cold), 4)
+                self.assertEqual(index.parsed, 2)
+                self.assertEqual(index.refresh([source, other, cold], workers=1),
+                                 {"unchanged": 1, "updated": 2, "failed": {}})
+                self.assertEqual(index.cached_page_count(other), 5)
+            finally:
+                PDFProcessor.use_metadata_index(None)
+
+    def test_extract_text(self):
+        """测试文本提取：并行与串行结果一致且按页码顺序输出，文本块不超过长度上限并记录起止页码"""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            source = build_sample_pdf(os.path.join(tmp_dir, "text.pdf"), 40)
+            serial = list(iter_page_text(source, workers=1))
+            self.assertEqual(serial[:2], [(1, "Page 1\n"), (2, "Page 2\n")])
+            self.assertEqual(list(iter_page_text(source, workers=2, batch_pages=3)), serial)
+
+            chunks = list(TextChunker(max_length=20, overlap=7).chunks(serial))
+            self.assertTrue(all(len(chunk["text"]) <= 20 for chunk in chunks))
+            self.assertEqual(chunks[0], {"text": "Page 1\n\nPage 2", "start_page": 1, "end_page": 2})
+            self.assertEqual(chunks[1]["start_page"], 2)  # 重叠上一块的最后一页
+            self.assertEqual(chunks[-1]["end_page"], 40)
+            long_chunks = list(TextChunker(max_length=8).chunks([(1, "x" * 20)]))
+            self.assertEqual([chunk["text"] for chunk in long_chunks], ["x" * 8, "x" * 8, "x" * 4])
+
+            output_file = PDFProcessor.extract_text(source, workers=2, chunk_size=100)
+            self.assertEqual(output_file, os.path.join(tmp_dir, "text.jsonl"))
+            with open(output_file, encoding="utf-8") as f:
+                records = [json.loads(line) for line in f]
+            self.assertEqual(records[0]["start_page"], 1)
+            self.assertEqual(records[-1]["end_page"], 40)
+
     def test_merge_pdfs(self):
         """测试合并 PDF"""
         # 检查是否有测试文件可用
@@ -81,6 +502,128 @@ class TestPDFProcessor(unittest.TestCase):
         else:
             self.skipTest("测试 PDF 文件不存在")
 
+    def test_merge_keeps_objects_of_each_file(self):
+        """测试普通合并：不同文件中编号相同的对象不会互相替代"""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            inputs = [build_sample_pdf(os.path.join(tmp_dir, f"input_{i}.pdf"), 2, page_bytes=200, seed=i)
+                      for i in range(6)]
+            merged = os.path.join(tmp_dir, "merged.pdf")
+            PDFProcessor.merge_pdfs(inputs, merged)
+            expected = [page.get_contents().get_data() for f in inputs for page in PdfReader(f).pages]
+            self.assertEqual([page.get_contents().get_data() for page in PdfReader(merged).pages], expected)
+
+    def test_streaming_merge_deduplicates_shared_resources(self):
+        """测试流式合并：页面顺序与内容正确，各文件相同的字体和表单对象只写一份"""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            inputs = [build_sample_pdf(os.path.join(tmp_dir, f"input_{i}.pdf"), 3, page_bytes=200,
+                                       shared_bytes=5000) for i in range(4)]
+            merged = os.path.join(tmp_dir, "merged.pdf")
+            streamed = os.path.join(tmp_dir, "streamed.pdf")
+            PDFProcessor.merge_pdfs(inputs, merged)
+            PDFProcessor.merge_pdfs(inputs + [os.path.join(tmp_dir, "missing.pdf")], streamed, streaming=True)
+
+            reader = PdfReader(streamed)
+            self.assertEqual(len(reader.pages), 12)
+            self.assertEqual([page.extract_text().strip() for page in reader.pages[2:4]], ["Page 3", "Page 1"])
+            xobjects = {page["/Resources"]["/XObject"].raw_get("/X1").idnum for page in reader.pages}
+            self.assertEqual(len(xobjects), 1)
+            self.assertLess(os.path.getsize(streamed), os.path.getsize(merged) - 3 * 5000)
+
+            with StreamingPdfWriter(os.path.join(tmp_dir, "subset.pdf"), deduplicate=False) as writer:
+                writer.add_file(inputs[0], pages=[2, 0])
+            self.assertEqual(writer.objects_deduplicated, 0)
+            reader = PdfReader(os.path.join(tmp_dir, "subset.pdf"))
+            self.assertEqual([page.extract_text().strip() for page in reader.pages], ["Page 3", "Page 1"])
+
+            # 输入文件复制到一半出错时撤销其已写出的页面，不影响前后的文件
+            partial = os.path.join(tmp_dir, "partial.pdf")
+            with StreamingPdfWriter(partial) as writer:
+                writer.add_file(inputs[0])
+                reader = PdfReader(inputs[1])
+                broken = DictionaryObject(reader.pages[1])
+                broken[NameObject("/Annots")] = IndirectObject(1, 0, FailingReader())
+                broken.indirect_reference = reader.pages[1].indirect_reference
+                with self.assertRaises(OSError):
+                    writer.add_pages([reader.pages[0], broken], reader)
+                self.assertEqual(writer.page_count, 3)
+                writer.add_file(inputs[2], pages=[1])
+            reader = PdfReader(partial)
+            self.assertEqual([page.extract_text().strip() for page in reader.pages],
+                             ["Page 1", "Page 2", "Page 3", "Page 2"])
+            self.assertEqual(len({page["/Resources"]["/XObject"].raw_get("/X1").idnum for page in reader.pages}), 1)
+
+    def test_optimize_pdf(self):
+        """测试优化：重复的流只保留一份、未使用的对象被移除、内容流被压缩"""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            source = build_sample_pdf(os.path.join(tmp_dir, "sample.pdf"), 4, page_bytes=2000, shared_bytes=3000)
+            reader = PdfReader(source)
+            writer = PdfWriter()
+            for page in reader.pages:
+                writer.add_page(page)
+            duplicate = DecodedStreamObject()
+            duplicate.set_data(reader.pages[0]["/Resources"]["/XObject"]["/X1"].get_data())
+            duplicate.update({key: value for key, value in reader.pages[0]["/Resources"]["/XObject"]["/X1"].items()
+                              if key != "/Length"})
+            writer.pages[3][NameObject("/Resources")][NameObject("/XObject")][NameObject("/X1")] = \
+                writer._add_object(duplicate)
+            orphan = DecodedStreamObject()
+            orphan.set_data(b"% unused\n" * 1000)
+            writer._add_object(orphan)
+            bloated = os.path.join(tmp_dir, "bloated.pdf")
+            with open(bloated, "wb") as f:
+                writer.write(f)
+
+            report = optimize_pdf(bloated)
+            self.assertEqual(report["output"], os.path.join(tmp_dir, "bloated_optimized.pdf"))
+            self.assertGreaterEqual(report["objects_deduplicated"], 1)
+            self.assertGreater(report["bytes_recompressed"], 0)
+            self.assertLess(report["optimized_size"], report["original_size"] - 10000)
+            optimized = PdfReader(report["output"])
+            self.assertEqual([page.extract_text().strip() for page in optimized.pages],
+                             ["Page 1", "Page 2", "Page 3", "Page 4"])
+
+            plain_sizes = [os.path.getsize(f) for f in PDFProcessor.split_pdf_by_pages(source, 2)]
+            outputs = PDFProcessor.split_pdf_by_pages(source, 2, optimize=True)
+            self.assertEqual(len(outputs), 2)
+            self.assertEqual(PdfReader(outputs[1]).pages[1].extract_text().strip(), "Page 4")
+            for output, plain_size in zip(outputs, plain_sizes):
+                self.assertLess(os.path.getsize(output), plain_size * 0.8)
+            # 报告中的原始大小即未优化分片的大小
+            results = list(write_parts(source, [(os.path.join(tmp_dir, "part.pdf"), 0, 2)], optimize=True))
+            self.assertEqual(results[0][3], plain_sizes[0])
+            self.assertEqual(results[0][4], os.path.getsize(os.path.join(tmp_dir, "part.pdf")))
+
+    def test_extract_pages(self):
+        """测试按页码范围提取：多层页面树、继承属性、保持给定顺序，以及批量提取"""
+        self.assertEqual(parse_page_ranges("2-3, 7,9-", 10), [1, 2, 6, 8, 9])
+        self.assertEqual(parse_page_ranges([(4, 5), 1], 10), [3, 4, 0])
+        with self.assertRaises(ValueError):
+            parse_page_ranges("8-12", 10)
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            source = build_nested_tree_pdf(os.path.join(tmp_dir, "nested.pdf"), [3, 4, 5])
+            self.assertEqual(LazyPageTree(PdfReader(source)).count, 12)
+
+            output = PDFProcessor.extract_pages(source, "11-12,2-4", os.path.join(tmp_dir, "extract.pdf"))
+            reader = PdfReader(output)
+            self.assertEqual([page.extract_text().strip() for page in reader.pages],
+                             ["Page 11", "Page 12", "Page 2", "Page 3", "Page 4"])
+            self.assertEqual([float(v) for v in reader.pages[0].mediabox], [0, 0, 300, 400])
+
+            sample = build_sample_pdf(os.path.join(tmp_dir, "sample.pdf"), 6)
+            jobs = [(source, "5", os.path.join(tmp_dir, "a.pdf")), (sample, "2-3", os.path.join(tmp_dir, "b.pdf")),
+                    (sample, "7", os.path.join(tmp_dir, "c.pdf"))]
+            results = list(extract_many(jobs, workers=2))
+            self.assertEqual([pages for _, _, pages, _ in results], [1, 2, None])
+            self.assertIn("ValueError", results[2][3])
+            self.assertEqual(PdfReader(os.path.join(tmp_dir, "b.pdf")).pages[1].extract_text().strip(), "Page 3")
+
+            # /Count 与 /Kids 数量相同，但第一个子节点是空的中间节点
+            uneven = build_nested_tree_pdf(os.path.join(tmp_dir, "uneven.pdf"), [0, None, 2])
+            output = PDFProcessor.extract_pages(uneven, "1-3", os.path.join(tmp_dir, "uneven_out.pdf"))
+            self.assertEqual([page.extract_text().strip() for page in PdfReader(output).pages],
+                             ["Page 1", "Page 2", "Page 3"])
+
     def tearDown(self):
         """
         测试后的清理工作